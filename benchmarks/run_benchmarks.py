@@ -0,0 +1,397 @@
+"""
+Throughput benchmarks for the environments, simulation drivers and Buy Box inference.
+
+Measures
+  - env steps/s of every environment at several grid sizes (and firm counts
+    for SequentialPricingEnv), one env.step() call per step,
+  - simulated periods/s of the package's Q-vs-Q, Q-vs-Rule and Rule-vs-Rule
+    drivers (compiled and Python) and of the DQN-vs-Rule driver,
+  - RF predictions/s of rf_interface.predict_batch at batch sizes 1 to 10k, on
+    the saved Buy Box pipeline or, when it is not there, on a synthetic
+    imputer + random forest pipeline over the same 10 features,
+
+writes them to a JSON file and compares them against a saved baseline.
+
+Usage (from the repository root):
+    python benchmarks/run_benchmarks.py --save-baseline       # record benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --tolerance 0.15      # compare, exit 1 on regressions
+    python benchmarks/run_benchmarks.py --filter env. --quick
+
+A benchmark regresses when its rate falls below (1 - tolerance) times the
+baseline rate. Rates are the median of `--repeat` timed rounds, each at least
+`--min-time` seconds long. Benchmarks whose optional dependency (numba,
+torch, scikit-learn) is missing are reported as skipped.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)  # env/, rf_interface and the package, as in the notebooks
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+GRID_SIZES = (25, 100, 500)
+SEQUENTIAL_CONFIGS = ((2, 6), (2, 100), (3, 25), (4, 100))  # (n_firms, n_prices)
+RF_BATCH_SIZES = (1, 10, 100, 1000, 10_000)
+SYNTHETIC_RF = {"n_estimators": 100, "min_samples_leaf": 2, "n_rows": 20_000}
+
+_PIPELINES = {}  # path -> loaded pipeline, shared by the RF benchmarks
+
+
+class Skip(Exception):
+    """Raised by a benchmark setup when an optional dependency is missing."""
+
+
+# ---------------------------------------------------------------------- #
+# timing
+# ---------------------------------------------------------------------- #
+def measure(func, items, min_time=0.2, repeat=5):
+    """
+    Throughput of `func`, which processes `items` items per call.
+
+    One untimed warm-up call (JIT compilation, payoff tables, caches), then
+    `repeat` rounds of as many calls as fit in `min_time` seconds.
+
+    Returns:
+        rate: Median items per second over the rounds
+    """
+    func()
+    rates = []
+    for _ in range(repeat):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        rates.append(calls * items / elapsed)
+    return float(np.median(rates))
+
+
+# ---------------------------------------------------------------------- #
+# benchmark definitions: name -> (setup, unit, params)
+# setup(quick) returns (func, items)
+# ---------------------------------------------------------------------- #
+def _step_loop(env, actions, *extra):
+    def run():
+        step = env.step
+        for a in actions:
+            step(a, *extra)
+    return run
+
+
+def _env_steps(make_env, n_firms, grid_size, extra=()):
+    def setup(quick):
+        env = make_env()
+        env.reset(seed=0)
+        if hasattr(env, "payoff_table") and getattr(env, "_use_payoff", True):
+            env.payoff_table()  # built outside the timed region
+        steps = 1000 if quick else 10_000
+        rng = np.random.default_rng(0)
+        actions = [tuple(a) for a in rng.integers(grid_size, size=(steps, n_firms))]
+        return _step_loop(env, actions, *extra), steps
+    return setup
+
+
+def _vector_env_steps(n_envs, grid_size):
+    def setup(quick):
+        from env.LogitDemandPricingEnv import VectorLogitDemandPricingEnv
+
+        env = VectorLogitDemandPricingEnv(n_envs, grid_size=grid_size)
+        env.reset(seed=0)
+        steps = 100 if quick else 1000
+        actions = np.random.default_rng(0).integers(grid_size, size=(steps, n_envs, 2))
+        return _step_loop(env, actions), steps * n_envs
+    return setup
+
+
+def _multi_seller_env_steps(n_envs, n_sellers, grid_size):
+    def setup(quick):
+        from env.AmazonLogitDemandPricing_env import MultiSellerAmazonLogitDemandPricingEnv
+
+        env = MultiSellerAmazonLogitDemandPricingEnv(n_sellers, n_envs, grid_size=grid_size)
+        env.reset(seed=0)
+        steps = 100 if quick else 1000
+        rng = np.random.default_rng(0)
+        actions = rng.integers(grid_size, size=(steps, n_envs, n_sellers))
+        buy_box = rng.integers(-1, n_sellers, size=(steps, n_envs))
+
+        def run():
+            step = env.step
+            for a, bb in zip(actions, buy_box):
+                step(a, bb)
+        return run, steps * n_envs
+    return setup
+
+
+def env_benchmarks():
+    from env.AmazonLogitDemandPricing_env import AmazonLogitDemandPricingEnv
+    from env.bertrand_env import BertrandPricingEnv
+    from env.LogitDemandPricingEnv import LogitDemandPricingEnv
+    from sequential_pricing_env import SequentialPricingEnv
+
+    benchmarks = {}
+    for n_firms, n_prices in SEQUENTIAL_CONFIGS:
+        make = lambda n_firms=n_firms, n_prices=n_prices: SequentialPricingEnv(
+            n_firms=n_firms, n_prices=n_prices, payoff_cache_dir=False, return_info=False)
+        benchmarks[f"env.SequentialPricingEnv.step[firms={n_firms},prices={n_prices}]"] = (
+            _env_steps(make, n_firms, n_prices), "steps/s", {"n_firms": n_firms, "n_prices": n_prices})
+    for grid_size in GRID_SIZES:
+        for cls, extra in ((LogitDemandPricingEnv, ()), (BertrandPricingEnv, ()),
+                           (AmazonLogitDemandPricingEnv, ((1, 0),))):
+            make = lambda cls=cls, grid_size=grid_size: cls(grid_size=grid_size, payoff_cache_dir=False)
+            benchmarks[f"env.{cls.__name__}.step[grid={grid_size}]"] = (
+                _env_steps(make, 2, grid_size, extra), "steps/s", {"grid_size": grid_size})
+    for n_envs in (64, 1024):
+        benchmarks[f"env.VectorLogitDemandPricingEnv.step[envs={n_envs},grid=100]"] = (
+            _vector_env_steps(n_envs, 100), "market-steps/s", {"n_envs": n_envs, "grid_size": 100})
+    for n_sellers in (2, 30):
+        benchmarks[f"env.MultiSellerAmazonLogitDemandPricingEnv.step[envs=1024,sellers={n_sellers},grid=100]"] = (
+            _multi_seller_env_steps(1024, n_sellers, 100), "market-steps/s",
+            {"n_envs": 1024, "n_sellers": n_sellers, "grid_size": 100})
+    return benchmarks
+
+
+def simulation_benchmarks():
+    from env.AmazonLogitDemandPricing_env import AmazonLogitDemandPricingEnv
+    from env.LogitDemandPricingEnv import LogitDemandPricingEnv
+    from sequential_pricing_env import simulation
+
+    def logit_env():
+        env = LogitDemandPricingEnv(grid_size=25, payoff_cache_dir=False)
+        env.payoff_table()
+        return env
+
+    def driver(simfunc, compiled):
+        def setup(quick):
+            try:
+                import numba  # noqa: F401
+            except ImportError:
+                if compiled:
+                    raise Skip("numba is not installed")
+            env = logit_env()
+            periods = (20_000 if quick else 200_000) if compiled else (2000 if quick else 20_000)
+            return (lambda: simfunc(env, periods, seed=0, compiled=compiled)), periods
+        return setup
+
+    def dqn_rule(n_markets):
+        def setup(quick):
+            try:
+                from sequential_pricing_env.agents.dqn import simulate_DQNpQr
+            except ImportError:
+                raise Skip("torch is not installed")
+            env = AmazonLogitDemandPricingEnv(grid_size=25, payoff_cache_dir=False)
+            env.payoff_table()
+            periods = 200 if quick else 1000
+            run = lambda: simulate_DQNpQr(env, periods, n_markets=n_markets, seed=0, warmup=50)
+            return run, periods * (n_markets or 1)
+        return setup
+
+    benchmarks = {}
+    for name, simfunc in (("QpQp", simulation.simulate_QpQp), ("QpQr", simulation.simulate_QpQr),
+                          ("QrQr", simulation.simulate_QrQr)):
+        for compiled in (True, False):
+            kind = "compiled" if compiled else "python"
+            benchmarks[f"sim.{name}.{kind}[grid=25]"] = (driver(simfunc, compiled), "periods/s", {"grid_size": 25})
+    benchmarks["sim.DQNpQr[grid=25,markets=1]"] = (
+        dqn_rule(None), "periods/s", {"grid_size": 25, "n_markets": 1})
+    benchmarks["sim.DQNpQr[grid=25,markets=64]"] = (
+        dqn_rule(64), "market-periods/s", {"grid_size": 25, "n_markets": 64})
+    return benchmarks
+
+
+def _synthetic_pipeline():
+    """
+    Median imputer + random forest over FEATURE_NAMES, fitted on random sellers.
+
+    Stands in for the saved Buy Box pipeline, which is not part of the
+    repository; the label loosely follows the real one (cheapest or Amazon wins).
+    """
+    try:
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.impute import SimpleImputer
+        from sklearn.pipeline import make_pipeline
+    except ImportError:
+        raise Skip("scikit-learn is not installed")
+    from sequential_pricing_env.features import FEATURE_NAMES
+
+    rng = np.random.default_rng(0)
+    X = _random_features(rng, SYNTHETIC_RF["n_rows"], len(FEATURE_NAMES))
+    X[rng.random(X.shape) < 0.02] = np.nan  # sparse gaps for the imputer
+    rank = FEATURE_NAMES.index("price_rank")
+    y = ((X[:, rank] <= 1) | (X[:, 0] == 1)) ^ (rng.random(len(X)) < 0.1)
+    forest = RandomForestClassifier(n_estimators=SYNTHETIC_RF["n_estimators"],
+                                    min_samples_leaf=SYNTHETIC_RF["min_samples_leaf"], random_state=0)
+    return make_pipeline(SimpleImputer(strategy="median"), forest).fit(X, y.astype(int))
+
+
+def _random_features(rng, n_rows, n_features):
+    X = rng.uniform(0, 10, size=(n_rows, n_features))
+    X[:, 0] = rng.random(n_rows) < 0.2  # isAmazon
+    X[:, 1] = rng.random(n_rows) < 0.6  # isFBA
+    return X
+
+
+def rf_benchmarks(pipeline_path):
+    synthetic = not os.path.exists(pipeline_path)
+    key = "synthetic" if synthetic else pipeline_path
+
+    def predict(batch_size):
+        def setup(quick):
+            import rf_interface
+
+            pipeline = _PIPELINES.get(key)
+            if pipeline is None:
+                if synthetic:
+                    pipeline = _synthetic_pipeline()
+                else:
+                    import joblib
+
+                    pipeline = joblib.load(pipeline_path)
+                _PIPELINES[key] = pipeline
+            X = _random_features(np.random.default_rng(0), batch_size, 10)
+            X[:, 0], X[:, 1] = 0, 1  # isAmazon, isFBA
+            return (lambda: rf_interface.predict_batch(pipeline, X)), batch_size
+        return setup
+
+    # a synthetic forest has other rates than the real one, so it gets its own names
+    tag = "synthetic," if synthetic else ""
+    params = {"pipeline": "synthetic" if synthetic else os.path.basename(pipeline_path)}
+    return {f"rf.predict_batch[{tag}batch={n}]": (predict(n), "predictions/s", dict(params, batch_size=n))
+            for n in RF_BATCH_SIZES}
+
+
+def all_benchmarks(pipeline_path):
+    benchmarks = {}
+    benchmarks.update(env_benchmarks())
+    benchmarks.update(simulation_benchmarks())
+    benchmarks.update(rf_benchmarks(pipeline_path))
+    return benchmarks
+
+
+# ---------------------------------------------------------------------- #
+# running and comparing
+# ---------------------------------------------------------------------- #
+def run(benchmarks, quick=False, min_time=0.2, repeat=5, verbose=True):
+    """
+    Run benchmarks.
+
+    Returns:
+        report: dict with "meta" (machine and library versions) and "results",
+            name -> {"rate", "unit", "params"} or {"skipped": reason}
+    """
+    results = {}
+    for name, (setup, unit, params) in benchmarks.items():
+        try:
+            func, items = setup(quick)
+        except Skip as reason:
+            results[name] = {"skipped": str(reason), "unit": unit, "params": params}
+            if verbose:
+                print(f"{name:<60} skipped: {reason}")
+            continue
+        rate = measure(func, items, min_time=min_time, repeat=repeat)
+        results[name] = {"rate": rate, "unit": unit, "params": params}
+        if verbose:
+            print(f"{name:<60} {rate:>14,.0f} {unit}")
+    return {"meta": _meta(quick), "results": results}
+
+
+def compare(report, baseline, tolerance=0.1):
+    """
+    Compare rates against a baseline report.
+
+    Returns:
+        rows: List of (name, rate, baseline rate, ratio, status) for the
+            benchmarks present in both, status one of "ok", "faster", "REGRESSION"
+    """
+    rows = []
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if "rate" not in result or base is None or "rate" not in base:
+            continue
+        ratio = result["rate"] / base["rate"]
+        if ratio < 1 - tolerance:
+            status = "REGRESSION"
+        elif ratio > 1 + tolerance:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, result["rate"], base["rate"], ratio, status))
+    return rows
+
+
+def _meta(quick):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "quick": quick,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", default=None, help="write results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative slowdown")
+    parser.add_argument("--filter", default=None, help="only run benchmarks whose name contains this")
+    parser.add_argument("--pipeline", default=os.path.join(ROOT, "pipe_red_rf.joblib"), help="RF pipeline")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed round")
+    parser.add_argument("--repeat", type=int, default=5, help="timed rounds per benchmark")
+    args = parser.parse_args(argv)
+
+    benchmarks = all_benchmarks(args.pipeline)
+    if args.filter:
+        benchmarks = {name: b for name, b in benchmarks.items() if args.filter in name}
+    report = run(benchmarks, quick=args.quick, min_time=args.min_time, repeat=args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Saved baseline to '{args.baseline}'")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at '{args.baseline}', run with --save-baseline first")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows = compare(report, baseline, args.tolerance)
+    print(f"\nAgainst baseline of {baseline['meta'].get('timestamp')} "
+          f"(commit {baseline['meta'].get('commit')}), tolerance {args.tolerance:.0%}:")
+    for name, rate, base, ratio, status in rows:
+        print(f"{name:<60} {ratio:>7.2f}x  {status}")
+    regressions = [row for row in rows if row[4] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
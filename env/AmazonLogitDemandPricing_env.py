@@ -15,12 +15,16 @@
     More about the prediction model:
         1. We obtained the historical pricingd data for the top 5000 best sellers in the Books category on Amazon. For each ASIN, we collecte the pricing history data for all the sellers, their offer/seller feature, and the Buy Box winner at each time step.
         2. We trained a prediction model to predict the Buy Box winner based on the seller features and the prices of all the sellers.
-        3. We used the prediction model to generate the additional utility term for the Buy Box winner in the demand function. The prediction result is also stored in a tabular to avoid repeated computation.
+        3. We used the prediction model to generate the additional utility term for the Buy Box winner in the demand function. The prediction result is also stored in a tabular (rf_interface.BuyBoxCache) to avoid repeated computation.
+    Profits for every (a_i, a_j, bb1, bb2) combination are tabulated once by payoff_table() and step is a lookup.
+    MultiSellerAmazonLogitDemandPricingEnv generalizes the game to N heterogeneous sellers (own marginal cost,
+    FBA/Amazon flags and Buy Box utility) over a batch of markets; actions are arrays of shape (n_envs, n_sellers).
 '''
 
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
+from gymnasium.utils import seeding
 
 class AmazonLogitDemandPricingEnv(gym.Env):
     """
@@ -40,17 +44,24 @@ class AmazonLogitDemandPricingEnv(gym.Env):
                  beta: float = 0.95,
                  a_0=0, # parameter for logit demand. OUtside option
                  a_12=10, # parameter for logit demand. Inside option
-                 mu=0.25 # parameter for logit demand. Vertical differentiation
+                 mu=0.25, # parameter for logit demand. Vertical differentiation
+                 bb_utility=1.5, # Buy Box utility boost. Tunable parameter to achieve ~80% share, depending on mu
+                 payoff_cache_dir=None # where to cache the payoff table. None: default dir, False: memory only
                  ):
         super().__init__()
         self.prices = np.linspace(price_min, price_max, grid_size)
         self.price_min = price_min
         self.price_max = price_max
+        self.grid_size = grid_size
         self.cost = marginal_cost
         self.beta = beta
         self.a_0 = a_0
         self.a_12 = a_12
         self.mu = mu
+        self.bb_utility = bb_utility
+        self.payoff_cache_dir = payoff_cache_dir
+        self._payoff = None  # built on first use, see payoff_table()
+        self._seeded = False  # reset(seed=...) switches to self.np_random
 
         # each firm’s action is picking an index in {0,…,grid_size–1}
         self.action_space = spaces.Tuple((
@@ -63,22 +74,40 @@ class AmazonLogitDemandPricingEnv(gym.Env):
             spaces.Discrete(grid_size)
         ))
 
-    def step(self, actions, buy_box):
+    def payoff_table(self):
         '''
-        Logit demand system with outside option.
-        The Buy Box winner receives additional utility to capture ~80% of inside-good demand.
+        Dense payoff tensor of shape (grid_size, grid_size, 2, 2, 2).
+        payoff[a_i, a_j, bb1, bb2] = (r_i, r_j) for the price index pair (a_i, a_j) and Buy Box flags (bb1, bb2).
+        Built on first call and cached on disk keyed by the environment parameters
+        (in memory only when the sequential_pricing_env package is not installed).
         '''
-        a_i, a_j = actions
-        bb1, bb2 = buy_box  # 1 means winner, 0 means loser
-        p_i = self.prices[a_i]
-        p_j = self.prices[a_j]
+        if self._payoff is None:
+            params = dict(price_min=self.price_min, price_max=self.price_max, grid_size=self.grid_size,
+                          cost=self.cost, a_0=self.a_0, a_12=self.a_12, mu=self.mu,
+                          bb_utility=self.bb_utility)
+            try:
+                from sequential_pricing_env.payoff_cache import load_or_build
+            except ImportError:  # env/ used on its own, without the package: build uncached
+                self._payoff = np.ascontiguousarray(self._build_payoff_table(), dtype=np.float64)
+                self._payoff.flags.writeable = False
+            else:
+                self._payoff = load_or_build(type(self).__name__, params, self._build_payoff_table,
+                                             cache_dir=self.payoff_cache_dir)
+        return self._payoff
 
-        # Buy Box utility boost to shift ~80% of inside-good demand to winner
-        bb_utility = 1.5  # Tunable parameter to achieve ~80% share, depending on mu
+    def _build_payoff_table(self):
+        '''
+        Logit demand system with outside option for every price pair and Buy Box assignment.
+        The Buy Box winner receives additional utility to capture ~80% of inside-good demand.
+        '''
+        p_i = self.prices[:, None, None, None]
+        p_j = self.prices[None, :, None, None]
+        bb1 = np.arange(2)[None, None, :, None]
+        bb2 = np.arange(2)[None, None, None, :]
 
         # Utilities
-        u_i = (self.a_12 - p_i) / self.mu + bb1 * bb_utility
-        u_j = (self.a_12 - p_j) / self.mu + bb2 * bb_utility
+        u_i = (self.a_12 - p_i) / self.mu + bb1 * self.bb_utility
+        u_j = (self.a_12 - p_j) / self.mu + bb2 * self.bb_utility
         u_0 = self.a_0 / self.mu  # outside option utility
 
         # Softmax denominator
@@ -88,9 +117,21 @@ class AmazonLogitDemandPricingEnv(gym.Env):
         d_i = np.exp(u_i) / deno
         d_j = np.exp(u_j) / deno
 
-        # Profits  
-        r_i = (p_i - self.cost) * d_i
-        r_j = (p_j - self.cost) * d_j
+        # Profits
+        table = np.empty((self.grid_size, self.grid_size, 2, 2, 2))
+        table[..., 0] = (p_i - self.cost) * d_i
+        table[..., 1] = (p_j - self.cost) * d_j
+        return table
+
+    def step(self, actions, buy_box):
+        '''
+        Logit demand system with outside option.
+        The Buy Box winner receives additional utility to capture ~80% of inside-good demand.
+        '''
+        a_i, a_j = actions
+        bb1, bb2 = buy_box  # 1 means winner, 0 means loser
+        payoff = self._payoff if self._payoff is not None else self.payoff_table()
+        r_i, r_j = payoff[a_i, a_j, int(bb1), int(bb2)]
 
         # Update state
         self.state = (a_i, a_j)
@@ -100,8 +141,184 @@ class AmazonLogitDemandPricingEnv(gym.Env):
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
-        # reset state to a random price pair
-        a_i = np.random.randint(self.action_space[0].n)
-        a_j = np.random.randint(self.action_space[1].n)
+        # reset state to a random price pair. Once seeded, the env draws from its own
+        # generator; unseeded envs keep drawing from NumPy's global state.
+        if seed is not None:
+            self._seeded = True
+        if self._seeded:
+            a_i = int(self.np_random.integers(self.action_space[0].n))
+            a_j = int(self.np_random.integers(self.action_space[1].n))
+        else:
+            a_i = np.random.randint(self.action_space[0].n)
+            a_j = np.random.randint(self.action_space[1].n)
         self.state = (a_i, a_j)
-        return (a_i, a_j), {}
\ No newline at end of file
+        return (a_i, a_j), {}
+
+
+
+class MultiSellerAmazonLogitDemandPricingEnv(gym.vector.VectorEnv):
+    """
+    Batch of independent N-seller Amazon listings with Logit demand, stepped with one NumPy call.
+    - All sellers and markets share the price grid price_min ... price_max with grid_size points.
+    - Seller parameters (marginal_cost, a_12, bb_utility) may be scalars, per-seller arrays of
+      shape (n_sellers,) or per-market arrays of shape (n_envs, n_sellers).
+    - is_fba / is_amazon are per-seller flags. They add fba_utility / amazon_utility to the
+      seller's utility (both 0 by default) and feed the Buy Box model features, see features().
+    - Actions: int array of shape (n_envs, n_sellers), price indices of all sellers in every market.
+    - Buy Box: index of the winning seller in every market, shape (n_envs,), -1 when nobody holds it.
+    - Observations: the last price indices of every market, shape (n_envs, n_sellers).
+    - Rewards: profits of all sellers, shape (n_envs, n_sellers).
+    With two sellers and default flags it reproduces AmazonLogitDemandPricingEnv.
+    """
+    metadata = {"render_modes": []}
+
+    def __init__(self,
+                 n_sellers: int,
+                 n_envs: int = 1,
+                 price_min: float = 0.01,
+                 price_max: float = 10.0,
+                 grid_size: int = 100,
+                 marginal_cost=2.0,
+                 beta: float = 0.95,
+                 a_0=0, # parameter for logit demand. Outside option
+                 a_12=10, # parameter for logit demand. Inside option, per seller
+                 mu=0.25, # parameter for logit demand. Vertical differentiation
+                 bb_utility=1.5, # Buy Box utility boost, per seller
+                 is_fba=1, # fulfilled by Amazon, per seller
+                 is_amazon=0, # Amazon itself is the seller, per seller
+                 fba_utility=0.0, # utility of FBA (Prime) offers, in price units like a_12
+                 amazon_utility=0.0 # utility of buying from Amazon, in price units
+                 ):
+        self.num_envs = n_envs
+        self.n_sellers = n_sellers
+        self.prices = np.linspace(price_min, price_max, grid_size)
+        self.price_min = price_min
+        self.price_max = price_max
+        self.grid_size = grid_size
+        self.beta = beta
+        self.a_0 = float(a_0)
+        self.mu = float(mu)
+        self.is_fba = self._per_seller_flag(is_fba, "is_fba")
+        self.is_amazon = self._per_seller_flag(is_amazon, "is_amazon")
+        # per-seller parameters, broadcast to shape (n_envs, n_sellers)
+        self.cost = self._per_seller(marginal_cost, "marginal_cost")
+        self.a_12 = self._per_seller(a_12, "a_12")
+        self.bb_utility = self._per_seller(bb_utility, "bb_utility")
+        # price-independent part of the utilities, (a_12 + flags) / mu, the outside option relative to it
+        self._base_utility = (self.a_12 + self.is_fba * fba_utility + self.is_amazon * amazon_utility) / self.mu
+        self._outside = self.a_0 / self.mu
+
+        self.single_action_space = spaces.MultiDiscrete(np.full(n_sellers, grid_size))
+        self.single_observation_space = spaces.MultiDiscrete(np.full(n_sellers, grid_size))
+        self.action_space = spaces.MultiDiscrete(np.full((n_envs, n_sellers), grid_size))
+        self.observation_space = spaces.MultiDiscrete(np.full((n_envs, n_sellers), grid_size))
+        self.closed = False
+
+        self._rng = None
+        self._rows = np.arange(n_envs)
+        self.state = np.zeros((n_envs, n_sellers), dtype=np.int64)
+        # scratch buffers reused by every step
+        self._utility = np.empty((n_envs, n_sellers))
+        self._shift = np.empty(n_envs)
+        self._deno = np.empty(n_envs)
+        self._rewards = np.empty((n_envs, n_sellers))
+        self._terminated = np.zeros(n_envs, dtype=bool)
+        self._truncated = np.zeros(n_envs, dtype=bool)
+
+    def _per_seller(self, value, name):
+        try:
+            arr = np.broadcast_to(np.asarray(value, dtype=np.float64), (self.num_envs, self.n_sellers))
+        except ValueError:
+            raise ValueError(f"{name} must be a scalar or have shape ({self.n_sellers},) "
+                             f"or ({self.num_envs}, {self.n_sellers})") from None
+        return arr.copy()
+
+    def _per_seller_flag(self, value, name):
+        arr = np.asarray(value, dtype=np.int64)
+        if arr.ndim > 1 or arr.size not in (1, self.n_sellers):
+            raise ValueError(f"{name} must be a scalar or have shape ({self.n_sellers},)")
+        return np.broadcast_to(arr, (self.n_sellers,)).copy()
+
+    def utilities(self, actions, buy_box=None, out=None):
+        """
+        Mean utilities of all sellers, (a_12 - p) / mu + flag terms + the Buy Box winner's bb_utility.
+
+        Args:
+            actions: int array of shape (n_envs, n_sellers)
+            buy_box: winner index per market, shape (n_envs,), -1 or None for no winner
+            out: optional float array of shape (n_envs, n_sellers)
+        """
+        if out is None:
+            out = np.empty((self.num_envs, self.n_sellers))
+        np.divide(self.prices[actions], self.mu, out=out)
+        np.subtract(self._base_utility, out, out=out)
+        if buy_box is not None:
+            buy_box = np.asarray(buy_box, dtype=np.int64).reshape(self.num_envs)
+            won = buy_box >= 0
+            rows, winner = self._rows[won], buy_box[won]
+            out[rows, winner] += self.bb_utility[rows, winner]
+        return out
+
+    def shares(self, actions, buy_box=None, out=None):
+        """
+        Logit market shares of all sellers, shape (n_envs, n_sellers).
+
+        The softmax over the sellers and the outside option is shifted by the largest
+        utility of each market (log-sum-exp), so no exp can overflow however small mu is.
+        """
+        u = self.utilities(actions, buy_box, out=out)
+        shift = self._shift
+        np.maximum(u.max(axis=1), self._outside, out=shift)
+        np.subtract(u, shift[:, None], out=u)
+        np.exp(u, out=u)
+        np.subtract(self._outside, shift, out=self._deno)
+        np.exp(self._deno, out=self._deno)
+        self._deno += u.sum(axis=1)
+        np.divide(u, self._deno[:, None], out=u)
+        return u
+
+    def profits(self, actions, buy_box=None, out=None):
+        """
+        Profits of all sellers in every market.
+
+        Args:
+            actions: int array of shape (n_envs, n_sellers)
+            buy_box: winner index per market, shape (n_envs,), -1 or None for no winner
+            out: optional float array of shape (n_envs, n_sellers) to write the profits into
+
+        Returns:
+            profits: float array of shape (n_envs, n_sellers)
+        """
+        d = self.shares(actions, buy_box, out=self._utility)
+        if out is None:
+            out = np.empty((self.num_envs, self.n_sellers))
+        np.subtract(self.prices[actions], self.cost, out=out)
+        np.multiply(out, d, out=out)
+        return out
+
+    def features(self, **kwargs):
+        """RollingFeatures for the Buy Box model over all markets, with the sellers' isAmazon/isFBA flags."""
+        from sequential_pricing_env.features import RollingFeatures
+
+        return RollingFeatures(self.n_sellers, is_amazon=self.is_amazon, is_fba=self.is_fba,
+                               n_markets=self.num_envs, **kwargs)
+
+    def step(self, actions, buy_box=None):
+        '''
+        Logit demand system with outside option, evaluated for all sellers and markets at once.
+        The Buy Box winner of each market receives its bb_utility.'''
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs, self.n_sellers)
+        rewards = self.profits(actions, buy_box, out=self._rewards)
+        self.state = actions.copy()
+        return (self.state.copy(), rewards.copy(),
+                self._terminated.copy(), self._truncated.copy(), {})
+
+    def reset(self, seed=None, options=None):
+        if seed is not None or self._rng is None:
+            self._rng, _ = seeding.np_random(seed)
+        # reset every market to random prices
+        self.state = self._rng.integers(self.grid_size, size=(self.num_envs, self.n_sellers))
+        return self.state.copy(), {}
+
+    def close(self, **kwargs):
+        self.closed = True
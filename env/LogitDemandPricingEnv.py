@@ -11,6 +11,8 @@
     Observation: tuple (p_i_lag, p_j_lag) with each in {0,...,M-1}, indexing price grid. Price pair played in last step.
     Rewards: profits for each firm given marginal cost and demand rule.
     Demand: Logit demand with outside option.
+    VectorLogitDemandPricingEnv steps a batch of independent markets at once. Each market may
+    have its own cost, mu, a_0 and a_12; actions and observations are arrays of shape (n_envs, 2).
 
 '''
 
@@ -18,6 +20,7 @@
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
+from gymnasium.utils import seeding
 
 class LogitDemandPricingEnv(gym.Env):
     """
@@ -37,17 +40,22 @@ class LogitDemandPricingEnv(gym.Env):
                  beta: float = 0.95,
                  a_0=0, # parameter for logit demand. OUtside option
                  a_12=10, # parameter for logit demand. Inside option
-                 mu=0.25 # parameter for logit demand. Vertical differentiation
+                 mu=0.25, # parameter for logit demand. Vertical differentiation
+                 payoff_cache_dir=None # where to cache the payoff table. None: default dir, False: memory only
                  ):
         super().__init__()
         self.prices = np.linspace(price_min, price_max, grid_size)
         self.price_min = price_min
         self.price_max = price_max
+        self.grid_size = grid_size
         self.cost = marginal_cost
         self.beta = beta
         self.a_0 = a_0
         self.a_12 = a_12
         self.mu = mu
+        self.payoff_cache_dir = payoff_cache_dir
+        self._payoff = None  # built on first use, see payoff_table()
+        self._seeded = False  # reset(seed=...) switches to self.np_random
 
         # each firm’s action is picking an index in {0,…,grid_size–1}
         self.action_space = spaces.Tuple((
@@ -60,47 +68,183 @@ class LogitDemandPricingEnv(gym.Env):
             spaces.Discrete(grid_size)
         ))
 
-    def step(self, actions):
+    def payoff_table(self):
         '''
-        Logit demand system with outside option'''
-        a_i, a_j = actions
-        p_i = self.prices[a_i]
-        p_j = self.prices[a_j]
-        # print("a_i:", a_i, "a_j:", a_j)
-        # print("p_i:", p_i, "p_j:", p_j)
+        Dense payoff tensor of shape (grid_size, grid_size, 2).
+        payoff[a_i, a_j] = (r_i, r_j), the profits of both firms for the price index pair (a_i, a_j).
+        Built on first call and cached on disk keyed by the environment parameters
+        (in memory only when the sequential_pricing_env package is not installed).'''
+        if self._payoff is None:
+            params = dict(price_min=self.price_min, price_max=self.price_max, grid_size=self.grid_size,
+                          cost=self.cost, a_0=self.a_0, a_12=self.a_12, mu=self.mu)
+            try:
+                from sequential_pricing_env.payoff_cache import load_or_build
+            except ImportError:  # env/ used on its own, without the package: build uncached
+                self._payoff = np.ascontiguousarray(self._build_payoff_table(), dtype=np.float64)
+                self._payoff.flags.writeable = False
+            else:
+                self._payoff = load_or_build(type(self).__name__, params, self._build_payoff_table,
+                                             cache_dir=self.payoff_cache_dir)
+        return self._payoff
+
+    def _build_payoff_table(self):
+        '''
+        Logit demand system with outside option, evaluated for every price index pair.'''
+        p_i = self.prices[:, None]
+        p_j = self.prices[None, :]
 
         deno = np.exp((self.a_12 - p_i) / self.mu) + np.exp((self.a_12 - p_j) / self.mu) + np.exp((self.a_0) / self.mu)
 
         d_i = np.exp((self.a_12 - p_i) / self.mu) / deno
         d_j = np.exp((self.a_12 - p_j) / self.mu) / deno
-        # print("d_i:", d_i, "d_j:", d_j)
-
 
         # profits
-        r_i = (p_i - self.cost) * d_i
-        r_j = (p_j - self.cost) * d_j
-        # print("r_i:", r_i, "r_j:", r_j)
+        table = np.empty((self.grid_size, self.grid_size, 2))
+        table[..., 0] = (p_i - self.cost) * d_i
+        table[..., 1] = (p_j - self.cost) * d_j
+        return table
+
+    def step(self, actions):
+        '''
+        Logit demand system with outside option. Profits are looked up in payoff_table().'''
+        a_i, a_j = actions
+        payoff = self._payoff if self._payoff is not None else self.payoff_table()
+        r_i, r_j = payoff[a_i, a_j]
         # update state
         self.state = (a_i, a_j)
 
         return (a_i, a_j), (r_i, r_j), False, False, {}
-    
+
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
-        # reset state to a random price pair
-        a_i = np.random.randint(self.action_space[0].n)
-        a_j = np.random.randint(self.action_space[1].n)
+        # reset state to a random price pair. Once seeded, the env draws from its own
+        # generator; unseeded envs keep drawing from NumPy's global state.
+        if seed is not None:
+            self._seeded = True
+        if self._seeded:
+            a_i = int(self.np_random.integers(self.action_space[0].n))
+            a_j = int(self.np_random.integers(self.action_space[1].n))
+        else:
+            a_i = np.random.randint(self.action_space[0].n)
+            a_j = np.random.randint(self.action_space[1].n)
         self.state = (a_i, a_j)
         return (a_i, a_j), {}
 
 
 
+class VectorLogitDemandPricingEnv(gym.vector.VectorEnv):
+    """
+    Batch of independent two-firm Logit pricing markets, stepped with one NumPy call.
+    - All markets share the price grid price_min ... price_max with grid_size points.
+    - marginal_cost, a_0, a_12 and mu may be scalars or arrays of shape (n_envs,), so a
+      parameter sweep can be laid out along the batch dimension.
+    - Actions: int array of shape (n_envs, 2), price indices of both firms in every market.
+    - Observations: the last price index pair of every market, shape (n_envs, 2).
+    - Rewards: profits of both firms, shape (n_envs, 2).
+    Markets never terminate, so there is no autoreset.
+    """
+    metadata = {"render_modes": []}
+
+    def __init__(self,
+                 n_envs: int,
+                 price_min: float = 0.01,
+                 price_max: float = 10.0,
+                 grid_size: int = 100,
+                 marginal_cost=2.0,
+                 beta: float = 0.95,
+                 a_0=0, # parameter for logit demand. Outside option
+                 a_12=10, # parameter for logit demand. Inside option
+                 mu=0.25 # parameter for logit demand. Vertical differentiation
+                 ):
+        self.num_envs = n_envs
+        self.prices = np.linspace(price_min, price_max, grid_size)
+        self.price_min = price_min
+        self.price_max = price_max
+        self.grid_size = grid_size
+        self.beta = beta
+        # per-market parameters, broadcast to shape (n_envs,)
+        self.cost = self._per_market(marginal_cost, "marginal_cost")
+        self.a_0 = self._per_market(a_0, "a_0")
+        self.a_12 = self._per_market(a_12, "a_12")
+        self.mu = self._per_market(mu, "mu")
+
+        self.single_action_space = spaces.MultiDiscrete([grid_size, grid_size])
+        self.single_observation_space = spaces.MultiDiscrete([grid_size, grid_size])
+        self.action_space = spaces.MultiDiscrete(np.full((n_envs, 2), grid_size))
+        self.observation_space = spaces.MultiDiscrete(np.full((n_envs, 2), grid_size))
+        self.closed = False
+
+        self._rng = None
+        self.state = np.zeros((n_envs, 2), dtype=np.int64)
+        # scratch buffers reused by every step
+        self._utility = np.empty((n_envs, 2))
+        self._outside = np.empty(n_envs)
+        self._deno = np.empty(n_envs)
+        self._rewards = np.empty((n_envs, 2))
+        self._terminated = np.zeros(n_envs, dtype=bool)
+        self._truncated = np.zeros(n_envs, dtype=bool)
+
+    def _per_market(self, value, name):
+        arr = np.broadcast_to(np.asarray(value, dtype=np.float64), (self.num_envs,))
+        if arr.ndim != 1:
+            raise ValueError(f"{name} must be a scalar or have shape ({self.num_envs},)")
+        return arr.copy()
+
+    def profits(self, actions, out=None):
+        """
+        Profits of both firms in every market for a batch of price index pairs.
+
+        Args:
+            actions: int array of shape (n_envs, 2)
+            out: optional float array of shape (n_envs, 2) to write the profits into
+
+        Returns:
+            profits: float array of shape (n_envs, 2)
+        """
+        p = self.prices[actions]                                   # (n_envs, 2)
+        mu = self.mu[:, None]
+        u = self._utility
+        np.subtract(self.a_12[:, None], p, out=u)
+        np.divide(u, mu, out=u)
+        np.divide(self.a_0, self.mu, out=self._outside)
+        # shift by the largest utility so that small mu cannot overflow exp
+        shift = np.maximum(u.max(axis=1), self._outside)
+        np.subtract(u, shift[:, None], out=u)
+        np.exp(u, out=u)
+        np.subtract(self._outside, shift, out=self._outside)
+        np.exp(self._outside, out=self._outside)
+        np.add(u.sum(axis=1), self._outside, out=self._deno)
+
+        if out is None:
+            out = np.empty((self.num_envs, 2))
+        np.subtract(p, self.cost[:, None], out=out)
+        np.multiply(out, u, out=out)
+        np.divide(out, self._deno[:, None], out=out)
+        return out
+
+    def step(self, actions):
+        '''
+        Logit demand system with outside option, evaluated for all markets at once.'''
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs, 2)
+        rewards = self.profits(actions, out=self._rewards)
+        self.state = actions.copy()
+        return (self.state.copy(), rewards.copy(),
+                self._terminated.copy(), self._truncated.copy(), {})
+
+    def reset(self, seed=None, options=None):
+        if seed is not None or self._rng is None:
+            self._rng, _ = seeding.np_random(seed)
+        # reset every market to a random price pair
+        self.state = self._rng.integers(self.grid_size, size=(self.num_envs, 2))
+        return self.state.copy(), {}
+
+    def close(self, **kwargs):
+        self.closed = True
+
 
 
 if __name__ == "__main__":
-    from scipy.optimize import fsolve
-    from scipy.optimize import minimize_scalar
     env = LogitDemandPricingEnv()
     obs, info = env.reset()
     print("Initial observation:", obs)
@@ -112,31 +256,16 @@ if __name__ == "__main__":
             break
     
 
-    # Monopoly Price
-    func_mono_profit = lambda p: (p - env.cost) * (np.exp((env.a_12 - p) / env.mu) / (np.exp((env.a_12 - p) / env.mu) + np.exp((env.a_0) / env.mu)))
-    p_mono = minimize_scalar(lambda p: -func_mono_profit(p), bounds=(env.price_min, env.price_max), method='bounded').x
-    p_mono = np.round(p_mono, 2)
-    print("Monopoly price:", p_mono)
-
-
-    if p_mono is not None:
-        print("Calculated monopoly price:", p_mono)
-    else:
-        print("Monopoly price calculation failed.")
-
-    # Nash Equilibrium Price
-    def func_nash_equilibrium(p_i, p_j):
-        d_i = np.exp((env.a_12 - p_i) / env.mu) / (np.exp((env.a_12 - p_i) / env.mu) + np.exp((env.a_12 - p_j) / env.mu) + np.exp((env.a_0) / env.mu))
-        d_j = np.exp((env.a_12 - p_j) / env.mu) / (np.exp((env.a_12 - p_i) / env.mu) + np.exp((env.a_12 - p_j) / env.mu) + np.exp((env.a_0) / env.mu))
-        return (p_i - env.cost) * d_i, (p_j - env.cost) * d_j
-    def equations(p):
-        p_i, p_j = p
-        return func_nash_equilibrium(p_i, p_j)
-    p_nash = fsolve(equations, (env.price_min, env.price_min))[0]
-    print("Nash equilibrium prices:", p_nash)
-    if p_nash is not None:
-        print("Calculated Nash equilibrium prices:", p_nash)
+    # Benchmarks from the first-order conditions (continuous) and the payoff table (grid)
+    try:
+        from sequential_pricing_env.equilibrium import grid_benchmarks, logit_benchmarks
+    except ImportError:
+        print("Benchmarks need the sequential_pricing_env package (pip install -e .)")
     else:
-        print("Nash equilibrium price calculation failed.")
+        bench = logit_benchmarks(env)
+        print("Monopoly price:", bench.monopoly)
+        print("Collusive price:", bench.collusive)
+        print("Nash equilibrium price:", bench.nash)
+        print("Grid benchmarks:", grid_benchmarks(env))
 
     env.close()
\ No newline at end of file
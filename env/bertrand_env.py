@@ -36,10 +36,16 @@ class BertrandPricingEnv(gym.Env):
                  price_min: float = 0.01,
                  price_max: float = 10.0,
                  grid_size: int = 100,
-                 marginal_cost: float = 2.0):
+                 marginal_cost: float = 2.0,
+                 payoff_cache_dir=None):
         super().__init__()
         self.prices = np.linspace(price_min, price_max, grid_size)
+        self.price_min = price_min
+        self.price_max = price_max
+        self.grid_size = grid_size
         self.cost = marginal_cost
+        self.payoff_cache_dir = payoff_cache_dir  # None: default cache dir, False: memory only
+        self._payoff = None  # built on first use, see payoff_table()
 
         # each firm’s action is picking an index in {0,…,grid_size–1}
         self.action_space = spaces.Tuple((
@@ -49,24 +55,44 @@ class BertrandPricingEnv(gym.Env):
         # dummy observation
         self.observation_space = spaces.Discrete(1)
 
-    def step(self, actions):
-        a_i, a_j = actions
-        p_i = self.prices[a_i]
-        p_j = self.prices[a_j]
+    def payoff_table(self):
+        """
+        Dense payoff tensor of shape (grid_size, grid_size, 2).
+        payoff[a_i, a_j] = (r_i, r_j) for the price index pair (a_i, a_j).
+        Built on first call and cached on disk keyed by the environment parameters
+        (in memory only when the sequential_pricing_env package is not installed).
+        """
+        if self._payoff is None:
+            params = dict(price_min=self.price_min, price_max=self.price_max,
+                          grid_size=self.grid_size, cost=self.cost)
+            try:
+                from sequential_pricing_env.payoff_cache import load_or_build
+            except ImportError:  # env/ used on its own, without the package: build uncached
+                self._payoff = np.ascontiguousarray(self._build_payoff_table(), dtype=np.float64)
+                self._payoff.flags.writeable = False
+            else:
+                self._payoff = load_or_build(type(self).__name__, params, self._build_payoff_table,
+                                             cache_dir=self.payoff_cache_dir)
+        return self._payoff
+
+    def _build_payoff_table(self):
+        p_i = self.prices[:, None]
+        p_j = self.prices[None, :]
 
-        # determine demand
-        if p_i < p_j and p_i <= self.prices[-1]:
-            d_i, d_j = 1.0, 0.0
-        elif p_j < p_i and p_j <= self.prices[-1]:
-            d_i, d_j = 0.0, 1.0
-        elif p_i == p_j and p_i <= self.prices[-1]:
-            d_i, d_j = 0.5, 0.5
-        else:
-            d_i, d_j = 0.0, 0.0
+        # determine demand: lower price takes the market, ties split it
+        d_i = np.where(p_i < p_j, 1.0, np.where(p_i == p_j, 0.5, 0.0))
+        d_j = np.where(p_j < p_i, 1.0, np.where(p_i == p_j, 0.5, 0.0))
 
         # profits
-        r_i = (p_i - self.cost) * d_i
-        r_j = (p_j - self.cost) * d_j
+        table = np.empty((self.grid_size, self.grid_size, 2))
+        table[..., 0] = (p_i - self.cost) * d_i
+        table[..., 1] = (p_j - self.cost) * d_j
+        return table
+
+    def step(self, actions):
+        a_i, a_j = actions
+        payoff = self._payoff if self._payoff is not None else self.payoff_table()
+        r_i, r_j = payoff[a_i, a_j]
 
         return 0, (r_i, r_j), False, {}
 
@@ -1,22 +1,37 @@
 # rf_interface.py
 
-import joblib
+import json
+import os
+import warnings
+from collections import OrderedDict, namedtuple
+
 import numpy as np
 
 PIPELINE_PATH = 'pipe_red_rf.joblib'
+COMPACT_VERSION = 2
 
-def load_pipeline(path=PIPELINE_PATH):
+def load_pipeline(path=PIPELINE_PATH, verbose=True):
     """
     Load the saved sklearn Pipeline from disk.
 
+    A directory written by export_compact() is loaded with load_compact()
+    instead, which needs neither joblib nor sklearn.
+
     Args:
-        path (str): Path to the .joblib file.
+        path (str): Path to the .joblib file or compact forest directory.
+        verbose (bool): Print a line once loaded.
 
     Returns:
-        pipeline (sklearn.Pipeline): The loaded model pipeline.
+        pipeline (sklearn.Pipeline or CompactForest): The loaded model pipeline.
     """
-    pipeline = joblib.load(path)
-    print(f"Loaded pipeline from '{path}'")
+    if os.path.isdir(path):
+        pipeline = load_compact(path)
+    else:
+        import joblib
+
+        pipeline = joblib.load(path)
+    if verbose:
+        print(f"Loaded pipeline from '{path}'")
     return pipeline
 
 
@@ -33,7 +48,444 @@ def predict(pipeline, feature_vector):
         prob (float): Predicted probability for class=1.
     """
     # Convert to 2D array: shape (1, n_features)
-    X = np.array(feature_vector).reshape(1, -1)
-    pred = pipeline.predict(X)[0]
-    prob = pipeline.predict_proba(X)[0, 1]
-    return pred, prob
+    X = np.asarray(feature_vector, dtype=np.float64).reshape(1, -1)
+    pred, prob = predict_batch(pipeline, X)
+    return pred[0], prob[0]
+
+
+def predict_batch(pipeline, X):
+    """
+    Run prediction on a batch of feature vectors with a single forest pass.
+
+    The label is derived from the class probabilities the same way the forest's
+    own `predict` does, so `predict` and `predict_proba` are not both run.
+    Rows are passed as plain arrays; no DataFrame is built.
+
+    Args:
+        pipeline (sklearn.Pipeline): The trained pipeline.
+        X (array-like): Features of shape (..., n_features), e.g. (n_sellers, n_features)
+            or (n_markets, n_sellers, n_features). Columns in training order.
+
+    Returns:
+        pred (np.ndarray): Predicted class labels, shape X.shape[:-1].
+        prob (np.ndarray): Predicted probabilities for class=1, shape X.shape[:-1].
+    """
+    X = np.asarray(X, dtype=np.float64)
+    lead_shape = X.shape[:-1]
+    proba = predict_proba_array(pipeline, X.reshape(-1, X.shape[-1]))
+    pred = _classes(pipeline).take(np.argmax(proba, axis=1))
+    return pred.reshape(lead_shape), proba[:, 1].reshape(lead_shape)
+
+
+def predict_proba_array(pipeline, X):
+    """
+    Class probabilities for a 2D float array of features.
+
+    Pipelines fitted on a DataFrame warn on every call with a bare array, and the
+    warning machinery alone costs more than a small forest. A median/mean imputer
+    in front of the forest is therefore applied directly from its fitted
+    statistics; other steps fall back to their own `transform` with the
+    feature-name warning silenced.
+
+    Args:
+        pipeline (sklearn.Pipeline or estimator): The trained model.
+        X (np.ndarray): Array of shape (n_samples, n_features).
+
+    Returns:
+        proba (np.ndarray): Array of shape (n_samples, n_classes).
+    """
+    if isinstance(pipeline, CompactForest):
+        return pipeline.predict_proba(X)  # never warns about feature names
+    steps = getattr(pipeline, "steps", None)
+    if steps is None:
+        return _call_without_name_warning(pipeline.predict_proba, X)
+    for _, step in steps[:-1]:
+        if step is None or step == "passthrough":
+            continue
+        X = _transform_array(step, X)
+    return _call_without_name_warning(steps[-1][1].predict_proba, X)
+
+
+def _transform_array(step, X):
+    statistics = getattr(step, "statistics_", None)
+    if (type(step).__name__ == "SimpleImputer"
+            and statistics is not None
+            and not getattr(step, "add_indicator", False)
+            and _is_nan(getattr(step, "missing_values", None))
+            and not np.isnan(statistics).any()):
+        # all-missing columns would be dropped by transform; those go the slow way
+        missing = np.isnan(X)
+        if missing.any():
+            X = np.where(missing, statistics, X)
+        return X
+    return _call_without_name_warning(step.transform, X)
+
+
+def _call_without_name_warning(method, X):
+    if not hasattr(getattr(method, "__self__", None), "feature_names_in_"):
+        return method(X)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        return method(X)
+
+
+def _is_nan(value):
+    return isinstance(value, float) and np.isnan(value)
+
+
+def _classes(pipeline):
+    steps = getattr(pipeline, "steps", None)
+    final = steps[-1][1] if steps is not None else pipeline
+    return np.asarray(final.classes_)
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize", "pinned"])
+
+
+class BuyBoxCache:
+    """
+    Bounded LRU cache of Buy Box predictions in front of a trained pipeline.
+
+    Prices live on a discrete grid, so the feature vectors seen during a
+    simulation repeat heavily. Each feature vector is quantized first,
+    feature k to the nearest multiple of quantum[k], and the quantized vector
+    is the cache key. Misses are scored on the quantized values, so a cached
+    result never depends on which raw vector happened to arrive first.
+
+    Besides the LRU part, a table precomputed for a whole feature grid can be
+    pinned in the cache (never evicted) and persisted to disk.
+    """
+
+    def __init__(self, pipeline, maxsize=1_000_000, quantum=1e-6):
+        """
+        Args:
+            pipeline (sklearn.Pipeline): The trained pipeline.
+            maxsize (int): Maximum number of LRU entries.
+            quantum (float or array-like): Quantization step, scalar or one per feature.
+        """
+        self.pipeline = pipeline
+        self.maxsize = maxsize
+        self.quantum = np.asarray(quantum, dtype=np.float64)
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._pinned = {}
+
+    # ------------------------------------------------------------------ #
+    # lookups
+    # ------------------------------------------------------------------ #
+    def predict(self, feature_vector):
+        """Cached equivalent of rf_interface.predict."""
+        pred, prob = self.predict_batch(np.asarray(feature_vector, dtype=np.float64).reshape(1, -1))
+        return pred[0], prob[0]
+
+    def predict_batch(self, X):
+        """
+        Cached equivalent of rf_interface.predict_batch.
+
+        All misses of the batch are scored with one forest pass.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        lead_shape = X.shape[:-1]
+        q = self._quantize(X.reshape(-1, X.shape[-1]))
+        pred = np.empty(q.shape[0], dtype=_classes(self.pipeline).dtype)
+        prob = np.empty(q.shape[0])
+
+        missing = {}  # key -> row positions waiting for it
+        for i in range(q.shape[0]):
+            key = q[i].tobytes()
+            hit = self._pinned.get(key)
+            if hit is None:
+                hit = self._lru.get(key)
+                if hit is not None:
+                    self._lru.move_to_end(key)
+            if hit is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                pred[i], prob[i] = hit
+        self.hits += q.shape[0] - len(missing)  # repeats within the batch are served once scored
+
+        if missing:
+            rows = np.array([positions[0] for positions in missing.values()])
+            new_pred, new_prob = predict_batch(self.pipeline, self._dequantize(q[rows]))
+            for (key, positions), p, pr in zip(missing.items(), new_pred, new_prob):
+                pred[positions] = p
+                prob[positions] = pr
+                self._lru[key] = (p, pr)
+            self.misses += len(missing)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+        return pred.reshape(lead_shape), prob.reshape(lead_shape)
+
+    def cache_info(self):
+        """Hit/miss counters and sizes, in the spirit of functools.lru_cache."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._lru), len(self._pinned))
+
+    def clear(self):
+        """Drop the LRU entries and reset the counters. Pinned entries are kept."""
+        self._lru.clear()
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------ #
+    # precomputed tables
+    # ------------------------------------------------------------------ #
+    def precompute(self, grid, path=None, chunk_size=65536):
+        """
+        Score every point of a feature grid and pin the results in the cache.
+
+        Args:
+            grid (sequence): One 1D array of candidate values per feature; the
+                table covers their Cartesian product.
+            path (str): Optional .npz file to persist the table to.
+            chunk_size (int): Number of grid points scored per forest pass.
+
+        Returns:
+            n_entries (int): Number of grid points in the table.
+        """
+        axes = [np.asarray(values, dtype=np.float64) for values in grid]
+        shape = tuple(len(values) for values in axes)
+        total = int(np.prod(shape))
+        keys = np.empty((total, len(axes)), dtype=np.int64)
+        preds = np.empty(total, dtype=_classes(self.pipeline).dtype)
+        probs = np.empty(total)
+        for start in range(0, total, chunk_size):
+            stop = min(start + chunk_size, total)
+            idx = np.unravel_index(np.arange(start, stop), shape)
+            X = np.column_stack([values[i] for values, i in zip(axes, idx)])
+            q = self._quantize(X)
+            keys[start:stop] = q
+            preds[start:stop], probs[start:stop] = predict_batch(self.pipeline, self._dequantize(q))
+        self._pin(keys, preds, probs)
+        if path is not None:
+            np.savez_compressed(path, keys=keys, pred=preds, prob=probs, quantum=self.quantum)
+        return total
+
+    def load_table(self, path):
+        """
+        Pin a table written by precompute() into the cache.
+
+        Returns:
+            n_entries (int): Number of entries loaded.
+        """
+        with np.load(path) as data:
+            if not np.array_equal(np.broadcast_to(data["quantum"], self.quantum.shape), self.quantum):
+                raise ValueError(f"Table '{path}' was built with a different quantum")
+            self._pin(data["keys"], data["pred"], data["prob"])
+            return len(data["pred"])
+
+    def _pin(self, keys, preds, probs):
+        for q, p, pr in zip(keys, preds, probs):
+            self._pinned[q.tobytes()] = (p, pr)
+
+    # ------------------------------------------------------------------ #
+    # quantization
+    # ------------------------------------------------------------------ #
+    _NAN_KEY = np.iinfo(np.int64).min
+
+    def _quantize(self, X):
+        scaled = np.round(X / self.quantum)
+        nan = np.isnan(scaled)
+        q = np.where(nan, 0, scaled).astype(np.int64)
+        q[nan] = self._NAN_KEY  # missing features keep their own key and are imputed on a miss
+        return q
+
+    def _dequantize(self, q):
+        X = q * self.quantum
+        X[q == self._NAN_KEY] = np.nan
+        return X
+
+
+# ---------------------------------------------------------------------- #
+# compact forest
+# ---------------------------------------------------------------------- #
+_COMPACT_ARRAYS = ("feature", "threshold", "children", "value", "roots")
+
+
+def export_compact(pipeline, path):
+    """
+    Flatten a fitted imputer + random forest pipeline into memory-mappable arrays.
+
+    All trees go into one set of node arrays, written as .npy files in the
+    directory `path` together with a meta.json:
+
+        feature, threshold   split of every node (int32, float64)
+        children             global child indices, interleaved: children[2 * node]
+                             is the left and children[2 * node + 1] the right
+                             child; leaves point to themselves
+        value                class probabilities of every node's tree-level
+                             predict_proba, shape (n_nodes, n_classes)
+        roots                index of each tree's root node
+
+    Args:
+        pipeline (sklearn.Pipeline or estimator): Forest classifier, optionally
+            preceded by a SimpleImputer, as in pipe_red_rf.joblib.
+        path (str): Output directory, created if needed.
+
+    Returns:
+        forest (CompactForest): The exported forest, loaded from `path`.
+    """
+    steps = list(getattr(pipeline, "steps", [(None, pipeline)]))
+    forest = steps[-1][1]
+    statistics = None
+    for _, step in steps[:-1]:
+        if step is None or step == "passthrough":
+            continue
+        if type(step).__name__ != "SimpleImputer" or getattr(step, "add_indicator", False):
+            raise TypeError(f"Cannot export pipeline step {type(step).__name__}")
+        statistics = np.asarray(step.statistics_, dtype=np.float64)
+    estimators = getattr(forest, "estimators_", None)
+    if estimators is None or getattr(forest, "n_outputs_", 1) != 1:
+        raise TypeError(f"Cannot export {type(forest).__name__}, expected a single-output forest classifier")
+
+    parts = {name: [] for name in _COMPACT_ARRAYS}
+    offset = 0
+    for tree in (e.tree_ for e in estimators):
+        n = tree.node_count
+        ids = np.arange(offset, offset + n)
+        leaf = tree.children_left == -1
+        parts["feature"].append(np.where(leaf, 0, tree.feature).astype(np.int32))
+        parts["threshold"].append(np.where(leaf, np.inf, tree.threshold))
+        left = np.where(leaf, ids, tree.children_left + offset)
+        right = np.where(leaf, ids, tree.children_right + offset)
+        parts["children"].append(np.stack([left, right], axis=1).ravel().astype(np.int32))
+        # DecisionTreeClassifier.predict_proba: node values normalized to sum to one
+        value = np.array(tree.value[:, 0, :], dtype=np.float64)
+        normalizer = value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        parts["value"].append(value / normalizer)
+        parts["roots"].append(np.array([offset], dtype=np.int32))
+        offset += n
+
+    os.makedirs(path, exist_ok=True)
+    for name, chunks in parts.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(np.concatenate(chunks)))
+    meta = {
+        "version": COMPACT_VERSION,
+        "n_features": int(forest.n_features_in_),
+        "classes": np.asarray(forest.classes_).tolist(),
+        "max_depth": int(max(e.tree_.max_depth for e in estimators)),
+        "statistics": None if statistics is None else statistics.tolist(),
+        "feature_names": [str(f) for f in getattr(pipeline, "feature_names_in_", [])] or None,
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return load_compact(path)
+
+
+def load_compact(path, mmap=True):
+    """
+    Load a forest written by export_compact().
+
+    Args:
+        path (str): Directory of the export.
+        mmap (bool): Memory-map the node arrays (read-only), so processes
+            loading the same export share its pages through the OS cache.
+
+    Returns:
+        forest (CompactForest)
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["version"] != COMPACT_VERSION:
+        raise ValueError(f"Compact forest '{path}' has version {meta['version']}, expected {COMPACT_VERSION}")
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+              for name in _COMPACT_ARRAYS}
+    return CompactForest(meta, **arrays)
+
+
+class CompactForest:
+    """
+    NumPy-only evaluator of an exported forest.
+
+    Reproduces the pipeline's predict_proba exactly: missing values are
+    imputed from the fitted statistics, features are cast to float32 as the
+    sklearn trees do, every tree is traversed with `x <= threshold` going
+    left, and tree probabilities are summed in tree order before dividing by
+    the number of trees. Usable wherever a pipeline is expected in this
+    module (predict, predict_batch, BuyBoxCache), and like the pipeline it
+    has classes_ and, if it was fitted on named columns, feature_names_in_.
+
+    Built for the simulation's small per-step batches; for batches of tens of
+    thousands of rows the compiled sklearn trees remain faster.
+    """
+
+    chunk_size = 4096  # samples traversed together
+
+    def __init__(self, meta, feature, threshold, children, value, roots):
+        self.meta = meta
+        self.classes_ = np.asarray(meta["classes"])
+        self.n_features = meta["n_features"]
+        self.statistics = None if meta["statistics"] is None else np.asarray(meta["statistics"])
+        self.max_depth = meta["max_depth"]
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children  # [2 * node + went_right], used as mapped, never copied
+        self.value = value
+        self.roots = roots
+
+    @property
+    def feature_names_in_(self):
+        """Training column names, as on the exported pipeline; absent if it was fitted without names."""
+        names = self.meta["feature_names"]
+        if names is None:
+            raise AttributeError("the exported pipeline was fitted without feature names")
+        return np.asarray(names, dtype=object)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """
+        Leaf reached by every sample in every tree.
+
+        Args:
+            X (np.ndarray): Features of shape (n_samples, n_features).
+
+        Returns:
+            leaves (np.ndarray): Global node indices, shape (n_samples, n_trees).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X must have shape (n_samples, {self.n_features}), got {X.shape}")
+        if self.statistics is not None:
+            missing = np.isnan(X)
+            if missing.any():
+                X = np.where(missing, self.statistics, X)
+        X = X.astype(np.float32)
+        leaves = np.empty((X.shape[0], self.n_trees), dtype=np.intp)
+        for start in range(0, X.shape[0], self.chunk_size):
+            leaves[start:start + self.chunk_size] = self._descend(X[start:start + self.chunk_size])
+        return leaves
+
+    def _descend(self, X):
+        flat_x = X.ravel()
+        row_offset = (np.arange(X.shape[0]) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).astype(np.intp)
+        # leaves point to themselves, so max_depth steps settle every path; once a
+        # step moves no sample, every path has reached its leaf
+        for _ in range(self.max_depth):
+            x = flat_x.take(row_offset + self.feature.take(node))
+            go_right = ~(x <= self.threshold.take(node))  # NaN goes right, as in sklearn
+            child = self.children.take(2 * node + go_right)
+            if np.array_equal(child, node):
+                break
+            node = child
+        return node
+
+    def predict_proba(self, X):
+        """
+        Class probabilities, identical to the exported pipeline's predict_proba.
+
+        Returns:
+            proba (np.ndarray): Array of shape (n_samples, n_classes).
+        """
+        tree_proba = self.value[self.apply(X)]  # (n_samples, n_trees, n_classes)
+        # cumulative sum adds tree by tree, the order sklearn accumulates in
+        return np.cumsum(tree_proba, axis=1)[:, -1] / self.n_trees
+
+    def predict(self, X):
+        """Class labels, as the forest's own predict."""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
@@ -0,0 +1,512 @@
+# rf_server.py
+"""
+Local Buy Box inference server shared by simulation workers.
+
+Every joblib worker of Amazon_FeatureOffer_Simulation.ipynb otherwise loads
+its own copy of the forest and scores one row at a time. The server loads the
+pipeline once and listens on a Unix socket; requests that arrive while a
+batch is being scored, or within `max_wait` seconds of the first one, are
+stacked and scored with a single forest pass. Serving a compact forest
+directory (rf_interface.export_compact) keeps the small passes this produces
+well under a millisecond.
+
+Clients:
+    RemotePipeline  blocking, picklable; has predict_proba and classes_, so it can
+                    be passed to rf_interface.predict / predict_batch / BuyBoxCache
+                    in place of the pipeline
+    BuyBoxClient    asyncio client with predict / predict_batch matching rf_interface
+
+The default socket lives in the temp dir and is named after the user id and
+an optional sweep name (default_socket), so concurrent sweeps of different
+users or with different names get separate servers. A server never replaces
+a socket another server is still accepting connections on.
+
+Example:
+    server = start_server_process()                  # or: python rf_server.py --name sweep-a
+    remote = RemotePipeline()
+    bb_cache = BuyBoxCache(remote)                   # cache per worker, batching across workers
+    label, prob = predict(remote, feature_vector)
+    print(remote.stats())                            # queue depth, batch sizes, latencies
+    server.terminate()
+
+Wire format, little endian: after connecting the server sends a 4-byte length
+and a JSON hello (n_features, classes). Each frame is a (kind, request id,
+rows, cols) header of four uint32 followed by rows * cols float64 values;
+stats and error replies carry `rows` bytes of UTF-8 instead.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from rf_interface import PIPELINE_PATH, _classes, load_pipeline, predict_proba_array
+
+PROTOCOL_VERSION = 1
+
+_HEADER = struct.Struct("<IIII")  # kind, request id, rows, cols
+_LENGTH = struct.Struct("<I")
+PROBA, STATS, ERROR = 0, 1, 2
+
+
+def default_socket(name=None):
+    """
+    Socket path of the current user's server, <tmpdir>/buybox-rf-<uid>[-<name>].sock.
+
+    Args:
+        name (str): Optional sweep name, for several servers of one user.
+    """
+    suffix = f"-{name}" if name else ""
+    return os.path.join(tempfile.gettempdir(), f"buybox-rf-{os.getuid()}{suffix}.sock")
+
+
+DEFAULT_SOCKET = default_socket()
+
+
+def _remove_stale_socket(path):
+    """Delete a socket file left by a dead server; refuse if a server still accepts on it."""
+    if not os.path.exists(path):
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    raise FileExistsError(f"a Buy Box server is already listening on '{path}'; "
+                          f"pick another socket_path or sweep name")
+
+
+# ---------------------------------------------------------------------- #
+# server
+# ---------------------------------------------------------------------- #
+class BuyBoxServer:
+    """
+    Micro-batching inference server around one loaded pipeline.
+
+    Requests are queued as they arrive. The batcher takes the first waiting
+    request, keeps collecting for up to `max_wait` seconds or until `max_batch`
+    rows are queued, and scores the stacked rows in a worker thread, so new
+    requests keep queueing during the forest pass.
+    """
+
+    def __init__(self, pipeline, socket_path=DEFAULT_SOCKET, max_batch=4096, max_wait=0.002):
+        """
+        Args:
+            pipeline (sklearn.Pipeline or CompactForest): The trained model.
+            socket_path (str): Unix socket to listen on; a stale file there is replaced,
+                one a server still accepts connections on raises FileExistsError.
+            max_batch (int): Rows per forest pass; a larger single request is scored whole.
+            max_wait (float): Seconds the first request of a batch waits for company.
+        """
+        self.pipeline = pipeline
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.classes = _classes(pipeline)
+        self.n_features = int(getattr(pipeline, "n_features_in_", 0) or getattr(pipeline, "n_features", 0))
+        self._queue = None
+        self._server = None
+        self._batcher = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="buybox-rf")
+        self._queued_rows = 0
+        self._metrics = {
+            "connections": 0, "requests": 0, "rows": 0, "batches": 0, "errors": 0,
+            "max_batch_rows": 0, "max_queue_rows": 0,
+            "wait_s": 0.0, "compute_s": 0.0,
+            "batch_rows_histogram": {},  # power-of-two upper bound -> number of batches
+        }
+
+    async def start(self):
+        _remove_stale_socket(self.socket_path)
+        self._queue = asyncio.Queue()
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        self._batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self._executor.shutdown(wait=False)
+        if self._server is not None:  # only remove a socket this server created
+            self._server.close()
+            await self._server.wait_closed()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def stats(self):
+        """
+        Server metrics.
+
+        Returns:
+            dict with counters (connections, requests, rows, batches, errors), the
+            current and maximum number of queued rows, mean and maximum rows per
+            forest pass, mean queueing and compute time per batch in ms and a
+            histogram of batch sizes keyed by power-of-two upper bound
+        """
+        m = dict(self._metrics)
+        batches = max(m["batches"], 1)
+        m["queue_rows"] = self._queued_rows
+        m["queue_requests"] = self._queue.qsize() if self._queue is not None else 0
+        m["mean_batch_rows"] = m["rows"] / batches
+        m["mean_wait_ms"] = m.pop("wait_s") / batches * 1e3
+        m["mean_compute_ms"] = m.pop("compute_s") / batches * 1e3
+        m["batch_rows_histogram"] = dict(sorted(m["batch_rows_histogram"].items()))
+        return m
+
+    async def _handle(self, reader, writer):
+        self._metrics["connections"] += 1
+        hello = json.dumps({"version": PROTOCOL_VERSION, "n_features": self.n_features,
+                            "classes": self.classes.tolist()}).encode()
+        pending = set()
+        try:
+            writer.write(_LENGTH.pack(len(hello)) + hello)
+            while True:
+                try:
+                    kind, request_id, rows, cols = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                except asyncio.IncompleteReadError:
+                    break
+                if kind == STATS:
+                    _reply_text(writer, STATS, request_id, json.dumps(self.stats()))
+                    continue
+                payload = await reader.readexactly(rows * cols * 8)
+                if self.n_features and cols != self.n_features:
+                    # rejected up front so a malformed request cannot fail a whole batch
+                    self._metrics["errors"] += 1
+                    _reply_text(writer, ERROR, request_id,
+                                f"ValueError: X has {cols} features, the model expects {self.n_features}")
+                    continue
+                X = np.frombuffer(payload, dtype=np.float64).reshape(rows, cols)
+                future = asyncio.get_running_loop().create_future()
+                self._queue.put_nowait((X, future, time.perf_counter()))
+                self._queued_rows += rows
+                self._metrics["max_queue_rows"] = max(self._metrics["max_queue_rows"], self._queued_rows)
+                task = asyncio.ensure_future(self._reply(writer, request_id, future))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except ConnectionError:
+            pass  # client went away, e.g. the readiness probe of start_server_process
+        finally:
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            writer.close()
+
+    async def _reply(self, writer, request_id, future):
+        try:
+            proba = await future
+        except Exception as exc:  # scoring failed; report it to the client instead of dropping it
+            self._metrics["errors"] += 1
+            _reply_text(writer, ERROR, request_id, f"{type(exc).__name__}: {exc}")
+        else:
+            proba = np.ascontiguousarray(proba, dtype=np.float64)
+            writer.write(_HEADER.pack(PROBA, request_id, *proba.shape) + proba.tobytes())
+        await writer.drain()
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while rows < self.max_batch:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                batch.append(item)
+                rows += len(item[0])
+            self._queued_rows -= rows
+
+            start = time.perf_counter()
+            X = batch[0][0] if len(batch) == 1 else np.concatenate([item[0] for item in batch])
+            try:
+                proba = await loop.run_in_executor(self._executor, predict_proba_array, self.pipeline, X)
+            except Exception as exc:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            end = time.perf_counter()
+
+            m = self._metrics
+            m["requests"] += len(batch)
+            m["rows"] += rows
+            m["batches"] += 1
+            m["max_batch_rows"] = max(m["max_batch_rows"], rows)
+            m["wait_s"] += start - min(item[2] for item in batch)
+            m["compute_s"] += end - start
+            bound = 1 << max(rows - 1, 0).bit_length()
+            m["batch_rows_histogram"][bound] = m["batch_rows_histogram"].get(bound, 0) + 1
+
+            offset = 0
+            for X_i, future, _ in batch:
+                n = len(X_i)
+                if not future.done():  # the client may have disconnected
+                    future.set_result(proba[offset:offset + n])
+                offset += n
+
+
+def _reply_text(writer, kind, request_id, text):
+    data = text.encode()
+    writer.write(_HEADER.pack(kind, request_id, len(data), 0) + data)
+
+
+def serve(path=PIPELINE_PATH, socket_path=DEFAULT_SOCKET, max_batch=4096, max_wait=0.002):
+    """Load the pipeline (joblib file or compact directory) and serve it until interrupted."""
+    pipeline = load_pipeline(path, verbose=False)
+    server = BuyBoxServer(pipeline, socket_path, max_batch=max_batch, max_wait=max_wait)
+
+    async def main():
+        await server.start()
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def start_server_process(path=PIPELINE_PATH, socket_path=DEFAULT_SOCKET, timeout=60.0, **kwargs):
+    """
+    Run serve() in a separate process and wait until it accepts connections.
+
+    The process is not daemonic, so the forest keeps its n_jobs parallelism
+    (joblib falls back to one job inside daemons); it is terminated at exit.
+
+    Returns:
+        process (multiprocessing.Process): Stop it with process.terminate().
+    """
+    import atexit
+    import multiprocessing
+
+    _remove_stale_socket(socket_path)
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(path, socket_path), kwargs=kwargs)
+    process.start()
+    atexit.register(process.terminate)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+            return process
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not process.is_alive():
+                raise RuntimeError(f"Buy Box server exited with code {process.exitcode}")
+            if time.monotonic() > deadline:
+                process.terminate()
+                raise TimeoutError(f"Buy Box server did not start listening on '{socket_path}'")
+            time.sleep(0.05)
+
+
+# ---------------------------------------------------------------------- #
+# clients
+# ---------------------------------------------------------------------- #
+class ServerError(RuntimeError):
+    """Scoring failed inside the server."""
+
+
+class RemotePipeline:
+    """
+    Blocking client that stands in for the pipeline.
+
+    Connects lazily and reconnects after being pickled, so it can be captured
+    by joblib workers like the pipeline itself.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.socket_path = socket_path
+        self._sock = None
+        self._hello = None
+        self._next_id = 0
+
+    def __getstate__(self):
+        return {"socket_path": self.socket_path}
+
+    def __setstate__(self, state):
+        self.__init__(state["socket_path"])
+
+    @property
+    def classes_(self):
+        self._connect()
+        return np.asarray(self._hello["classes"])
+
+    @property
+    def n_features(self):
+        self._connect()
+        return self._hello["n_features"]
+
+    def predict_proba(self, X):
+        """Class probabilities, shape (n_samples, n_classes), scored by the server."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim != 2:
+            raise ValueError(f"expected a 2D array, got shape {X.shape}")
+        kind, rows, cols, payload = self._request(PROBA, X)
+        return np.frombuffer(payload, dtype=np.float64).reshape(rows, cols)
+
+    def stats(self):
+        """Server metrics, see BuyBoxServer.stats()."""
+        return json.loads(self._request(STATS)[3])
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socket_path)
+            (length,) = _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))
+            self._hello = json.loads(_recv_exactly(sock, length))
+            self._sock = sock
+        return self._sock
+
+    def _request(self, kind, X=None):
+        sock = self._connect()
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        if X is None:
+            sock.sendall(_HEADER.pack(kind, self._next_id, 0, 0))
+        else:
+            sock.sendall(_HEADER.pack(kind, self._next_id, *X.shape) + X.tobytes())
+        kind, _, rows, cols = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+        payload = _recv_exactly(sock, rows * cols * 8 if kind == PROBA else rows)
+        if kind == ERROR:
+            raise ServerError(payload.decode())
+        return kind, rows, cols, payload
+
+
+def _recv_exactly(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    while view:
+        k = sock.recv_into(view)
+        if not k:
+            raise ConnectionError("Buy Box server closed the connection")
+        view = view[k:]
+    return bytes(buf)
+
+
+class BuyBoxClient:
+    """
+    asyncio client; many coroutines may await it concurrently over one connection.
+
+    Example:
+        client = await BuyBoxClient.connect()
+        label, prob = await client.predict(feature_vector)
+        await client.close()
+    """
+
+    def __init__(self, reader, writer, hello):
+        self._reader = reader
+        self._writer = writer
+        self.classes_ = np.asarray(hello["classes"])
+        self.n_features = hello["n_features"]
+        self._pending = {}
+        self._next_id = 0
+        self._receiver = asyncio.get_running_loop().create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, socket_path=DEFAULT_SOCKET):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+        return cls(reader, writer, json.loads(await reader.readexactly(length)))
+
+    async def predict(self, feature_vector):
+        """Async equivalent of rf_interface.predict."""
+        pred, prob = await self.predict_batch(np.asarray(feature_vector, dtype=np.float64).reshape(1, -1))
+        return pred[0], prob[0]
+
+    async def predict_batch(self, X):
+        """Async equivalent of rf_interface.predict_batch."""
+        X = np.asarray(X, dtype=np.float64)
+        lead_shape = X.shape[:-1]
+        proba = await self.predict_proba(X.reshape(-1, X.shape[-1]))
+        pred = self.classes_.take(np.argmax(proba, axis=1))
+        return pred.reshape(lead_shape), proba[:, 1].reshape(lead_shape)
+
+    async def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        kind, rows, cols, payload = await self._request(PROBA, X)
+        return np.frombuffer(payload, dtype=np.float64).reshape(rows, cols)
+
+    async def stats(self):
+        """Server metrics, see BuyBoxServer.stats()."""
+        return json.loads((await self._request(STATS))[3])
+
+    async def close(self):
+        self._receiver.cancel()
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def _request(self, kind, X=None):
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        if X is None:
+            self._writer.write(_HEADER.pack(kind, request_id, 0, 0))
+        else:
+            self._writer.write(_HEADER.pack(kind, request_id, *X.shape) + X.tobytes())
+        await self._writer.drain()
+        return await future
+
+    async def _receive(self):
+        try:
+            while True:
+                kind, request_id, rows, cols = _HEADER.unpack(await self._reader.readexactly(_HEADER.size))
+                payload = await self._reader.readexactly(rows * cols * 8 if kind == PROBA else rows)
+                future = self._pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if kind == ERROR:
+                    future.set_exception(ServerError(payload.decode()))
+                else:
+                    future.set_result((kind, rows, cols, payload))
+        except (asyncio.IncompleteReadError, ConnectionError) as exc:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"Buy Box server closed the connection: {exc}"))
+            self._pending.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Buy Box model to local simulation workers.")
+    parser.add_argument("--pipeline", default=PIPELINE_PATH, help="joblib file or compact forest directory")
+    parser.add_argument("--socket", default=None, help="Unix socket path, default: default_socket(--name)")
+    parser.add_argument("--name", default=None, help="sweep name in the default socket path")
+    parser.add_argument("--max-batch", type=int, default=4096, help="rows per forest pass")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="batching window of the first request")
+    args = parser.parse_args(argv)
+    socket_path = args.socket or default_socket(args.name)
+    print(f"Serving '{args.pipeline}' on {socket_path}")
+    serve(args.pipeline, socket_path, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1e3)
+
+
+if __name__ == "__main__":
+    main()
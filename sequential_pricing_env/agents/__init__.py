@@ -0,0 +1,37 @@
+"""
+Sub‑package that bundles the learning agents used in the pricing simulations.
+"""
+
+from .asker import AskerQLearningAgent
+from .klein import KleinQLearningAgent
+from .q_learning import (
+    DummyQLearningRuleAgent,
+    QLearningAgent,
+    QLearningRuleAgent,
+    joint_to_index,
+)
+from .qstore import (
+    HashedUniform,
+    SparseQTable,
+    compact_q_table,
+    greedy_agreement,
+    joint_index,
+    make_q_table,
+    q_table_report,
+)
+
+__all__ = [
+    "AskerQLearningAgent",
+    "DummyQLearningRuleAgent",
+    "HashedUniform",
+    "KleinQLearningAgent",
+    "QLearningAgent",
+    "QLearningRuleAgent",
+    "SparseQTable",
+    "compact_q_table",
+    "greedy_agreement",
+    "joint_index",
+    "joint_to_index",
+    "make_q_table",
+    "q_table_report",
+]
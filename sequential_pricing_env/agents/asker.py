@@ -0,0 +1,180 @@
+"""
+Stateless Q-learning agents of Asker, Fershtman and Pakes (2022), from asker_et_al_2022.ipynb.
+
+The agents learn one value per price in a repeated Bertrand game and play
+greedily. Three update protocols are supported:
+  - 'async': update only the played price
+  - 'sync_perfect': update all prices using exact counterfactual profits
+  - 'sync_downward': update the other prices under a downward-demand assumption
+
+Counterfactual profits of every own price against every rival price are
+tabulated once per agent, so a synchronous update is a single NumPy row
+operation instead of a loop over the price grid. `simulate_batch` runs all
+runs together on stacked (runs, grid_size) Q arrays and reproduces the
+per-run reference loop (`batched=False`) exactly for the same global seed.
+"""
+
+import numpy as np
+
+UPDATE_TYPES = ("async", "sync_perfect", "sync_downward")
+
+
+def bertrand_demand(prices):
+    """
+    Demand of a firm for every (own, rival) price index pair.
+
+    Lower price takes the market, ties split it; shape (G, G), indexed [own, rival].
+    """
+    p_i = prices[:, None]
+    p_j = prices[None, :]
+    # p_i <= prices[-1] always holds on the grid
+    return np.where(p_i < p_j, 1.0, np.where(p_i == p_j, 0.5, 0.0))
+
+
+class AskerQLearningAgent:
+    """
+    Q-learning agent supporting three update protocols:
+      - 'async': update only the played price
+      - 'sync_perfect': update all prices using exact counterfactual profits
+      - 'sync_downward': update others under downward-demand assumption
+    """
+    def __init__(self,
+                 n_actions: int,
+                 alpha: float = 0.1,
+                 init_low: float = 10.0,
+                 init_high: float = 20.0,
+                 update_type: str = 'async',
+                 cost: float = 2.0,
+                 prices: np.ndarray = None):
+        '''
+        Parameters
+        ----------
+        n_actions: int
+            Number of actions (prices) available to the agent.
+        alpha: float
+            Learning rate for Q-learning.
+        init_low: float
+            Lower bound for initial Q-values.
+        init_high: float
+            Upper bound for initial Q-values.
+        update_type: str
+            Update protocol used by the agent, one of UPDATE_TYPES.
+        cost: float
+            Cost of the product.
+        prices: np.ndarray
+            Array of prices available to the agent.
+        '''
+        if update_type not in UPDATE_TYPES:
+            raise ValueError(f"Unknown update_type: {update_type}")
+        self.n_actions = n_actions
+        self.Q = np.random.uniform(init_low, init_high, size=n_actions) # shape (n_actions,)
+        self.alpha = alpha
+        self.update_type = update_type
+        self.cost = cost
+        self.prices = prices
+        # demand and profit of every own price (rows) against every rival price (columns)
+        self.demand = bertrand_demand(prices)
+        self.profit = (prices[:, None] - cost) * self.demand
+
+    def select_action(self) -> int:
+        return int(np.argmax(self.Q))
+
+    def state_dict(self):
+        """The agent's only learned state, see sequential_pricing_env.checkpoint."""
+        return {"Q": self.Q}
+
+    def load_state_dict(self, state):
+        self.Q = state["Q"]
+
+    def update(self,
+               action: int,
+               reward: float,
+               competitor_action: int):
+        Q = self.Q
+        if self.update_type == 'async':
+            # only update the chosen price
+            Q[action] = self.alpha * reward + (1 - self.alpha) * Q[action]
+
+        elif self.update_type == 'sync_perfect':
+            # every price learns its counterfactual profit against the rival's price
+            Q[:] = self.alpha * self.profit[:, competitor_action] + (1 - self.alpha) * Q
+
+        else:  # sync_downward
+            q = self.demand[action, competitor_action]  # realized demand at the chosen price
+            profit_est = (self.prices - self.cost) * q
+            p_i = self.prices[action]
+            # higher prices are capped at, lower prices raised to, the downward-demand estimate
+            move = ((self.prices > p_i) & (Q > profit_est)) | ((self.prices < p_i) & (profit_est > Q))
+            Q[move] = self.alpha * profit_est[move] + (1 - self.alpha) * Q[move]
+            # chosen price gets actual profit
+            Q[action] = self.alpha * reward + (1 - self.alpha) * Q[action]
+
+
+def simulate_once(env, update_type, periods, alpha):
+    """Run one simulation, return firm-1 price history."""
+    ag1 = AskerQLearningAgent(len(env.prices), alpha, 10, 20, update_type, env.cost, env.prices)
+    ag2 = AskerQLearningAgent(len(env.prices), alpha, 10, 20, update_type, env.cost, env.prices)
+    history = np.zeros(periods)
+
+    for t in range(periods):
+        a1 = ag1.select_action()
+        a2 = ag2.select_action()
+        _, (r1, r2), _, _ = env.step((a1, a2))
+        ag1.update(a1, r1, a2)
+        ag2.update(a2, r2, a1)
+        history[t] = env.prices[a1]
+
+    return history
+
+
+def simulate_batch(update_type, periods, runs, alpha, env, batched=True):
+    """
+    Run `runs` simulations.
+
+    Args:
+        update_type: One of UPDATE_TYPES
+        periods, runs: Length and number of runs
+        alpha: Learning rate
+        env: BertrandPricingEnv
+        batched: Step all runs together on (runs, grid_size) Q arrays. False loops
+            over simulate_once; both consume NumPy's global random state identically.
+
+    Returns:
+        history: Firm-1 prices, shape (runs, periods)
+    """
+    if not batched:
+        return np.array([simulate_once(env, update_type, periods, alpha)
+                         for _ in range(runs)])
+    if update_type not in UPDATE_TYPES:
+        raise ValueError(f"Unknown update_type: {update_type}")
+
+    prices = env.prices
+    G = len(prices)
+    # same draw order as creating ag1, ag2 of run 0, then of run 1, ...
+    Q = np.random.uniform(10, 20, size=(runs, 2, G))
+    Q1, Q2 = Q[:, 0], Q[:, 1]
+    payoff = env.payoff_table()
+    demand = bertrand_demand(prices)
+    profit = (prices[:, None] - env.cost) * demand  # [own, rival], same for both firms
+    rows = np.arange(runs)
+    history = np.zeros((runs, periods))
+
+    for t in range(periods):
+        a1 = Q1.argmax(axis=1)
+        a2 = Q2.argmax(axis=1)
+        r = payoff[a1, a2]
+        for Qk, own, rival, reward in ((Q1, a1, a2, r[:, 0]), (Q2, a2, a1, r[:, 1])):
+            if update_type == 'async':
+                Qk[rows, own] = alpha * reward + (1 - alpha) * Qk[rows, own]
+            elif update_type == 'sync_perfect':
+                Qk[:] = alpha * profit[:, rival].T + (1 - alpha) * Qk
+            else:
+                q = demand[own, rival]
+                profit_est = (prices - env.cost)[None, :] * q[:, None]
+                p_own = prices[own][:, None]
+                move = ((prices > p_own) & (Qk > profit_est)) | ((prices < p_own) & (profit_est > Qk))
+                Qk[move] = alpha * profit_est[move] + (1 - alpha) * Qk[move]
+                Qk[rows, own] = alpha * reward + (1 - alpha) * Qk[rows, own]
+        history[:, t] = prices[a1]
+
+    return history
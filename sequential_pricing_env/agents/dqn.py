@@ -0,0 +1,395 @@
+"""
+DQN pricing agent for the Buy Box simulation (Amazon_FeatureOffer_Simulation.ipynb).
+
+The agent can drive many independent markets at once: every market has its
+own network and its own replay memory, but the weights of all networks are
+stacked into single tensors, so action selection and training are one
+batched matrix product per layer instead of a Python loop over markets. Adam
+works elementwise and the loss is summed over markets, which keeps the
+markets exactly independent.
+
+The replay memory is a preallocated ring buffer. Transitions are written in
+place and sampled batches are gathered straight into preallocated (pinned,
+when training on a GPU) tensors, so no Python objects are created per step.
+
+Requires PyTorch, which the tabular agents do not:
+    from sequential_pricing_env.agents.dqn import DQNAgent, simulate_DQNpQr
+"""
+
+import math
+
+import numpy as np
+import torch
+
+from ..rng import OMEGA, epsilon_schedule
+from .q_learning import N_RULES, apply_rules
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of transitions for `n_markets` independent markets.
+
+    Storage is (n_markets, capacity, ...) tensors; NumPy views of the same
+    memory are used for writing, so pushing a transition copies only its values.
+    """
+
+    def __init__(self, capacity=10_000, state_dim=3, n_markets=1, batch_size=32, device="cpu"):
+        self.capacity = capacity
+        self.n_markets = n_markets
+        self.batch_size = batch_size
+        self.device = torch.device(device)
+        M, C = n_markets, capacity
+
+        self.states = torch.zeros((M, C, state_dim), dtype=torch.float32)
+        self.actions = torch.zeros((M, C), dtype=torch.int64)
+        self.rewards = torch.zeros((M, C), dtype=torch.float32)
+        self.next_states = torch.zeros((M, C, state_dim), dtype=torch.float32)
+        self.dones = torch.zeros((M, C), dtype=torch.float32)
+        self._np = {name: getattr(self, name).numpy()
+                    for name in ("states", "actions", "rewards", "next_states", "dones")}
+
+        pin = self.device.type == "cuda"
+        B = batch_size
+        self.batch = {
+            "states": torch.empty((M * B, state_dim), dtype=torch.float32, pin_memory=pin),
+            "actions": torch.empty(M * B, dtype=torch.int64, pin_memory=pin),
+            "rewards": torch.empty(M * B, dtype=torch.float32, pin_memory=pin),
+            "next_states": torch.empty((M * B, state_dim), dtype=torch.float32, pin_memory=pin),
+            "dones": torch.empty(M * B, dtype=torch.float32, pin_memory=pin),
+        }
+        self._offsets = (np.arange(M) * C)[:, None]
+        self.pos = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, state, action, reward, next_state, done):
+        """Store one transition per market; arguments have a leading n_markets axis (or none for one market)."""
+        i = self.pos
+        self._np["states"][:, i] = state
+        self._np["actions"][:, i] = action
+        self._np["rewards"][:, i] = reward
+        self._np["next_states"][:, i] = next_state
+        self._np["dones"][:, i] = done
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, rng):
+        """
+        Draw `batch_size` transitions per market, with replacement.
+
+        Returns:
+            batch: Dict of tensors of shape (n_markets, batch_size, ...) on `device`.
+                They are reused by the next call.
+        """
+        idx = rng.integers(0, self.size, size=(self.n_markets, self.batch_size))
+        flat = torch.from_numpy((idx + self._offsets).ravel())
+        M, B = self.n_markets, self.batch_size
+        out = {}
+        for name, dst in self.batch.items():
+            src = getattr(self, name)
+            torch.index_select(src.view(M * self.capacity, *src.shape[2:]), 0, flat, out=dst)
+            out[name] = dst.to(self.device, non_blocking=True).view(M, B, *dst.shape[1:])
+        return out
+
+    def state_dict(self):
+        """Stored transitions and ring position, as NumPy views of the storage."""
+        state = {name: array[:, :self.size] for name, array in self._np.items()}
+        state.update(pos=self.pos, size=self.size)
+        return state
+
+    def load_state_dict(self, state):
+        """Copy saved transitions into the storage; the capacity may be larger than when saved."""
+        size = state["size"]
+        if size > self.capacity:
+            raise ValueError(f"{size} saved transitions do not fit into capacity {self.capacity}")
+        for name, array in self._np.items():
+            array[:, :size] = state[name]
+        self.size = size
+        self.pos = state["pos"] % self.capacity if size == self.capacity else size
+
+
+class BatchedMLP(torch.nn.Module):
+    """
+    One hidden-layer ReLU network per market, stored as stacked weights.
+
+    Initialized like torch.nn.Linear, so a single market matches
+    nn.Sequential(Linear, ReLU, Linear) of the notebook.
+    """
+
+    def __init__(self, n_markets, in_dim, hidden_dim, out_dim):
+        super().__init__()
+        self.w1 = torch.nn.Parameter(torch.empty(n_markets, in_dim, hidden_dim))
+        self.b1 = torch.nn.Parameter(torch.empty(n_markets, 1, hidden_dim))
+        self.w2 = torch.nn.Parameter(torch.empty(n_markets, hidden_dim, out_dim))
+        self.b2 = torch.nn.Parameter(torch.empty(n_markets, 1, out_dim))
+        for w, b, fan_in in ((self.w1, self.b1, in_dim), (self.w2, self.b2, hidden_dim)):
+            bound = 1.0 / math.sqrt(fan_in)
+            torch.nn.init.uniform_(w, -bound, bound)
+            torch.nn.init.uniform_(b, -bound, bound)
+
+    def forward(self, x):
+        """x: (n_markets, batch, in_dim) -> (n_markets, batch, out_dim)"""
+        h = torch.relu(torch.baddbmm(self.b1, x, self.w1))
+        return torch.baddbmm(self.b2, h, self.w2)
+
+
+class DQNAgent:
+    """
+    DQN price setter for `n_markets` independent markets.
+      - State: [own price idx, rival price idx, own Buy Box flag] of the previous round.
+      - Action: next price index.
+      - ε-greedy with ε = exp(-t * ω); t counts the periods in which the agent learned,
+        as in the notebook version.
+      - Learning starts once the buffer holds more than `warmup` transitions and then
+        runs every `update_interval` periods on `batch_size` sampled transitions per market.
+    """
+
+    def __init__(self, n_price, lr=1e-2, gamma=0.9, hidden_dim=32, n_markets=1, capacity=10_000,
+                 batch_size=32, warmup=200, update_interval=1, omega=OMEGA, device="cpu", seed=None):
+        self.state_dim = 3
+        self.n_actions = n_price
+        self.n_markets = n_markets
+        self.gamma = gamma
+        self.omega = omega
+        self.warmup = warmup
+        self.update_interval = update_interval
+        self.device = torch.device(device)
+        self.rng = np.random.default_rng(seed)
+        if seed is not None:
+            torch.manual_seed(seed)
+
+        self.net = BatchedMLP(n_markets, self.state_dim, hidden_dim, n_price).to(self.device)
+        self.optimizer = torch.optim.Adam(self.net.parameters(), lr=lr, foreach=True)
+        self.buffer = ReplayBuffer(capacity, self.state_dim, n_markets, batch_size, device)
+        self.t = 0
+        self._steps = 0
+        self._state = torch.empty((n_markets, 1, self.state_dim), dtype=torch.float32)
+
+    def take_actions(self, states):
+        """
+        ε-greedy actions of all markets.
+
+        Args:
+            states: Array (n_markets, 3)
+
+        Returns:
+            actions: Int array (n_markets,)
+        """
+        epsilon = epsilon_schedule(self.t + 1, self.omega, start=self.t)[0]
+        explore = self.rng.random(self.n_markets) < epsilon
+        actions = self.rng.integers(self.n_actions, size=self.n_markets)
+        if not explore.all():
+            self._state.numpy()[:, 0] = states
+            with torch.no_grad():
+                q = self.net(self._state.to(self.device))[:, 0]
+            greedy = q.argmax(dim=1).cpu().numpy()
+            actions = np.where(explore, actions, greedy)
+        return actions
+
+    def take_action(self, state):
+        """Single-market version of take_actions()."""
+        return int(self.take_actions(np.asarray(state, dtype=np.float32)[None])[0])
+
+    def observe(self, states, actions, rewards, next_states, dones=0.0):
+        """Store one transition per market and learn if it is time to."""
+        self.buffer.push(states, actions, rewards, next_states, dones)
+        if len(self.buffer) <= self.warmup:
+            return None
+        self._steps += 1
+        loss = None
+        if self._steps % self.update_interval == 0:
+            loss = self._learn(self.buffer.sample(self.rng))
+        self.t += 1
+        return loss
+
+    def update(self, states, actions, rewards, next_states, dones):
+        """
+        One gradient step on a given batch, the notebook interface.
+
+        Inputs have shape (B, ...) for a single market or (n_markets, B, ...).
+        """
+        batch = {
+            "states": torch.as_tensor(np.asarray(states), dtype=torch.float32),
+            "actions": torch.as_tensor(np.asarray(actions), dtype=torch.int64),
+            "rewards": torch.as_tensor(np.asarray(rewards), dtype=torch.float32),
+            "next_states": torch.as_tensor(np.asarray(next_states), dtype=torch.float32),
+            "dones": torch.as_tensor(np.asarray(dones), dtype=torch.float32),
+        }
+        if batch["actions"].dim() == 1:
+            batch = {k: v.unsqueeze(0) for k, v in batch.items()}
+        loss = self._learn({k: v.to(self.device) for k, v in batch.items()})
+        self.t += 1
+        return loss
+
+    def state_dict(self):
+        """
+        Everything needed to continue training, see sequential_pricing_env.checkpoint:
+        network weights, Adam moments and step counts, replay memory, counters and
+        the sampling generator. Tensors are returned as NumPy arrays.
+        """
+        optimizer = self.optimizer.state_dict()
+        return {
+            "net": {name: p.detach().cpu().numpy() for name, p in self.net.state_dict().items()},
+            "optimizer": {
+                "state": {str(i): {k: v.detach().cpu().numpy() if torch.is_tensor(v) else v
+                                   for k, v in s.items()}
+                          for i, s in optimizer["state"].items()},
+                "param_groups": optimizer["param_groups"],
+            },
+            "buffer": self.buffer.state_dict(),
+            "t": self.t,
+            "steps": self._steps,
+            "rng": self.rng.bit_generator.state,
+        }
+
+    def load_state_dict(self, state):
+        self.net.load_state_dict({name: torch.as_tensor(np.asarray(w)) for name, w in state["net"].items()})
+        groups = [dict(g, betas=tuple(g["betas"])) if "betas" in g else dict(g)
+                  for g in state["optimizer"]["param_groups"]]
+        self.optimizer.load_state_dict({
+            "state": {int(i): {k: torch.as_tensor(np.asarray(v)) for k, v in s.items()}
+                      for i, s in state["optimizer"]["state"].items()},
+            "param_groups": groups,
+        })
+        self.buffer.load_state_dict(state["buffer"])
+        self.t = state["t"]
+        self._steps = state["steps"]
+        self.rng.bit_generator.state = state["rng"]
+
+    def _learn(self, batch):
+        q = self.net(batch["states"]).gather(2, batch["actions"].unsqueeze(2)).squeeze(2)
+        with torch.no_grad():
+            next_q = self.net(batch["next_states"]).max(dim=2).values
+            target = batch["rewards"] + self.gamma * next_q * (1.0 - batch["dones"])
+        # mean over each market's batch, summed over markets: independent gradients per market
+        loss = ((q - target) ** 2).mean(dim=1).sum()
+        self.optimizer.zero_grad(set_to_none=True)
+        loss.backward()
+        self.optimizer.step()
+        return loss.item()
+
+
+def simulate_DQNpQr(env, periods=10_000, alpha=0.1, gamma=0.9, buy_box=None, n_markets=None,
+                    rule_timer_thr=4, seed=None, checkpoint=None, **dqn_kwargs):
+    """
+    DQN price agent (seller 0) vs. Q-learning rule agent (seller 1) with a Buy Box.
+
+    All markets are stepped together: one batched network call for the DQN
+    actions, array operations for the rule agents, one Buy Box prediction for
+    all sellers and one payoff-table gather for the profits.
+
+    Args:
+        env: AmazonLogitDemandPricingEnv
+        periods: Number of periods
+        alpha, gamma: Learning rate and discount factor of the rule agent
+        buy_box: Callable features -> (pred, prob) predicting the Buy Box from the
+            RollingFeatures of both sellers, e.g. BuyBoxCache(pipeline).predict_batch.
+            The seller with the higher probability wins, seller 0 on ties.
+            None gives the Buy Box to the cheaper seller.
+        n_markets: Number of independent markets; None runs one market and
+            returns 1D histories
+        rule_timer_thr: Periods the rule agent keeps a chosen rule
+        seed: Seed of the agents' random streams
+        checkpoint: Optional Checkpointer (see sequential_pricing_env.checkpoint) saving the
+            DQN, the rule agents, the rolling features, the random streams and the
+            histories every checkpoint.every periods and at the end. An existing
+            checkpoint is resumed; `periods` may be larger than when it was saved.
+        **dqn_kwargs: Passed to DQNAgent (lr, hidden_dim, batch_size, update_interval, ...)
+
+    Returns:
+        hist0, hist1: Prices of both sellers, shape (periods,) or (n_markets, periods)
+    """
+    from ..checkpoint import history_segments, restore_history
+    from ..features import RollingFeatures
+
+    M = 1 if n_markets is None else n_markets
+    G = len(env.prices)
+    prices = env.prices
+    payoff = env.payoff_table()
+    rng = np.random.default_rng(seed)
+    markets = np.arange(M)
+
+    agent_0 = DQNAgent(n_price=G, n_markets=M, seed=None if seed is None else int(rng.integers(2**31)),
+                       **dqn_kwargs)
+    # rule agents of all markets as arrays
+    Q1 = rng.uniform(10, 20, size=(M, G * G, N_RULES))
+    rule = np.zeros(M, dtype=np.int64)
+    timer = np.full(M, rule_timer_thr)
+    t1 = 0
+
+    hist0 = np.empty((M, periods))
+    hist1 = np.empty((M, periods))
+    rolling = RollingFeatures(n_sellers=2, is_amazon=0, is_fba=1, n_markets=M)
+
+    env.reset()
+    obs = rng.integers(G, size=(M, 2))
+    is_bb0 = np.zeros(M)
+    rolling.update(prices[obs])
+    state0 = np.empty((M, 3), dtype=np.float32)
+    next_state0 = np.empty((M, 3), dtype=np.float32)
+
+    hist = {"price0": hist0, "price1": hist1}
+    start, bounds = 0, [0]
+    if checkpoint is not None and checkpoint.exists:
+        saved = checkpoint.load()
+        if saved["t"] > periods:
+            raise ValueError(f"'{checkpoint.path}' is at period {saved['t']}, beyond periods={periods}")
+        agent_0.load_state_dict(saved["agent0"])
+        Q1 = np.array(saved["Q1"])
+        rule, timer, t1 = np.array(saved["rule"]), np.array(saved["timer"]), saved["t1"]
+        obs, is_bb0 = np.array(saved["obs"]), np.array(saved["is_bb0"])
+        rolling.load_state_dict(saved["features"])
+        rng.bit_generator.state = saved["rng"]
+        start = saved["t"]
+        bounds = restore_history(hist, saved["history"])
+
+    eps = epsilon_schedule(t1 + periods - start, start=t1)  # rule agents; t1 advances with t
+    for t in range(start, periods):
+        state0[:, 0], state0[:, 1], state0[:, 2] = obs[:, 0], obs[:, 1], is_bb0
+        state1 = obs[:, 0] * G + obs[:, 1]
+        # actions
+        a0 = agent_0.take_actions(state0)
+        pick = timer >= rule_timer_thr
+        if pick.any():
+            explore = rng.random(M) < eps[t - start]
+            new_rule = np.where(explore, rng.integers(N_RULES, size=M), Q1[markets, state1].argmax(axis=1))
+            rule = np.where(pick, new_rule, rule)
+            timer = np.where(pick, 0, timer)
+        rival, own = obs[:, 0], obs[:, 1]
+        a1 = apply_rules(rule, rival, own, G)
+        timer += 1
+        # Buy Box: higher probability wins, seller 0 on ties
+        if buy_box is None:
+            bb0 = prices[a0] <= prices[a1]
+        else:
+            _, prob = buy_box(rolling.features)
+            prob = np.asarray(prob).reshape(M, 2)
+            bb0 = prob[:, 0] >= prob[:, 1]
+        is_bb0 = bb0.astype(np.float64)
+        r = payoff[a0, a1, bb0.astype(np.int64), (~bb0).astype(np.int64)]
+        hist0[:, t] = prices[a0]
+        hist1[:, t] = prices[a1]
+        # learn
+        next_state0[:, 0], next_state0[:, 1], next_state0[:, 2] = a0, a1, is_bb0
+        agent_0.observe(state0, a0, r[:, 0], next_state0)
+        next_state1 = a0 * G + a1
+        td_target = r[:, 1] + gamma * Q1[markets, next_state1].max(axis=1)
+        Q1[markets, state1, rule] += alpha * (td_target - Q1[markets, state1, rule])
+        t1 += 1
+        # advance
+        obs[:, 0], obs[:, 1] = a0, a1
+        rolling.update(prices[obs])
+
+        if checkpoint is not None and (t + 1 == periods or checkpoint.due(t + 1)):
+            bounds.append(t + 1)
+            checkpoint.save({
+                "t": t + 1, "agent0": agent_0.state_dict(), "Q1": Q1, "rule": rule, "timer": timer,
+                "t1": t1, "obs": obs, "is_bb0": is_bb0, "features": rolling.state_dict(),
+                "rng": rng.bit_generator.state, "history": history_segments(hist, hist, bounds),
+            }, t + 1, kernel="DQNpQr", alpha=alpha, gamma=gamma, rule_timer_thr=rule_timer_thr)
+
+    if n_markets is None:
+        return hist0[0], hist1[0]
+    return hist0, hist1
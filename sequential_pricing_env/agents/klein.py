@@ -0,0 +1,117 @@
+"""
+Q-learning agent of Klein (2021) for the sequential pricing game, from klein_2021.ipynb.
+
+Firms move in alternating periods. The state of a firm is the rival's current
+price, and the update of the price set in period t waits for the rival's
+response in t+1 (formula (5) of the paper):
+
+    Q(s, a) <- (1 - α) Q(s, a) + α [π_t + δ π_{t+1} + δ² max_a' Q(s', a')]
+
+Exploration decays as ε_t = (1 - θ)^t, with θ calibrated so that ε reaches
+0.001 halfway through training. The batched engine in
+sequential_pricing_env.klein trains many agent pairs at once with the same
+update.
+"""
+
+import numpy as np
+
+EPSILON_TARGET = 1e-3  # ε reached after `half_life * T` periods
+HALF_LIFE = 0.5
+
+
+def klein_theta(total_steps, epsilon_target=EPSILON_TARGET, half_life=HALF_LIFE):
+    """
+    Decay rate θ of ε_t = (1 - θ)^t such that ε_{half_life * T} = epsilon_target.
+
+    The notebook version used θ = 1 - epsilon_target * exp(2 / T), which is close
+    to 1 and switched exploration off after the first period.
+    """
+    return 1.0 - epsilon_target ** (1.0 / (half_life * total_steps))
+
+
+class KleinQLearningAgent:
+    """
+    Q-learning agent exactly following Klein (2021) for sequential pricing.
+    ▸ two-period return  r_t  + δ r_{t+1}  + δ² max Q(·)
+    ▸ ε-greedy with ε_t = (1-θ)^t   where θ chosen from a target half-life
+    """
+    def __init__(self,
+                 n_states: int,
+                 n_actions: int,
+                 alpha: float = 0.30,
+                 discount_factor: float = 0.95,
+                 name: str = "KleinQLearningAgent",
+                 ):
+        """
+        Args
+        ----
+        n_states          size of state space (opponent price grid)
+        n_actions         size of action space (own price grid)
+        alpha             learning-rate (paper uses 0.3)
+        discount_factor   δ  (paper uses 0.95)
+        """
+        self.Q = np.random.uniform(0, 1, (n_states, n_actions)) # shape is (n_states, n_actions)
+        self.alpha = alpha
+        self.delta = discount_factor
+        self.n_actions = n_actions
+        self.name = name
+
+        # θ is solved from  ε_{half_life*T} = 0.001
+        self.epsilon_target = EPSILON_TARGET
+        self.theta = None          # filled in by set_total_steps(T)
+        self.t = 0                # time step counter
+
+    # ------------------------------------------------------------------ #
+    # exploration schedule
+    # ------------------------------------------------------------------ #
+    def set_total_steps(self, total_steps: int):
+        """Must be called **once** before training so ε_t is calibrated."""
+        self.theta = klein_theta(total_steps, self.epsilon_target)
+
+    def epsilon(self):
+        if self.theta is None:
+            raise ValueError("Call set_total_steps(T) before training")
+        return (1 - self.theta) ** self.t
+
+    # ------------------------------------------------------------------ #
+    # action choice: a returns an action index, which is a in [0,1,...,n_actions-1]
+    # ------------------------------------------------------------------ #
+    def act(self, state_rival: int):
+        """epsilon-greedy action choice."""
+        if np.random.rand() < self.epsilon():
+            return np.random.randint(self.n_actions)
+        q_row = self.Q[state_rival]
+        best = np.flatnonzero(q_row == q_row.max())
+        return np.random.choice(best)
+
+    def greedy(self, state_rival: int) -> int:
+        """Greedy action, the first maximizer on ties."""
+        return int(np.argmax(self.Q[state_rival]))
+
+    # ------------------------------------------------------------------ #
+    # learning update (called *after* the opponent has responded)
+    # Formular (5) in Klein (2021)
+    # Q(s,a) ← (1-α)Q(s,a) + α [r_t + δ r_{t+1} + δ² max_a Q(s',a)]
+    # ------------------------------------------------------------------ #
+    def update(self, s, a, r0, r1, s1):
+        """
+        Internal TD update for Q-learning.
+        s  … rival's price when the action was taken
+        r0 … own profit in period t          (immediate)
+        r1 … own profit in period t+1        (opponent responded)
+        s1 … state observed at t+1  (opponent's new price)
+        """
+        target = r0 + self.delta * r1 + (self.delta ** 2) * self.Q[s1].max()
+        self.Q[s, a] = (1 - self.alpha) * self.Q[s, a] + self.alpha * target
+
+    # ------------------------------------------------------------------ #
+    # checkpoints, see sequential_pricing_env.checkpoint
+    # ------------------------------------------------------------------ #
+    def state_dict(self):
+        return {"Q": self.Q, "t": self.t, "theta": self.theta}
+
+    def load_state_dict(self, state):
+        """Restore a state_dict(); the Q-table is used as given, without copying."""
+        self.Q = state["Q"]
+        self.t = state["t"]
+        self.theta = state["theta"]
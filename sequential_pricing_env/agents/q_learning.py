@@ -0,0 +1,319 @@
+"""
+Tabular Q-learning agents for the duopoly-logit pricing game.
+
+These are the agents of Q_Rule_simulation.ipynb / CIST_Q_rule.ipynb. They draw
+from NumPy's global random state exactly as the notebook versions did, so a run
+seeded with np.random.seed(s) reproduces the notebook trajectories and the
+compiled kernels in sequential_pricing_env.simulation.
+
+Passing an np.random.Generator as `rng` (see sequential_pricing_env.rng) gives
+an agent its own stream instead: the Q-table is drawn from it and exploration
+decisions come from a block-drawn ExplorationStream.
+
+`q_table` selects a storage backend from .qstore instead of the drawn dense
+table, e.g. q_table="sparse" for large grids or n_firms > 2. Such tables are
+initialized by HashedUniform from one seed drawn from the agent's random
+source, so every backend with the same seed starts from the same values; the
+drawn table of the default path is kept for reproducibility. Learning tables
+are always float64; compact_q_table() shrinks a trained one.
+"""
+
+import numpy as np
+
+from ..rng import ExplorationStream
+from .qstore import HashedUniform, SparseQTable, make_q_table
+
+N_RULES = 4  # number of repricing rules available to the rule agents
+
+
+# A function to convert joint action (i,j) to index in Q-table
+def joint_to_index(i, j, grid_size):
+    """Convert joint action (i,j) to index in Q-table."""
+    return i * grid_size + j
+
+
+def apply_rule(rule, rival_idx, own_idx, n_price_actions):
+    """
+    Price index produced by a repricing rule.
+
+    Args:
+        rule: Rule index in {0, 1, 2, 3}
+        rival_idx: Price index played by the rival in the previous round
+        own_idx: Price index played by the agent in the previous round
+        n_price_actions: Size of the price grid
+
+    Returns:
+        price_idx: Next price index of the agent
+    """
+    if rule == 0:
+        return rival_idx
+    elif rule == 1:
+        return min(rival_idx + 1, n_price_actions - 1)
+    elif rule == 2:
+        return max(rival_idx - 1, 0)
+    elif rule == 3:
+        # hold your own last price
+        return own_idx
+
+
+def apply_rules(rules, rival_idx, own_idx, n_price_actions):
+    """
+    apply_rule for arrays of rules, e.g. one per market.
+
+    Args:
+        rules, rival_idx, own_idx: Broadcastable int arrays
+        n_price_actions: Size of the price grid
+
+    Returns:
+        price_idx: Next price indices, int array of the broadcast shape
+    """
+    rules = np.asarray(rules)
+    rival_idx = np.asarray(rival_idx)
+    return np.select([rules == 0, rules == 1, rules == 2],
+                     [rival_idx, np.minimum(rival_idx + 1, n_price_actions - 1), np.maximum(rival_idx - 1, 0)],
+                     own_idx)
+
+
+def _init_q_table(n_states, n_actions, init_low, init_high, rng, q_table):
+    """Q-table and its initializer; the initializer is None for the drawn dense table."""
+    source = np.random if rng is None else rng
+    if q_table is None:
+        return source.uniform(init_low, init_high, size=(n_states, n_actions)), None
+    seed = source.randint(2**63) if rng is None else rng.integers(2**63)
+    q_init = HashedUniform(seed, init_low, init_high)
+    return make_q_table(q_table, n_states, n_actions, q_init), q_init
+
+
+def _tabular_state(agent, *fields):
+    """state_dict() of a tabular agent: Q-table, initializer, exploration stream and `fields`."""
+    Q = agent.Q
+    state = {
+        "Q": Q.state_dict() if isinstance(Q, SparseQTable) else Q,
+        "q_init": None if getattr(agent, "q_init", None) is None else agent.q_init.state_dict(),
+        "explore": None if agent.explore is None else agent.explore.state_dict(),
+    }
+    for name in ("t",) + fields:
+        state[name] = getattr(agent, name)
+    return state
+
+
+def _load_tabular_state(agent, state, *fields):
+    """
+    Inverse of _tabular_state. A dense table is used as given, without copying,
+    so a memory-mapped checkpoint stays mapped.
+    """
+    if isinstance(agent.Q, SparseQTable):
+        agent.Q.load_state_dict(state["Q"])
+    else:
+        agent.Q = state["Q"]
+    if state.get("q_init") is not None:
+        agent.q_init = HashedUniform.from_state_dict(state["q_init"])
+    if state.get("explore") is not None:
+        if agent.explore is None:
+            raise ValueError("the saved agent had its own rng; construct this one with rng=...")
+        agent.explore.load_state_dict(state["explore"])
+    for name in ("t",) + fields:
+        setattr(agent, name, state[name])
+
+
+class QLearningAgent:
+    """
+    Q-learning agent for the duopoly‐logit pricing game.
+      - State s_t = joint price index pair played in the previous round.
+      - Action a_t ∈ {0…n_actions-1} picks the next price index.
+      - Greedy policy: always pick argmax_a Q[s, a].
+    """
+    def __init__(
+        self,
+        n_actions: int,
+        alpha: float = 0.1,
+        gamma: float = 0.9,
+        init_low: float = 10.0,
+        init_high: float = 20.0,
+        cost: float = 2.0,
+        prices: np.ndarray = None,
+        rng: np.random.Generator = None,
+        q_table: str = None,
+        n_firms: int = 2,
+    ):
+        self.n_actions = n_actions
+        self.alpha = alpha
+        self.gamma = gamma
+        self.t = 0 # time step
+        self.omega = 1.5e-5
+        self.cost = cost
+        self.prices = prices  # array of actual price values
+        # Q-table: rows = states (previous joint price idx), cols = actions (next price idx)
+        self.Q, self.q_init = _init_q_table(n_actions**n_firms, n_actions, init_low, init_high, rng,
+                                            q_table)
+        # own exploration stream, or None for NumPy's global state
+        self.explore = None if rng is None else ExplorationStream(rng, n_actions, self.omega)
+
+    def take_action(self, state: int) -> int:
+        """epsilon-Greedy: epsilon = exp(-t * omega)"""
+        if self.explore is not None:
+            action = self.explore.draw(self.t)
+            return int(np.argmax(self.Q[state])) if action is None else action
+        epsilon = np.exp(-self.t * self.omega)
+        if np.random.rand() < epsilon:
+            # Explore: pick random action
+            action = np.random.randint(self.n_actions)
+        else:
+            # Exploit: pick best action according to Q-table
+            action = int(np.argmax(self.Q[state]))
+        return action
+
+    def update(self, state: int, action: int, reward: float, next_state: int):
+        """One‐step Q‐learning update."""
+        best_next = np.max(self.Q[next_state])
+        td_target = reward + self.gamma * best_next
+        td_error = td_target - self.Q[state, action]
+        self.Q[state, action] += self.alpha * td_error
+        # update the time step
+        self.t += 1
+
+    def state_dict(self):
+        """Q-table, step counter and exploration stream, see sequential_pricing_env.checkpoint."""
+        return _tabular_state(self)
+
+    def load_state_dict(self, state):
+        _load_tabular_state(self, state)
+
+
+class QLearningRuleAgent:
+    """
+    Q-learning agent for the duopoly-logit pricing game.
+    Instead of using a Q-table to pick price index, this agent uses a Q-table to pick one of the following rules:
+        - Rule 0: pick the price that matches the price index played by the other player in the previous round.
+        - Rule 1: pick the price that is one index higher than the price index played by the other player in the previous round. (if the index is greater than n_actions-1, just pick n_actions-1)
+        - Rule 2: pick the price that is one index lower than the price index played by the other player in the previous round. (if the index is less than or equal to 0, just pick 0)
+        - Rule 3: Do nothing and keep the price index played in the previous round.
+    Specific restriction: once picked, the agent keeps using the same rule for `rule_timer_thr` rounds before the next rule change.
+      - State s_t = price index played in previous round by the two players (i,j).
+      - Action a_t ∈ {0,1,2,3} picks the next rule.
+      - Greedy policy: always pick argmax_a Q[s, a].
+    """
+    def __init__(self, n_actions, alpha=0.1, gamma=0.9, cost=2.0, prices=None, rule_timer_thr=4,
+                 init_low=10.0, init_high=20.0, rng=None, q_table=None, n_firms=2):
+        self.n_price_actions = n_actions      # e.g. 25 price levels
+        self.n_rules = N_RULES                # exactly 4 rules
+        self.alpha = alpha
+        self.gamma = gamma
+        self.omega = 1.5e-5
+        self.t = 0                            # global time step for ε
+        self.cost = cost
+        self.prices = prices
+        # Q-table: rows = joint‐state index, cols = rule‐index (0…3)
+        self.Q, self.q_init = _init_q_table(n_actions**n_firms, self.n_rules, init_low, init_high, rng,
+                                            q_table)
+        self.explore = None if rng is None else ExplorationStream(rng, self.n_rules, self.omega)
+        # bookkeeping for “stick with same rule for rule_timer_thr periods”
+        self.current_rule = 0
+        self.rule_timer_thr = rule_timer_thr
+        self.rule_timer = self.rule_timer_thr   # so we pick fresh immediately on t=0
+        # track last price index
+        self.last_price_idx = None
+
+    def take_action(self, state, rival_pre_price_idx, own_pre_price_idx):
+        # state encodes (own_pre, rival_pre); so we could also unpack it
+        # but we pass in rival_pre and own_pre explicitly.
+        if self.rule_timer >= self.rule_timer_thr:
+            if self.explore is not None:
+                new_rule = self.explore.draw(self.t)
+                if new_rule is None:
+                    new_rule = int(np.argmax(self.Q[state]))
+            elif np.random.rand() < np.exp(-self.t * self.omega):
+                new_rule = np.random.randint(self.n_rules)
+            else:
+                new_rule = int(np.argmax(self.Q[state]))
+            self.current_rule = new_rule
+            self.rule_timer = 0
+        price_idx = self._apply_rule(self.current_rule,
+                                     rival_pre_price_idx,
+                                     own_pre_price_idx)
+        self.rule_timer += 1
+        return price_idx
+
+    def _apply_rule(self, rule, rival_idx, own_idx):
+        return apply_rule(rule, rival_idx, own_idx, self.n_price_actions)
+
+    def update(self, state, rule, reward, next_state):
+        best_next = np.max(self.Q[next_state])
+        td_target = reward + self.gamma * best_next
+        self.Q[state, rule] += self.alpha * (td_target - self.Q[state, rule])
+        self.t += 1
+
+    def state_dict(self):
+        """Q-table, step counter, rule bookkeeping and exploration stream."""
+        return _tabular_state(self, "current_rule", "rule_timer", "last_price_idx")
+
+    def load_state_dict(self, state):
+        _load_tabular_state(self, state, "current_rule", "rule_timer", "last_price_idx")
+
+
+class DummyQLearningRuleAgent:
+    """
+    A Q-learning agent with no state representation — learns expected profit of each rule.
+    Only tracks Q-values for each rule: Q[rule] of shape (n_rules,)
+
+    - Actions are rules:
+        Rule 0: Match rival's previous price index.
+        Rule 1: Raise rival's previous price index by 1 (capped at max).
+        Rule 2: Lower rival's previous price index by 1 (floored at 0).
+        Rule 3: Repeat own previous price index.
+    - Uses ε-greedy policy with decaying ε.
+    - Commits to a chosen rule for 4 consecutive rounds.
+    """
+
+    def __init__(self, n_actions, alpha=0.1, gamma=0.9, cost=2.0, rng=None):
+        self.n_price_actions = n_actions
+        self.n_rules = N_RULES
+        self.alpha = alpha
+        self.gamma = gamma
+        self.omega = 1.5e-5
+        self.t = 0  # global time step for ε decay
+        self.cost = cost
+
+        # Q table: value estimates for each rule (no state dimension)
+        self.Q = (np.random if rng is None else rng).uniform(10, 20, size=(self.n_rules,))
+        self.explore = None if rng is None else ExplorationStream(rng, self.n_rules, self.omega)
+
+        # Rule persistence for 4 rounds
+        self.current_rule = 0
+        self.rule_timer = 4  # so we pick fresh on first round
+
+        # Keep track of last price index
+        self.last_price_idx = None
+
+    def take_action(self, rival_pre_price_idx, own_pre_price_idx):
+        if self.rule_timer >= 4:
+            if self.explore is not None:
+                new_rule = self.explore.draw(self.t)
+                if new_rule is None:
+                    new_rule = int(np.argmax(self.Q))
+            elif np.random.rand() < np.exp(-self.t * self.omega):
+                new_rule = np.random.randint(self.n_rules)
+            else:
+                new_rule = int(np.argmax(self.Q))
+            self.current_rule = new_rule
+            self.rule_timer = 0
+
+        price_idx = self._apply_rule(self.current_rule, rival_pre_price_idx, own_pre_price_idx)
+        self.rule_timer += 1
+        return price_idx
+
+    def _apply_rule(self, rule, rival_idx, own_idx):
+        return apply_rule(rule, rival_idx, own_idx, self.n_price_actions)
+
+    def update(self, rule, reward):
+        # TD update with no state
+        td_target = reward  # no next Q since stateless
+        self.Q[rule] += self.alpha * (td_target - self.Q[rule])
+        self.t += 1
+
+    def state_dict(self):
+        """Q-values, step counter, rule bookkeeping and exploration stream."""
+        return _tabular_state(self, "current_rule", "rule_timer", "last_price_idx")
+
+    def load_state_dict(self, state):
+        _load_tabular_state(self, state, "current_rule", "rule_timer", "last_price_idx")
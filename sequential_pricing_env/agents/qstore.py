@@ -0,0 +1,332 @@
+"""
+Q-table storage backends for the tabular agents.
+
+The agents index their table as Q[state] (a row of action values),
+Q[state, action] and np.argmax / np.max of a row, with states the joint price
+index of the previous round. A dense float64 table has grid_size ** n_firms
+rows, 10k x 100 values per agent for a 100-point duopoly grid and out of reach
+for more firms. make_q_table builds a table with the same indexing from one of
+
+    "dense"   NumPy array
+    "sparse"  rows created on first access, so memory grows with the visited states
+
+Tables built here are initialized by HashedUniform, a pure function of
+(seed, state, action), rather than by drawing the whole table up front. A
+sparse row created late therefore holds exactly the values a dense table with
+the same seed holds, and a sparse table follows the same trajectory, greedy
+actions included, as the dense one.
+
+Learning needs float64: at Q-values of 10-20 the float16 rounding step is
+about 0.008, and smaller updates are lost, so a float16 table silently stops
+learning. Reduced precision is therefore only for tables that no longer learn.
+compact_q_table() stores a trained table in float32 (half the memory) or
+float16 (a quarter). Where rounding would change the greedy action of a row,
+the greedy value is raised just above the others, so the compact table picks
+the same greedy action as the float64 one in every state. make_q_table with a
+reduced dtype rounds the initial values the same way; greedy_agreement()
+compares two tables.
+"""
+
+import sys
+
+import numpy as np
+
+BACKENDS = ("dense", "sparse")
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _splitmix64(x):
+    z = x + _GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * _MIX1
+    z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return z ^ (z >> np.uint64(31))
+
+
+def _round_greedy(rows, dtype):
+    """
+    `rows` cast to `dtype`, keeping the greedy action (first maximizer) of every row.
+
+    Where rounding ties or reorders the row maximum, the value of the original greedy
+    action is set to the next representable value above the largest other one.
+    """
+    rows = np.asarray(rows)
+    out = rows.astype(dtype)
+    if out.dtype == rows.dtype or out.size == 0 or out.shape[-1] < 2:
+        return out
+    flat = out.reshape(-1, out.shape[-1])
+    idx = np.arange(len(flat))
+    greedy = np.argmax(rows.reshape(flat.shape), axis=1)
+    others = flat.copy()
+    others[idx, greedy] = -np.inf
+    top = others.max(axis=1)
+    lost = flat[idx, greedy] <= top
+    flat[idx[lost], greedy[lost]] = np.nextafter(top[lost], np.asarray(np.inf, dtype=out.dtype))
+    return out
+
+
+class HashedUniform:
+    """
+    Initial Q-values drawn from U(low, high) by hashing (seed, state, action).
+
+    Any subset of rows can be generated at any time, in any order, with identical values.
+    """
+
+    def __init__(self, seed, low=10.0, high=20.0):
+        self.seed = int(seed) & 0xFFFFFFFFFFFFFFFF
+        self.low = low
+        self.high = high
+
+    def __call__(self, states, n_actions):
+        """Initial values of `states`, shape states.shape + (n_actions,), float64."""
+        states = np.asarray(states, dtype=np.uint64)
+        key = _splitmix64(np.full(states.shape, self.seed, dtype=np.uint64) ^ _splitmix64(states))
+        with np.errstate(over="ignore"):
+            bits = _splitmix64(key[..., None] + np.arange(n_actions, dtype=np.uint64) * _GOLDEN)
+        u = (bits >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+        return self.low + (self.high - self.low) * u
+
+    def state_dict(self):
+        return {"seed": self.seed, "low": self.low, "high": self.high}
+
+    @classmethod
+    def from_state_dict(cls, state):
+        return cls(state["seed"], state["low"], state["high"])
+
+
+class SparseQTable:
+    """
+    Q-table holding only the rows of visited states.
+
+    Rows live in one growing 2D array, with a dict mapping a state to its row.
+    Q[state] returns that row as a writable view, valid until the next new
+    state is added.
+    """
+
+    def __init__(self, n_states, n_actions, init, dtype=np.float64, capacity=64):
+        """
+        Args:
+            n_states: Size of the state space; only bounds the accepted states
+            n_actions: Number of actions
+            init: Callable (states, n_actions) -> initial rows, e.g. HashedUniform
+            dtype: dtype of the stored values
+            capacity: Initial number of row slots
+        """
+        self.n_states = n_states
+        self.n_actions = n_actions
+        self.init = init
+        self.dtype = np.dtype(dtype)
+        self.shape = (n_states, n_actions)
+        self._rows = {}
+        self._data = np.empty((capacity, n_actions), dtype=self.dtype)
+
+    def _slot(self, state):
+        slot = self._rows.get(state)
+        if slot is None:
+            if not 0 <= state < self.n_states:
+                raise IndexError(f"state {state} is out of bounds for {self.n_states} states")
+            slot = len(self._rows)
+            if slot == len(self._data):
+                grown = np.empty((2 * len(self._data), self.n_actions), dtype=self.dtype)
+                grown[:slot] = self._data
+                self._data = grown
+            self._data[slot] = _round_greedy(self.init(np.array([state]), self.n_actions), self.dtype)[0]
+            self._rows[state] = slot
+        return slot
+
+    # _slot() may replace self._data, so it has to run before self._data is read
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            state, action = key
+            slot = self._slot(int(state))
+            return self._data[slot, action]
+        slot = self._slot(int(key))
+        return self._data[slot]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, tuple):
+            state, action = key
+            slot = self._slot(int(state))
+            self._data[slot, action] = value
+        else:
+            slot = self._slot(int(key))
+            self._data[slot] = value
+
+    def __len__(self):
+        return self.n_states
+
+    @property
+    def states(self):
+        """Visited states, in order of first visit."""
+        return np.fromiter(self._rows, dtype=np.int64, count=len(self._rows))
+
+    @property
+    def nbytes(self):
+        """Bytes held by the row array, plus an estimate for the state index."""
+        return self._data.nbytes + sys.getsizeof(self._rows) + 2 * 28 * len(self._rows)
+
+    def state_dict(self):
+        """Visited states and their rows, see sequential_pricing_env.checkpoint."""
+        n = len(self._rows)
+        state = {"states": self.states, "rows": self._data[:n]}
+        if isinstance(self.init, HashedUniform):
+            state["init"] = self.init.state_dict()
+        return state
+
+    def load_state_dict(self, state):
+        """Replace the table; the saved rows are used in place until a new state is added."""
+        states = np.asarray(state["states"])
+        self._rows = dict(zip(states.tolist(), range(len(states))))
+        rows = np.asarray(state["rows"], dtype=self.dtype)
+        self._data = rows if len(rows) else np.empty((1, self.n_actions), dtype=self.dtype)
+        if "init" in state:
+            self.init = HashedUniform.from_state_dict(state["init"])
+
+    def to_dense(self):
+        """Dense table of shape (n_states, n_actions); unvisited rows take their initial values."""
+        Q = _round_greedy(self.init(np.arange(self.n_states), self.n_actions), self.dtype)
+        states = self.states
+        Q[states] = self._data[[self._rows[s] for s in states]]
+        return Q
+
+
+def make_q_table(backend, n_states, n_actions, init, dtype=np.float64):
+    """
+    Q-table with the given storage backend.
+
+    Args:
+        backend: "dense" or "sparse"
+        n_states, n_actions: Table shape
+        init: Callable (states, n_actions) -> initial rows, e.g. HashedUniform(seed)
+        dtype: dtype of the stored values; float32/float16 only for tables that do
+            not learn, see compact_q_table
+
+    Returns:
+        Q: np.ndarray for "dense", SparseQTable for "sparse"
+    """
+    if backend == "dense":
+        Q = np.empty((n_states, n_actions), dtype=dtype)
+        block = max(1, 1_048_576 // max(n_actions, 1))  # rows generated at once
+        for start in range(0, n_states, block):
+            stop = min(start + block, n_states)
+            Q[start:stop] = _round_greedy(init(np.arange(start, stop), n_actions), dtype)
+        return Q
+    if backend == "sparse":
+        return SparseQTable(n_states, n_actions, init, dtype=dtype)
+    raise ValueError(f"Unknown Q-table backend: {backend!r}, expected one of {BACKENDS}")
+
+
+def compact_q_table(Q, dtype=np.float16):
+    """
+    Trained Q-table stored in a smaller dtype, with the same greedy action in every state.
+
+    Only for tables that no longer learn, e.g. to keep or evaluate many trained
+    agents; continuing to learn on the result would lose small updates.
+
+    Args:
+        Q: Dense array or SparseQTable, usually float64
+        dtype: np.float32 or np.float16
+
+    Returns:
+        Q: Table of the same kind; rows a sparse table has not visited yet are created
+            from its initializer with the same rounding
+    """
+    if isinstance(Q, SparseQTable):
+        compact = SparseQTable(Q.n_states, Q.n_actions, Q.init, dtype=dtype)
+        n = len(Q._rows)
+        compact._rows = dict(Q._rows)
+        if n:
+            compact._data = _round_greedy(Q._data[:n], dtype)
+        return compact
+    return _round_greedy(Q, dtype)
+
+
+def joint_index(price_indices, grid_size):
+    """
+    State index of a joint price profile with any number of firms.
+
+    joint_index((i, j), G) == joint_to_index(i, j, G); a profile of n firms maps
+    into range(G ** n).
+    """
+    index = 0
+    for p in price_indices:
+        index = index * grid_size + int(p)
+    return index
+
+
+# ---------------------------------------------------------------------- #
+# reporting
+# ---------------------------------------------------------------------- #
+def visited_states(Q, init=None):
+    """
+    States whose row was touched.
+
+    Sparse tables know them. For a dense table `init` is needed: a row counts as
+    visited once any value differs from its initial value.
+    """
+    if isinstance(Q, SparseQTable):
+        return np.sort(Q.states)
+    if init is None:
+        raise ValueError("a dense table needs its initializer to tell visited rows apart")
+    Q = np.asarray(Q)
+    visited = []
+    block = max(1, 1_048_576 // max(Q.shape[1], 1))
+    for start in range(0, Q.shape[0], block):
+        stop = min(start + block, Q.shape[0])
+        initial = init(np.arange(start, stop), Q.shape[1]).astype(Q.dtype)
+        visited.append(start + np.flatnonzero((Q[start:stop] != initial).any(axis=1)))
+    return np.concatenate(visited)
+
+
+def q_table_report(Q, init=None):
+    """
+    Memory footprint and visited-state coverage of a Q-table.
+
+    Args:
+        Q: Table from make_q_table, or any 2D array
+        init: Initializer of a dense table, needed for its coverage (agent.q_init)
+
+    Returns:
+        dict with "backend", "dtype", "n_states", "n_actions", "nbytes", "dense_float64_nbytes",
+        "compression" (dense float64 bytes / nbytes), "visited_states" and "coverage"
+        (visited / n_states); the last two are None for a dense table without `init`
+    """
+    n_states, n_actions = Q.shape
+    sparse = isinstance(Q, SparseQTable)
+    nbytes = Q.nbytes
+    dense_nbytes = n_states * n_actions * 8
+    visited = None
+    if sparse or init is not None:
+        visited = len(visited_states(Q, init))
+    return {
+        "backend": "sparse" if sparse else "dense",
+        "dtype": str(Q.dtype),
+        "n_states": n_states,
+        "n_actions": n_actions,
+        "nbytes": nbytes,
+        "dense_float64_nbytes": dense_nbytes,
+        "compression": dense_nbytes / nbytes,
+        "visited_states": visited,
+        "coverage": None if visited is None else visited / n_states,
+    }
+
+
+def greedy_agreement(Q, reference, states=None):
+    """
+    Share of states on which two tables pick the same greedy action (first maximizer).
+
+    Args:
+        Q, reference: Tables of equal shape, e.g. a compact_q_table() and its float64 original
+        states: States to compare, default the visited states of a sparse `Q`, else all
+    """
+    if states is None:
+        states = Q.states if isinstance(Q, SparseQTable) else np.arange(Q.shape[0])
+    states = np.asarray(states)
+    if len(states) == 0:
+        return 1.0
+    a = np.array([np.argmax(Q[int(s)]) for s in states]) if isinstance(Q, SparseQTable) else np.argmax(Q[states], axis=1)
+    b = (np.array([np.argmax(reference[int(s)]) for s in states]) if isinstance(reference, SparseQTable)
+         else np.argmax(reference[states], axis=1))
+    return float(np.mean(a == b))
@@ -0,0 +1,325 @@
+"""
+Streaming cross-run statistics of simulation histories.
+
+The percentile and mean/SE plots of the notebooks need, for every period, a
+statistic over runs. Stacking all histories into (runs, periods) arrays first
+costs runs * periods * 8 bytes per series, gigabytes at 100 runs x 1M
+periods. RunAggregator instead folds each run into per-bucket statistics as it
+is produced, so memory is O(periods / bucket) per series plus one open bucket
+row per run in flight:
+
+    - the run's mean over each time bucket of `bucket` periods
+    - across runs, per bucket: count, mean and M2 (Chan/Welford updates), giving
+      mean, std and standard error
+    - exact minimum and maximum, and a fixed-bin histogram (quantile sketch) for
+      the other percentiles. Its range starts from the given bounds or the first
+      run and doubles, merging pairs of bins, whenever a value falls outside, so
+      no value is ever clipped; the bin width is at most (range of the data) * 2 / bins.
+
+With bucket=1 mean, se, min and max equal the notebook's
+np.mean / np.std(ddof=1) / sqrt(runs) / np.min / np.max over axis 0 up to
+rounding; inner percentiles are histogram approximations of np.percentile
+within one bin width.
+
+Example:
+    agg = RunAggregator(periods, bucket=100)
+    simulate_batch(periods, runs, alpha, gamma, env, simulate_QrQr, aggregator=agg)
+    x = agg.periods_axis()
+    mean, se = agg.mean("price"), agg.se("price")
+    pc = agg.percentiles("price", (0, 25, 50, 75, 100))   # shape (5, n_buckets)
+    smooth = move_average(mean, window=3)
+"""
+
+import numpy as np
+
+AGGREGATE_VERSION = 1
+
+
+def move_average(x, window):
+    """Compute moving average of x with window size."""
+    return np.convolve(x, np.ones(window), 'valid') / window
+
+
+class _SeriesStats:
+    """Cross-run statistics of one series, per time bucket."""
+
+    def __init__(self, n_buckets, bins, value_range):
+        self.count = np.zeros(n_buckets, dtype=np.int64)
+        self.mean = np.zeros(n_buckets)
+        self.m2 = np.zeros(n_buckets)
+        self.min = np.full(n_buckets, np.inf)
+        self.max = np.full(n_buckets, -np.inf)
+        self.bins = bins
+        self.range = value_range  # (low, high) of the histogram, set from the first runs if None
+        self.hist = None if bins is None else np.zeros((n_buckets, bins), dtype=np.int32)
+
+    def _grow(self, vmin, vmax):
+        """Double the histogram range until it covers [vmin, vmax], merging pairs of bins."""
+        low, high = self.range
+        half = self.bins // 2
+        while vmin < low or vmax > high:
+            merged = self.hist[:, 0::2] + self.hist[:, 1::2]
+            self.hist.fill(0)
+            width = high - low
+            if vmax > high:
+                self.hist[:, :half] = merged
+                high = low + 2 * width
+            else:
+                self.hist[:, half:] = merged
+                low = high - 2 * width
+        self.range = (low, high)
+
+    def add(self, values, valid):
+        """
+        Fold the bucket means of k runs into the statistics.
+
+        Args:
+            values: Bucket means of shape (k, n_buckets)
+            valid: Buckets each run reached, bool array of shape (k, n_buckets)
+        """
+        k = valid.sum(axis=0)
+        seen = k > 0
+        if not seen.any():
+            return
+        v = np.where(valid, values, 0.0)
+        batch_mean = np.divide(v.sum(axis=0), k, out=np.zeros_like(self.mean), where=seen)
+        batch_m2 = (np.where(valid, values - batch_mean, 0.0) ** 2).sum(axis=0)
+        n_old = self.count
+        n_new = n_old + k
+        delta = batch_mean - self.mean
+        ratio = np.divide(k, n_new, out=np.zeros_like(self.mean), where=seen)
+        self.mean += delta * ratio
+        self.m2 += batch_m2 + delta ** 2 * n_old * ratio
+        self.count = n_new
+        np.minimum(self.min, np.where(valid, values, np.inf).min(axis=0), out=self.min)
+        np.maximum(self.max, np.where(valid, values, -np.inf).max(axis=0), out=self.max)
+
+        if self.hist is not None:
+            finite = values[valid & np.isfinite(values)]
+            if len(finite):
+                vmin, vmax = float(finite.min()), float(finite.max())
+                if self.range is None:
+                    pad = 0.05 * (vmax - vmin) if vmax > vmin else 1.0
+                    self.range = (vmin - pad, vmax + pad)
+                self._grow(vmin, vmax)
+            elif self.range is None:
+                return
+            low, high = self.range
+            idx = ((values - low) * (self.bins / (high - low))).astype(np.int64)
+            np.clip(idx, 0, self.bins - 1, out=idx)
+            run, bucket = np.nonzero(valid)
+            np.add.at(self.hist, (bucket, idx[run, bucket]), 1)
+
+
+class RunAggregator:
+    """
+    Online mean, standard error and percentiles over runs, per time bucket.
+
+    Values are fed like HistoryWriter: append(run, price=..., ...) takes one
+    period or a chunk of consecutive periods of one run, write(...) takes whole
+    (runs, periods) arrays. A run is folded in once it reaches `periods` or on
+    close_run(); statistics of buckets a run never reached do not count it.
+
+    Attributes:
+        periods: Run length
+        bucket: Periods per time bucket
+        n_buckets: ceil(periods / bucket)
+    """
+
+    def __init__(self, periods, bucket=1, bins=128, ranges=None):
+        """
+        Args:
+            periods: Run length
+            bucket: Periods averaged per run before aggregating across runs
+            bins: Even number of histogram bins of the percentile sketch, None to keep only
+                mean/SE/min/max. Memory is n_buckets * bins * 4 bytes per series.
+            ranges: Optional dict series -> (low, high), the initial histogram range, best set
+                to known bounds such as the price grid. By default it is taken from the first
+                run(s) of the series, padded by 5%. The range grows to cover later values.
+        """
+        if bins is not None and (bins < 2 or bins % 2):
+            raise ValueError(f"bins must be an even number >= 2, got {bins}")
+        self.periods = int(periods)
+        self.bucket = int(bucket)
+        self.n_buckets = -(-self.periods // self.bucket)
+        self.bins = bins
+        self.ranges = dict(ranges or {})
+        starts = np.arange(self.n_buckets) * self.bucket
+        self._starts = starts
+        self._lengths = np.minimum(starts + self.bucket, self.periods) - starts
+        self._stats = {}
+        self._open = {}  # (series, run) -> [bucket sums, periods filled]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def series(self):
+        return list(self._stats)
+
+    # ------------------------------------------------------------------ #
+    # feeding
+    # ------------------------------------------------------------------ #
+    def append(self, run, **series):
+        """
+        Append values to the histories of one run.
+
+        Args:
+            run: Run index
+            **series: Scalar or 1D array per series name, e.g. price=p_t or price=prices[t0:t1]
+        """
+        for name, values in series.items():
+            entry = self._open.get((name, run))
+            if entry is None:
+                entry = self._open[name, run] = [np.zeros(self.n_buckets), 0]
+            sums, pos = entry
+            values = np.asarray(values, dtype=np.float64)
+            if values.ndim == 0:
+                if pos >= self.periods:
+                    raise ValueError(f"run {run} of '{name}' already has {self.periods} periods")
+                sums[pos // self.bucket] += values
+                pos += 1
+            else:
+                n = len(values)
+                if pos + n > self.periods:
+                    raise ValueError(f"run {run} of '{name}' would exceed {self.periods} periods")
+                first, last = pos // self.bucket, (pos + n - 1) // self.bucket
+                idx = (np.arange(pos, pos + n) // self.bucket) - first
+                sums[first:last + 1] += np.bincount(idx, weights=values, minlength=last - first + 1)
+                pos += n
+            entry[1] = pos
+            if pos == self.periods:
+                self._fold(name, run)
+
+    def write(self, **series):
+        """Fold in whole (runs, periods) arrays, e.g. the output of simulate_batch."""
+        for name, values in series.items():
+            values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+            if values.shape[1] != self.periods:
+                raise ValueError(f"'{name}' has {values.shape[1]} periods, expected {self.periods}")
+            means = np.add.reduceat(values, self._starts, axis=1) / self._lengths
+            self._stats_for(name).add(means, np.ones(means.shape, dtype=bool))
+
+    def close_run(self, run):
+        """Fold in a run that stopped before `periods`; only its complete buckets count."""
+        for name, open_run in [key for key in self._open if key[1] == run]:
+            self._fold(name, open_run)
+
+    def close(self):
+        """Fold in every open run."""
+        for name, run in list(self._open):
+            self._fold(name, run)
+
+    def _fold(self, name, run):
+        sums, pos = self._open.pop((name, run))
+        valid = self._starts + self._lengths <= pos
+        means = np.divide(sums, self._lengths, out=np.zeros_like(sums), where=valid)
+        self._stats_for(name).add(means[None, :], valid[None, :])
+
+    def _stats_for(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _SeriesStats(self.n_buckets, self.bins, self.ranges.get(name))
+        return stats
+
+    # ------------------------------------------------------------------ #
+    # results, arrays of shape (n_buckets,) unless stated otherwise
+    # ------------------------------------------------------------------ #
+    def periods_axis(self):
+        """First period of every bucket."""
+        return self._starts.copy()
+
+    def count(self, name):
+        """Number of runs folded into each bucket."""
+        return self._stats[name].count.copy()
+
+    def mean(self, name):
+        s = self._stats[name]
+        return np.where(s.count > 0, s.mean, np.nan)
+
+    def std(self, name):
+        """Standard deviation over runs (ddof=1) of the per-run bucket means."""
+        s = self._stats[name]
+        return np.sqrt(np.divide(s.m2, s.count - 1, out=np.full_like(s.m2, np.nan), where=s.count > 1))
+
+    def se(self, name):
+        """Standard error of the mean, std / sqrt(runs)."""
+        return self.std(name) / np.sqrt(self._stats[name].count)
+
+    def percentiles(self, name, q=(0, 25, 50, 75, 100)):
+        """
+        Percentiles over runs, shape (len(q), n_buckets).
+
+        0 and 100 are the exact minimum and maximum. Other percentiles
+        interpolate linearly between two order statistics, like np.percentile;
+        each order statistic is placed inside its histogram bin, so the error is
+        at most one bin width.
+        """
+        s = self._stats[name]
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if s.hist is None and ((q > 0) & (q < 100)).any():
+            raise ValueError("inner percentiles need an aggregator with bins")
+        out = np.empty((len(q), self.n_buckets))
+        empty = s.count == 0
+        if s.hist is not None:
+            low, high = s.range
+            width = (high - low) / s.bins
+            cdf = np.cumsum(s.hist, axis=1)
+            rows = np.arange(self.n_buckets)
+
+            def order_stat(r):
+                """Estimate of the r-th smallest value (0-based) per bucket."""
+                k = np.minimum((cdf <= r[:, None]).sum(axis=1), s.bins - 1)
+                below = np.where(k > 0, cdf[rows, np.maximum(k - 1, 0)], 0)
+                in_bin = s.hist[rows, k]
+                frac = np.divide(r - below + 0.5, in_bin, out=np.full(self.n_buckets, 0.5), where=in_bin > 0)
+                x = np.clip(low + (k + frac) * width, s.min, s.max)
+                x = np.where(r <= 0, s.min, x)
+                return np.where(r >= s.count - 1, s.max, x)
+
+        for i, qi in enumerate(q):
+            if qi <= 0:
+                out[i] = s.min
+            elif qi >= 100:
+                out[i] = s.max
+            else:
+                h = qi / 100 * np.maximum(s.count - 1, 0)  # rank of np.percentile
+                r = np.floor(h)
+                out[i] = order_stat(r) + (h - r) * (order_stat(r + 1) - order_stat(r))
+            out[i, empty] = np.nan
+        return out
+
+    # ------------------------------------------------------------------ #
+    # persistence
+    # ------------------------------------------------------------------ #
+    def save(self, path):
+        """Save the folded statistics to an .npz file; open runs are not saved."""
+        arrays = {}
+        for name, s in self._stats.items():
+            for field in ("count", "mean", "m2", "min", "max"):
+                arrays[f"{name}/{field}"] = getattr(s, field)
+            if s.hist is not None:
+                arrays[f"{name}/hist"] = s.hist
+                arrays[f"{name}/range"] = np.asarray(s.range, dtype=np.float64)
+        np.savez(path, version=AGGREGATE_VERSION, periods=self.periods, bucket=self.bucket,
+                 bins=-1 if self.bins is None else self.bins, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Aggregator restored from save(); more runs can be folded in."""
+        with np.load(path) as data:
+            bins = int(data["bins"])
+            agg = cls(int(data["periods"]), int(data["bucket"]), bins=None if bins < 0 else bins)
+            for key in data.files:
+                name, _, field = key.rpartition("/")
+                if not name:
+                    continue
+                s = agg._stats_for(name)
+                if field == "range":
+                    s.range = tuple(data[key].tolist())
+                else:
+                    setattr(s, field, data[key].copy())
+        return agg
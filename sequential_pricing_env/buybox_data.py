@@ -0,0 +1,352 @@
+"""
+Out-of-core training data pipeline for the Buy Box random forest.
+
+Buy_Box_Best_Selling_Prediction.ipynb reads every per-ASIN CSV in a serial
+loop, concatenates them into one frame and derives features with groupby
+passes over the whole table. Here the CSVs are ingested in parallel into
+Parquet files partitioned by ASIN, and the features of each ASIN are computed
+from its own partition only, so memory is bounded by the largest ASIN rather
+than the whole category:
+
+    <out_dir>/manifest.json                       sources, their ASINs, stale ASINs
+    <out_dir>/raw/asin=<asin>/part-<source>.parquet   rows of one CSV for one ASIN
+    <out_dir>/features/asin=<asin>/part-0.parquet     features of one ASIN
+
+The manifest records size and mtime of every ingested CSV. A refresh only
+re-reads new or changed CSVs and only recomputes the features of the ASINs
+they touch; rolling windows depend on earlier history, so a touched ASIN is
+recomputed from all of its raw parts.
+
+Example:
+    build_dataset("best_sellers_2000/amz_data_*_train.csv", "DATA_DIR/buybox", n_jobs=8)
+    X, y = training_matrix("DATA_DIR/buybox")      # FEATURE_NAMES columns, hold_buybox labels
+    pipe_red_rf.fit(X, y)
+
+Needs pandas and pyarrow.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .features import FEATURE_NAMES, WINDOWS
+
+DATASET_VERSION = 1
+REQUIRED_COLUMNS = ("asin", "sellerId", "time", "price", "isAmazon", "isFBA")
+LABEL = "hold_buybox"
+LAG_COLUMNS = ("price_diff", "price_ratio", "hold_buybox")  # `to_lag` of the notebook, when present
+SOURCE_FEATURES = ("check", "keep", "recompute")
+
+
+# ---------------------------------------------------------------------- #
+# features
+# ---------------------------------------------------------------------- #
+def compute_features(df, windows=WINDOWS, lags=LAG_COLUMNS, source_features="check"):
+    """
+    Buy Box features of the offers of one ASIN.
+
+    Per snapshot time and seller:
+      - price_rank: 1 + number of offers with a strictly lower price at that time
+      - price_diff: own price minus the lowest price at that time
+      - num_competitors: number of sellers with an offer at that time
+      - avg_self_price_Nd / avg_price_rank_Nd: mean own price / price_rank over the
+        seller's snapshots in the trailing N days, the current one included
+      - <col>_lag1: the seller's previous value of each `lags` column present, 0 for the first
+
+    The CSVs the pipe_red_rf model was trained on already carry these columns
+    (1-based ranks; the rows shown in Buy_Box_Best_Selling_Prediction.ipynb agree
+    with the definitions above). Where `df` has them, `source_features` decides:
+      - "check": raise ValueError if a recomputed column differs from the source one
+      - "keep": use the source columns as they are
+      - "recompute": ignore the source columns
+
+    Args:
+        df: Rows of a single ASIN with at least REQUIRED_COLUMNS
+        windows: Rolling windows in days
+        lags: Columns to lag by one snapshot
+        source_features: "check", "keep" or "recompute", see above
+
+    Returns:
+        features: DataFrame sorted by sellerId and time, with sellerId, time, price,
+            the label (if present), FEATURE_NAMES, num_competitors and the lag columns
+    """
+    if source_features not in SOURCE_FEATURES:
+        raise ValueError(f"source_features must be one of {SOURCE_FEATURES}, got {source_features!r}")
+    df = df.drop_duplicates(["sellerId", "time"], keep="last")
+    df = df.sort_values(["sellerId", "time"], kind="stable").reset_index(drop=True)
+    price = df["price"].astype(np.float64)
+    by_time = price.groupby(df["time"])
+    out = pd.DataFrame({"sellerId": df["sellerId"], "time": df["time"], "price": price})
+    if LABEL in df:
+        out[LABEL] = df[LABEL]
+    out["isAmazon"] = df["isAmazon"]
+    out["isFBA"] = df["isFBA"]
+    out["price_rank"] = by_time.rank(method="min")
+    out["price_diff"] = price - by_time.transform("min")
+    out["num_competitors"] = df.groupby("time")["sellerId"].transform("nunique")
+
+    # rows are sorted by (sellerId, time), the order groupby().rolling() returns them in
+    indexed = out.set_index("time")[["sellerId", "price", "price_rank"]]
+    by_seller = indexed.groupby("sellerId", sort=True)
+    for n in windows:
+        rolled = by_seller.rolling(f"{n}D")[["price", "price_rank"]].mean()
+        out[f"avg_self_price_{n}d"] = rolled["price"].to_numpy()
+        out[f"avg_price_rank_{n}d"] = rolled["price_rank"].to_numpy()
+
+    derived = ["price_rank", "price_diff", "num_competitors"]
+    derived += [f"avg_{name}_{n}d" for n in windows for name in ("self_price", "price_rank")]
+    present = [col for col in derived if col in df]
+    if source_features == "check":
+        _check_source(out, df, present)
+    elif source_features == "keep":
+        for col in present:
+            out[col] = df[col].to_numpy()
+
+    for col in lags:
+        values = out[col] if col in out else df.get(col)
+        if values is not None:
+            out[f"{col}_lag1"] = values.groupby(out["sellerId"]).shift(1).fillna(0)
+    return out
+
+
+def _check_source(out, df, columns, tol=1e-6):
+    """Raise ValueError naming every column of `df` that disagrees with its recomputed value in `out`."""
+    mismatched = []
+    for col in columns:
+        ours = out[col].to_numpy(dtype=np.float64)
+        theirs = df[col].to_numpy(dtype=np.float64)
+        bad = ~np.isclose(ours, theirs, rtol=tol, atol=tol, equal_nan=True)
+        if bad.any():
+            i = np.flatnonzero(bad)[0]
+            mismatched.append(f"{col} on {bad.sum()} rows (seller {out['sellerId'][i]} at {out['time'][i]}: "
+                              f"{float(ours[i])!r} recomputed, {float(theirs[i])!r} in the source)")
+    if mismatched:
+        raise ValueError("recomputed features differ from the source columns: " + "; ".join(mismatched)
+                         + '. Pass source_features="keep" to use the source values')
+
+
+# ---------------------------------------------------------------------- #
+# building and refreshing a dataset
+# ---------------------------------------------------------------------- #
+def build_dataset(sources, out_dir, n_jobs=None, prune=False, source_features="check"):
+    """
+    Ingest new or changed CSVs and recompute the features of the ASINs they touch.
+
+    Safe to interrupt: the manifest is updated after every CSV and every ASIN,
+    and the next call picks up where this one stopped.
+
+    Args:
+        sources: Glob pattern or list of CSV paths, each with REQUIRED_COLUMNS and a
+            `time` column pandas can parse
+        out_dir: Dataset directory, created if needed
+        n_jobs: Worker processes, default cpu_count() - 1; 1 runs everything in-process
+        prune: Drop the data of previously ingested CSVs missing from `sources`
+        source_features: How feature columns already in the CSVs are treated, see compute_features
+
+    Returns:
+        summary: dict with the numbers of "ingested" CSVs, "pruned" CSVs and "rebuilt" ASINs
+    """
+    paths = sorted(glob.glob(sources)) if isinstance(sources, str) else list(sources)
+    paths = [os.path.abspath(p) for p in paths]
+    manifest = _load_manifest(out_dir)
+    known = manifest["sources"]
+    dirty = set(manifest["dirty"])
+
+    pruned = 0
+    if prune:
+        for path in [p for p in known if p not in set(paths)]:
+            entry = known.pop(path)
+            for asin in entry["asins"]:
+                _remove(_raw_part(out_dir, asin, entry["part"]))
+            dirty.update(entry["asins"])
+            pruned += 1
+        _save_manifest(out_dir, manifest, dirty)
+
+    changed = [p for p in paths if known.get(p, {}).get("stat") != _stat(p)]
+    tasks = [(p, out_dir, _part_name(p)) for p in changed]
+    for path, asins in _map(_ingest_file, tasks, n_jobs):
+        entry = known.get(path)
+        if entry is not None:
+            # parts of ASINs the new version of the file no longer contains
+            for asin in set(entry["asins"]) - set(asins):
+                _remove(_raw_part(out_dir, asin, entry["part"]))
+            dirty.update(entry["asins"])
+        known[path] = {"stat": _stat(path), "part": _part_name(path), "asins": asins}
+        dirty.update(asins)
+        _save_manifest(out_dir, manifest, dirty)
+
+    rebuilt = 0
+    tasks = [(out_dir, asin, source_features) for asin in sorted(dirty)]
+    for asin, _ in _map(_build_asin, tasks, n_jobs):
+        dirty.discard(asin)
+        rebuilt += 1
+        if rebuilt % 100 == 0:
+            _save_manifest(out_dir, manifest, dirty)
+    _save_manifest(out_dir, manifest, dirty)
+    return {"ingested": len(changed), "pruned": pruned, "rebuilt": rebuilt}
+
+
+def _ingest_file(path, out_dir, part):
+    df = pd.read_csv(path, parse_dates=["time"])
+    missing = [c for c in REQUIRED_COLUMNS if c not in df]
+    if missing:
+        raise ValueError(f"'{path}' lacks the columns {missing}")
+    asins = {}
+    for asin, rows in df.groupby("asin", sort=False):
+        asin = str(asin)
+        _write_parquet(rows.drop(columns="asin"), _raw_part(out_dir, asin, part))
+        asins[asin] = len(rows)
+    return path, asins
+
+
+def _build_asin(out_dir, asin, source_features="check"):
+    raw_dir = os.path.join(out_dir, "raw", f"asin={asin}")
+    target = os.path.join(out_dir, "features", f"asin={asin}", "part-0.parquet")
+    parts = sorted(glob.glob(os.path.join(raw_dir, "*.parquet")))
+    if not parts:
+        _remove(target)  # every source of the ASIN was pruned
+        return asin, 0
+    df = pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+    features = compute_features(df, source_features=source_features)
+    _write_parquet(features, target)
+    return asin, len(features)
+
+
+def _map(func, tasks, n_jobs):
+    """Yield func(*task) for every task, in completion order when run in parallel."""
+    if n_jobs is None:
+        n_jobs = max(1, (os.cpu_count() or 2) - 1)
+    if n_jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield func(*task)
+        return
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        futures = [pool.submit(func, *task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# ---------------------------------------------------------------------- #
+# reading
+# ---------------------------------------------------------------------- #
+def dataset_asins(out_dir):
+    """ASINs with computed features."""
+    pattern = os.path.join(out_dir, "features", "asin=*", "part-0.parquet")
+    return sorted(os.path.basename(os.path.dirname(p))[len("asin="):] for p in glob.glob(pattern))
+
+
+def iter_features(out_dir, columns=None, asins=None):
+    """
+    Yield (asin, DataFrame) per ASIN, one partition in memory at a time.
+
+    Args:
+        out_dir: Dataset directory written by build_dataset
+        columns: Columns to read, default all
+        asins: ASINs to read, default dataset_asins(out_dir)
+    """
+    for asin in dataset_asins(out_dir) if asins is None else asins:
+        path = os.path.join(out_dir, "features", f"asin={asin}", "part-0.parquet")
+        yield asin, pd.read_parquet(path, columns=None if columns is None else list(columns))
+
+
+def load_features(out_dir, columns=None, asins=None):
+    """All (or the selected) ASINs' features in one DataFrame with an `asin` column."""
+    frames = [df.assign(asin=asin) for asin, df in iter_features(out_dir, columns, asins)]
+    if not frames:
+        return pd.DataFrame(columns=["asin"] + list(columns or []))
+    return pd.concat(frames, ignore_index=True)
+
+
+def training_matrix(out_dir, features=FEATURE_NAMES, label=LABEL, asins=None, dtype=np.float64):
+    """
+    Feature matrix and labels for fitting the Buy Box model.
+
+    Only the requested columns are read, and every ASIN is written into arrays
+    preallocated from the Parquet row counts, so peak memory is the result plus
+    one partition.
+
+    Returns:
+        X: Array of shape (n_rows, len(features)), columns in `features` order
+        y: Labels of shape (n_rows,)
+    """
+    import pyarrow.parquet as pq
+
+    asins = dataset_asins(out_dir) if asins is None else list(asins)
+    paths = [os.path.join(out_dir, "features", f"asin={a}", "part-0.parquet") for a in asins]
+    n_rows = sum(pq.ParquetFile(p).metadata.num_rows for p in paths)
+    X = np.empty((n_rows, len(features)), dtype=dtype)
+    y = np.empty(n_rows, dtype=np.int64)
+    start = 0
+    for _, df in iter_features(out_dir, list(features) + [label], asins):
+        stop = start + len(df)
+        X[start:stop] = df[list(features)].to_numpy(dtype=dtype)
+        y[start:stop] = df[label].to_numpy()
+        start = stop
+    return X, y
+
+
+# ---------------------------------------------------------------------- #
+# files
+# ---------------------------------------------------------------------- #
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _part_name(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(path.encode()).hexdigest()[:8]  # same stem in different directories
+    return f"part-{stem}-{digest}.parquet"
+
+
+def _raw_part(out_dir, asin, part):
+    if os.sep in asin or asin in ("", ".", ".."):
+        raise ValueError(f"invalid ASIN {asin!r}")
+    return os.path.join(out_dir, "raw", f"asin={asin}", part)
+
+
+def _write_parquet(df, path):
+    """Write via a temporary file so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    except BaseException:
+        _remove(tmp)
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _load_manifest(out_dir):
+    path = os.path.join(out_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {"version": DATASET_VERSION, "sources": {}, "dirty": []}
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != DATASET_VERSION:
+        raise ValueError(f"'{out_dir}' was written by an incompatible version of buybox_data")
+    return manifest
+
+
+def _save_manifest(out_dir, manifest, dirty):
+    manifest["dirty"] = sorted(dirty)
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(out_dir, "manifest.json"))
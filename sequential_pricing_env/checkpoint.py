@@ -0,0 +1,387 @@
+"""
+Checkpoints of long simulation runs: pause, resume, extend and branch.
+
+A checkpoint is a directory holding one `.npy` file per array of a nested
+state dict and a JSON manifest with everything else:
+
+    <path>/manifest.json
+    <path>/arrays/<index>.<generation>.npy
+
+The state of a run is built from the state_dict() methods of the agents,
+ConvergenceMonitor, RollingFeatures, ExplorationStream and SparseQTable plus
+rng_state() for random generators, so any nested dict of arrays, scalars,
+strings, lists and dicts can be saved. The pricing envs only carry the last
+prices and their generator, i.e. env.state and rng_state(env.np_random).
+
+Writes are
+    - atomic: new array files are complete before the manifest naming them
+      replaces the old one (os.replace), and files only the old manifest used
+      are deleted afterwards. A run killed mid-save leaves the previous
+      checkpoint intact.
+    - incremental: the history segments of earlier saves (see history_segments)
+      never change, so they are taken over from the manifest by key and shape
+      without being read again. Any other array whose content digest matches
+      the one already on disk, e.g. the Q-tables of frozen agents or payoff
+      tables, is not rewritten and costs a hash, not a write.
+
+load() memory-maps every array copy-on-write (mmap_mode="c"): restoring
+touches no data until it is read, and a resumed run writing into its Q-tables
+gets private pages and leaves the files untouched. branch() hard-links the
+files of a checkpoint into a new directory, so several runs can continue
+from one trained prefix without copying or recomputing it.
+
+Example:
+    ckpt = Checkpointer("DATA_DIR/ckpt/qr-qr-7", every=100_000)
+    res = run_QrQr(payoff, prices, 1_000_000, seed=7, checkpoint=ckpt)   # resumes if interrupted
+    res = run_QrQr(payoff, prices, 2_000_000, seed=7, checkpoint=ckpt)   # extends the horizon
+    other = branch("DATA_DIR/ckpt/qr-qr-7", "DATA_DIR/ckpt/qr-qr-7-alpha05")
+    res = run_QrQr(payoff, prices, 2_000_000, alpha=0.05, checkpoint=other)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+MANIFEST = "manifest.json"
+ARRAYS = "arrays"
+APPEND_ONLY = ("history",)  # top-level state entries whose saved arrays never change
+NUMBA_RNG_VERSIONS = ((0, 57), (0, 68))  # numba releases whose private RNG interface is known
+
+_ARRAY = "__array__"  # marks an array leaf in the manifest's state tree
+
+
+# ---------------------------------------------------------------------- #
+# random generators
+# ---------------------------------------------------------------------- #
+def rng_state(rng=np.random):
+    """
+    State of an np.random.Generator, a RandomState or NumPy's global state (np.random).
+
+    The result is a nested dict of scalars and arrays that set_rng_state() accepts.
+    """
+    if isinstance(rng, np.random.Generator):
+        return rng.bit_generator.state
+    return rng.get_state(legacy=False)
+
+
+def set_rng_state(rng, state):
+    """Restore a state from rng_state() into the same kind of generator."""
+    if isinstance(rng, np.random.Generator):
+        rng.bit_generator.state = state
+    else:
+        rng.set_state(state)
+
+
+def _numba_helperlib():
+    """
+    numba's private `_helperlib`, which holds the random state of compiled code.
+
+    It has no public accessor, so only releases in NUMBA_RNG_VERSIONS are trusted.
+    """
+    import numba
+
+    version = tuple(int(part) for part in numba.__version__.split(".")[:2])
+    low, high = NUMBA_RNG_VERSIONS
+    try:
+        from numba import _helperlib
+        supported = (low <= version <= high and hasattr(_helperlib, "rnd_get_state")
+                     and hasattr(_helperlib, "rnd_set_state"))
+    except ImportError:
+        supported = False
+    if not supported:
+        raise RuntimeError(
+            f"checkpoints of compiled runs read numba's random state through the private "
+            f"numba._helperlib, known to work with numba {low[0]}.{low[1]} to {high[0]}.{high[1]}; "
+            f"numba {numba.__version__} is installed. Run without a checkpoint or with "
+            f"NUMBA_DISABLE_JIT=1.")
+    return _helperlib
+
+
+def numba_rng_state():
+    """
+    State of the random generator of numba-compiled code, which is separate
+    from NumPy's global state. None when numba is not installed.
+
+    Raises:
+        RuntimeError: numba is not a release in NUMBA_RNG_VERSIONS
+    """
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return None
+    helperlib = _numba_helperlib()
+    index, key = helperlib.rnd_get_state(helperlib.rnd_get_np_state_ptr())
+    return {"index": int(index), "key": np.array(key, dtype=np.uint32)}
+
+
+def set_numba_rng_state(state):
+    """Restore a state from numba_rng_state()."""
+    helperlib = _numba_helperlib()
+    helperlib.rnd_set_state(helperlib.rnd_get_np_state_ptr(),
+                            (int(state["index"]), np.asarray(state["key"]).tolist()))
+
+
+# ---------------------------------------------------------------------- #
+# state trees
+# ---------------------------------------------------------------------- #
+def _escape(name):
+    """Dict key as one component of a flat key; '~' and '/' are escaped as in JSON Pointer."""
+    return name.replace("~", "~0").replace("/", "~1")
+
+
+def _flatten(node, key, arrays):
+    """JSON tree of `node` with arrays replaced by references into `arrays`."""
+    if isinstance(node, np.ndarray):
+        if node.dtype.hasobject:
+            raise TypeError(f"'{key}' is an object array, which cannot be memory-mapped")
+        arrays[key] = node
+        return {_ARRAY: key}
+    if isinstance(node, dict):
+        out = {}
+        for k, v in node.items():
+            if not isinstance(k, str):
+                raise TypeError(f"state keys must be strings, got {k!r} in '{key}'")
+            out[k] = _flatten(v, f"{key}/{_escape(k)}" if key else _escape(k), arrays)
+        return out
+    if isinstance(node, (list, tuple)):
+        return [_flatten(v, f"{key}/{i}", arrays) for i, v in enumerate(node)]
+    if isinstance(node, np.generic):
+        return node.item()
+    if node is None or isinstance(node, (bool, int, float, str)):
+        return node
+    raise TypeError(f"cannot checkpoint '{key}' of type {type(node).__name__}")
+
+
+def _unflatten(node, arrays):
+    if isinstance(node, dict):
+        if _ARRAY in node and len(node) == 1:
+            return arrays[node[_ARRAY]]
+        return {k: _unflatten(v, arrays) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_unflatten(v, arrays) for v in node]
+    return node
+
+
+def _digest(array):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{array.dtype.str}{array.shape}".encode())
+    h.update(np.ascontiguousarray(array).data)
+    return h.hexdigest()
+
+
+def _load_array(path, mmap):
+    if mmap:
+        try:
+            # plain ndarray view of the map, numba kernels do not take np.memmap
+            return np.asarray(np.load(path, mmap_mode="c"))
+        except ValueError:
+            pass  # empty arrays cannot be mapped
+    return np.load(path)
+
+
+# ---------------------------------------------------------------------- #
+# checkpoints
+# ---------------------------------------------------------------------- #
+class Checkpointer:
+    """
+    Periodic, atomic and incremental checkpoints of one run in a directory.
+
+    Drivers that take a `checkpoint` argument (run_QrQr, run_QpQr, run_QpQp, train_sessions,
+    simulate_DQNpQr, ...) resume from it when it exists and call save() whenever
+    due() says so, and once at the end of the run.
+    """
+
+    def __init__(self, path, every=None, append_only=APPEND_ONLY):
+        """
+        Args:
+            path: Directory of the checkpoint; an existing checkpoint there is resumed
+            every: Periods between two saves; None only saves at the end of a run
+            append_only: Top-level state entries whose arrays never change once saved,
+                like history_segments(). They are reused by key, shape and dtype
+                instead of being hashed on every save.
+        """
+        self.path = path
+        self.every = every
+        self.append_only = tuple(append_only)
+        self.manifest = None
+        manifest_path = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest["version"] > CHECKPOINT_VERSION:
+                raise ValueError(f"'{path}' was written by a newer version of the checkpoint format")
+
+    @property
+    def exists(self):
+        return self.manifest is not None
+
+    @property
+    def step(self):
+        """Period of the last save, 0 if there is none."""
+        return self.manifest["step"] if self.exists else 0
+
+    @property
+    def meta(self):
+        return self.manifest["meta"] if self.exists else {}
+
+    def due(self, step):
+        """Whether `every` periods have passed since the last save."""
+        return self.every is not None and step - self.step >= self.every
+
+    def next_due(self):
+        """First period at which due() becomes True, None without `every`."""
+        return None if self.every is None else self.step + self.every
+
+    def save(self, state, step, **meta):
+        """
+        Write `state` as the new checkpoint.
+
+        Args:
+            state: Nested dict of arrays, scalars, strings, lists and dicts
+            step: Period the state belongs to, usually the number of periods played
+            **meta: JSON-serializable values stored alongside, e.g. the run parameters
+        """
+        arrays = {}
+        tree = _flatten(state, "", arrays)
+        array_dir = os.path.join(self.path, ARRAYS)
+        os.makedirs(array_dir, exist_ok=True)
+        old = self.manifest["arrays"] if self.exists else {}
+        generation = self.manifest["generation"] + 1 if self.exists else 0
+
+        entries = {}
+        for index, (key, array) in enumerate(arrays.items()):
+            prev = old.get(key)
+            if (prev is not None and key.split("/", 1)[0] in self.append_only
+                    and prev.get("shape") == list(array.shape) and prev.get("dtype") == array.dtype.str):
+                entries[key] = prev
+                continue
+            digest = _digest(array)
+            if prev is not None and prev["digest"] == digest:
+                entries[key] = prev
+                continue
+            name = f"{index}.{generation}.npy"
+            fd, tmp = tempfile.mkstemp(dir=array_dir, suffix=".npy.tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, os.path.join(array_dir, name))
+            entries[key] = {"file": name, "digest": digest, "shape": list(array.shape),
+                            "dtype": array.dtype.str}
+
+        manifest = {"version": CHECKPOINT_VERSION, "step": int(step), "generation": generation,
+                    "meta": dict(meta), "state": tree, "arrays": entries}
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".json.tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+        self.manifest = manifest
+        self._collect(array_dir)
+
+    def _collect(self, array_dir):
+        """Delete array files the manifest no longer names, including leftovers of killed saves."""
+        used = {entry["file"] for entry in self.manifest["arrays"].values()}
+        for name in os.listdir(array_dir):
+            if name not in used:
+                try:
+                    os.remove(os.path.join(array_dir, name))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, mmap=True):
+        """
+        State of the last save.
+
+        Args:
+            mmap: Memory-map the arrays copy-on-write instead of reading them
+
+        Returns:
+            state: The nested dict passed to save(); tuples come back as lists
+        """
+        if not self.exists:
+            raise FileNotFoundError(f"no checkpoint in '{self.path}'")
+        array_dir = os.path.join(self.path, ARRAYS)
+        arrays = {key: _load_array(os.path.join(array_dir, entry["file"]), mmap)
+                  for key, entry in self.manifest["arrays"].items()}
+        return _unflatten(self.manifest["state"], arrays)
+
+
+def branch(src, dst, every=None):
+    """
+    New checkpoint at `dst` starting from the last save of `src`.
+
+    Array files are hard-linked (copied where linking is not possible), so the
+    branch costs no space until its run writes a new save. Later saves of
+    either checkpoint never modify the shared files.
+
+    Args:
+        src: Directory of an existing checkpoint
+        dst: Directory of the branch; must not hold a checkpoint yet
+        every: Save interval of the returned Checkpointer
+
+    Returns:
+        checkpoint: Checkpointer on `dst`
+    """
+    source = Checkpointer(src)
+    if not source.exists:
+        raise FileNotFoundError(f"no checkpoint in '{src}'")
+    if os.path.exists(os.path.join(dst, MANIFEST)):
+        raise FileExistsError(f"'{dst}' already holds a checkpoint")
+    array_dir = os.path.join(dst, ARRAYS)
+    os.makedirs(array_dir, exist_ok=True)
+    for entry in source.manifest["arrays"].values():
+        src_file = os.path.join(src, ARRAYS, entry["file"])
+        dst_file = os.path.join(array_dir, entry["file"])
+        try:
+            os.link(src_file, dst_file)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(src_file, dst_file)
+    manifest = dict(source.manifest, meta=dict(source.meta, branched_from=os.path.abspath(src)))
+    fd, tmp = tempfile.mkstemp(dir=dst, suffix=".json.tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(dst, MANIFEST))
+    return Checkpointer(dst, every=every)
+
+
+def history_segments(result, names, bounds):
+    """
+    Histories of a run cut at the periods of earlier saves.
+
+    Each save adds one segment and leaves the earlier ones unchanged, so
+    Checkpointer.save() neither hashes nor writes the periods of earlier saves;
+    save them under "history", one of the Checkpointer's append_only entries.
+
+    Args:
+        result: dict name -> array with periods on the last axis
+        names: Series to save
+        bounds: Increasing periods [0, t_1, ..., t_now] of the saves so far
+
+    Returns:
+        segments: list of dicts with "start" and the slice of every series
+    """
+    return [dict({name: result[name][..., start:stop] for name in names}, start=start)
+            for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def restore_history(result, segments):
+    """
+    Copy saved history segments into preallocated arrays of `result`.
+
+    Returns:
+        bounds: Segment boundaries, to be extended by later saves
+    """
+    bounds = [0]
+    for seg in segments:
+        start = seg["start"]
+        for name, values in seg.items():
+            if name != "start":
+                result[name][..., start:start + values.shape[-1]] = values
+                stop = start + values.shape[-1]
+        bounds.append(stop)
+    return bounds
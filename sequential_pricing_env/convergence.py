@@ -0,0 +1,232 @@
+"""
+Convergence detection for long Q-learning runs.
+
+ConvergenceMonitor is fed the Q-tables of a run every `check_every` periods
+and declares convergence once the greedy policy of every agent has stayed the
+same for `patience` consecutive checks (optionally also requiring the largest
+Q-value change between checks to fall below `q_tol`), the criterion of
+Calvano et al. (2020). A run cannot stop while exploration is still
+material: by default not before ε_t = exp(-t * ω) has fallen below `eps_tol`,
+since until then exploration keeps moving play from one cycle to another
+even after the greedy policies have settled. The simulation drivers in
+sequential_pricing_env.simulation accept a monitor and stop at convergence;
+the periods never played are NaN unless the driver is asked to fill them
+with the limit cycle of the greedy policies.
+
+The limit cycle itself is found by `greedy_cycle`, which plays the frozen
+greedy policies forward until the full agent state repeats. For price
+histories from other sources, `detect_cycle` finds the shortest period with
+which the tail of a history repeats, e.g. an Edgeworth cycle.
+"""
+
+import numpy as np
+
+from .rng import OMEGA, epsilon_horizon
+
+
+class ConvergenceMonitor:
+    """
+    Greedy-policy stability check for one run at a time.
+
+    Usage inside a driver:
+        monitor.reset(omega)
+        for stop in range(check_every, periods + 1, check_every):
+            ... run periods up to `stop` ...
+            if monitor.update(stop, Q0, Q1):
+                break
+
+    Attributes:
+        converged_at: First period of the final stretch of unchanged greedy policies, or None
+        stopped_at: Period at which the run was stopped, or None
+        q_delta: Largest absolute Q change between the last two checks
+        trace: List of (period, n_greedy_changes, q_delta) per check
+        cycle: Limit cycle of prices set by the driver, array (n_agents, cycle_length)
+        reports: Summaries of the previous runs, one dict per reset()
+    """
+
+    def __init__(self, check_every=10_000, patience=10, q_tol=None, min_periods=None, eps_tol=1e-5,
+                 omega=OMEGA):
+        """
+        Args:
+            check_every: Periods between two checks
+            patience: Number of consecutive checks without a greedy change required
+            q_tol: Optional bound on the largest Q change between checks
+            min_periods: Never stop before this period. None derives it from the ε
+                schedule: the first period with exp(-t * omega) < eps_tol
+            eps_tol: Exploration probability below which a run may stop
+            omega: ε decay rate of the runs; the drivers pass their own to reset()
+        """
+        self.check_every = check_every
+        self.patience = patience
+        self.q_tol = q_tol
+        self.eps_tol = eps_tol
+        self.omega = omega
+        self._min_periods = min_periods
+        self.min_periods = self._resolve_min_periods()
+        self.reports = []
+        self._clear()
+
+    def _resolve_min_periods(self):
+        if self._min_periods is not None:
+            return self._min_periods
+        return epsilon_horizon(self.eps_tol, self.omega)
+
+    def _clear(self):
+        self.converged_at = None
+        self.stopped_at = None
+        self.q_delta = np.inf
+        self.trace = []
+        self.cycle = None
+        self._greedy = None
+        self._Q = None
+        self._stable = 0
+        self._stable_since = 0
+
+    def reset(self, omega=None):
+        """
+        Archive the summary of the current run (if any) and start a new one.
+
+        Args:
+            omega: ε decay rate of the new run, used for the default min_periods
+        """
+        if self.trace:
+            self.reports.append(self.report())
+        if omega is not None:
+            self.omega = omega
+            self.min_periods = self._resolve_min_periods()
+        self._clear()
+
+    def report(self):
+        """Summary of the current run."""
+        return {
+            "converged_at": self.converged_at,
+            "stopped_at": self.stopped_at,
+            "checks": len(self.trace),
+            "q_delta": self.q_delta,
+            "cycle": self.cycle,
+        }
+
+    def update(self, t, *Qs):
+        """
+        Record the Q-tables at period `t`.
+
+        Args:
+            t: Number of periods played so far
+            *Qs: Q-table of every agent, greedy action along the last axis
+
+        Returns:
+            converged: True when the run can stop
+        """
+        greedy = [np.argmax(Q, axis=-1) for Q in Qs]
+        if self._greedy is None:
+            changes = -1
+            self._stable_since = t
+        else:
+            changes = int(sum(np.count_nonzero(g != prev) for g, prev in zip(greedy, self._greedy)))
+            self.q_delta = max(float(np.max(np.abs(Q - prev))) for Q, prev in zip(Qs, self._Q))
+            if changes:
+                self._stable = 0
+                self._stable_since = t
+            else:
+                self._stable += 1
+        self._greedy = greedy
+        self._Q = [np.array(Q, copy=True) for Q in Qs]
+        self.trace.append((t, changes, self.q_delta))
+
+        converged = (self._stable >= self.patience
+                     and t >= self.min_periods
+                     and (self.q_tol is None or self.q_delta <= self.q_tol))
+        if converged:
+            self.converged_at = self._stable_since
+            self.stopped_at = t
+        return converged
+
+    def state_dict(self):
+        """State of the current run, see sequential_pricing_env.checkpoint; archived reports are not included."""
+        return {
+            "converged_at": self.converged_at,
+            "stopped_at": self.stopped_at,
+            "q_delta": self.q_delta,
+            "trace": np.array(self.trace, dtype=np.float64).reshape(-1, 3),
+            "greedy": self._greedy,
+            "Q": self._Q,
+            "stable": self._stable,
+            "stable_since": self._stable_since,
+        }
+
+    def load_state_dict(self, state):
+        """Continue a run from state_dict(); `cycle` is set again by the driver."""
+        self._clear()
+        self.converged_at = state["converged_at"]
+        self.stopped_at = state["stopped_at"]
+        self.q_delta = state["q_delta"]
+        self.trace = [(int(t), int(changes), q_delta) for t, changes, q_delta in np.asarray(state["trace"])]
+        self._greedy = state["greedy"]
+        self._Q = state["Q"]
+        self._stable = state["stable"]
+        self._stable_since = state["stable_since"]
+
+
+def detect_cycle(history, max_period=100, min_repeats=3):
+    """
+    Shortest period with which the tail of a history repeats.
+
+    Args:
+        history: Array (..., T), e.g. prices of both firms with shape (2, T)
+        max_period: Longest cycle considered
+        min_repeats: The cycle must repeat this many times at the end of the history
+
+    Returns:
+        cycle: Array (..., L) holding the last L periods, or None if no period up to
+            max_period repeats; L = 1 means the prices are constant
+    """
+    history = np.asarray(history)
+    T = history.shape[-1]
+    for L in range(1, max_period + 1):
+        span = L * min_repeats
+        if span > T:
+            break
+        tail = history[..., T - span:]
+        if np.array_equal(tail[..., L:], tail[..., :-L]):
+            return history[..., T - L:]
+    return None
+
+
+def greedy_cycle(kernel, payoff, prices, Q0, Q1, state, rule_timer_thr, max_steps=None):
+    """
+    Limit cycle of two frozen greedy policies.
+
+    Plays the simulation kernel forward with ε = 0 and α = 0 on copies of the
+    Q-tables and state until the full agent state repeats. The finite state
+    space guarantees this within max_steps = number of states.
+
+    The kernels still draw their (now irrelevant) exploration coin, so call
+    this only after a run is finished.
+
+    Args:
+        kernel: simulation._run_rule_rule, _run_price_rule or _run_price_price
+        payoff, prices, Q0, Q1, state, rule_timer_thr: As passed to the kernel
+
+    Returns:
+        path: Dict with "price", "action" and "profit" of shape (2, n) for the
+            transient from `state` into the cycle followed by one pass of the cycle
+        start: Index in path where the cycle begins
+    """
+    n_prices = prices.shape[0]
+    if max_steps is None:
+        max_steps = n_prices * n_prices * (max(Q0.shape[1], Q1.shape[1]) * rule_timer_thr) ** 2 + 1
+    Q0, Q1, state = Q0.copy(), Q1.copy(), state.copy()
+    eps = np.zeros(1)
+    step = {name: np.zeros((2, 1)) for name in ("price", "action", "profit")}
+    path = {name: [] for name in step}
+    seen = {}
+    for k in range(max_steps):
+        key = tuple(state)
+        if key in seen:
+            return {name: np.array(v).T for name, v in path.items()}, seen[key]
+        seen[key] = k
+        kernel(payoff, prices, Q0, Q1, state, eps, 0.0, 0.0, rule_timer_thr, 0, 1,
+               step["price"], step["action"], step["profit"])
+        for name in step:
+            path[name].append(step[name][:, 0].copy())
+    raise RuntimeError("greedy play did not cycle within max_steps")
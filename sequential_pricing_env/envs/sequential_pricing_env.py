@@ -2,6 +2,8 @@ import gymnasium as gym
 import numpy as np
 from gymnasium import spaces
 
+from ..payoff_cache import load_or_build
+
 class SequentialPricingEnv(gym.Env):
     """
     Sequential Pricing Environment based on Klein (2021)
@@ -10,8 +12,13 @@ class SequentialPricingEnv(gym.Env):
     Each firm takes turns to set prices, and demand follows a simple linear model.
     """
     metadata = {'render_modes': ['human', 'rgb_array'], 'render_fps': 4}
+
+    # Largest payoff tensor (number of float64 entries) that step() will serve from.
+    # Beyond this, profits are computed on the fly.
+    max_payoff_entries = 1 << 22
     
-    def __init__(self, n_firms=2, n_prices=6, discount_factor=0.95, render_mode=None):
+    def __init__(self, n_firms=2, n_prices=6, discount_factor=0.95, render_mode=None,
+                 payoff_cache_dir=None, return_info=True):
         """
         Initialize the environment with default parameters from Klein (2021)
         
@@ -20,11 +27,20 @@ class SequentialPricingEnv(gym.Env):
             n_prices: Number of discrete price levels (default: 6)
             discount_factor: Discount factor for future rewards (default: 0.95)
             render_mode: Mode for rendering the environment
+            payoff_cache_dir: Where to cache the payoff table. None uses the
+                default cache dir, False keeps it in memory only
+            return_info: Whether step() fills the info dict with profits and
+                prices. Disable for long runs that never read it.
         """
         self.n_firms = n_firms
         self.n_prices = n_prices
         self.discount_factor = discount_factor
         self.render_mode = render_mode
+        self.return_info = return_info
+        self.payoff_cache_dir = payoff_cache_dir
+        self._payoff = None  # built on first use, see payoff_table()
+        self._use_payoff = n_prices ** n_firms * n_firms <= self.max_payoff_entries
+        self._scratch = {}  # work buffers of _calculate_demand, keyed by batch shape
         
         # Price space from 0 to 1 with n_prices intervals
         self.prices = np.linspace(0, 1, n_prices)
@@ -63,59 +79,131 @@ class SequentialPricingEnv(gym.Env):
         
         return self.previous_prices, {}
     
-    def _calculate_demand(self, price_idx_list):
+    def _scratch_buffers(self, shape):
+        """
+        Work buffers for a batch of joint actions of the given shape, reused across calls
+        """
+        bufs = self._scratch.get(shape)
+        if bufs is None:
+            bufs = (
+                np.empty(shape),                            # prices
+                np.empty(shape, dtype=bool),                # lowest-price mask
+                np.empty(shape[:-1] + (1,), dtype=np.intp), # lowest price index
+                np.empty(shape[:-1] + (1,)),                # number of firms at the lowest price
+            )
+            self._scratch[shape] = bufs
+        return bufs
+
+    def _calculate_demand(self, price_idx_list, out=None):
         """
         Calculate demand for each firm based on linear demand function from Klein (2021)
+
+        The firms at the lowest price split the market demand 1 - p equally,
+        every other firm sells nothing. The price grid is increasing, so the
+        comparison is done on the price indices directly.
         
         Args:
-            price_idx_list: List of price indices chosen by all firms
+            price_idx_list: Price indices chosen by all firms. Shape (..., n_firms),
+                leading dimensions index independent markets/episodes
+            out: Optional float array of the same shape to write the demand into
             
         Returns:
-            demand: A vector of demand quantities for each firm
+            demand: Demand quantities for each firm. Shape (..., n_firms)
         """
-        # print(f"Price indices: {price_idx_list}")
-        # print(f"Prices: {self.prices}")
-        prices = [self.prices[i] for i in price_idx_list]  # Convert indices to actual prices
-        demand = np.zeros(self.n_firms)
-        
-        for i in range(self.n_firms):
-            own_price = prices[i]
-            competitor_prices = np.delete(prices, i)
-            
-            if own_price < np.min(competitor_prices):
-                # Firm captures entire market
-                demand[i] = 1 - own_price
-            elif own_price == np.min(competitor_prices):
-                # Firms with the lowest price split the market
-                num_firms_with_min_price = np.sum(prices == own_price)
-                demand[i] = (1 - own_price) / num_firms_with_min_price
-            else:
-                # Firm captures no market
-                demand[i] = 0
-        
-        return demand
+        idx = np.asarray(price_idx_list)
+        prices, is_min, min_idx, n_min = self._scratch_buffers(idx.shape)
+        if out is None:
+            out = np.empty(idx.shape)
+
+        np.take(self.prices, idx, out=prices)  # Convert indices to actual prices
+        np.min(idx, axis=-1, keepdims=True, out=min_idx)
+        np.equal(idx, min_idx, out=is_min)
+        np.sum(is_min, axis=-1, keepdims=True, out=n_min)
+
+        np.subtract(1.0, prices, out=out)
+        np.divide(out, n_min, out=out)
+        np.multiply(out, is_min, out=out)
+        return out
     
-    def _calculate_profit(self, action):
+    def _calculate_profit(self, action, out=None):
         """
-        Calculate profit for both firms based on their prices
+        Calculate profit for all firms based on their prices
         
         Args:
-            action: Price index chosen by all the firms in the current period
+            action: Price index chosen by all the firms in the current period.
+                Shape (..., n_firms)
+            out: Optional float array of the same shape to write the profit into
             
         Returns:
-            profit: Profit for each firm in the current period
+            profit: Profit for each firm in the current period. Shape (..., n_firms)
         """
-        demand = self._calculate_demand(action)
-        prices = self.prices[action]  # Get the actual prices based on indices
+        idx = np.asarray(action)
+        out = self._calculate_demand(idx, out=out)
+        prices = self._scratch_buffers(idx.shape)[0]  # filled by _calculate_demand
+        np.multiply(prices, out, out=out)
+        return out
+
+    def calculate_profits(self, actions, out=None):
+        """
+        Profits for a batch of joint actions, without touching the env state
+
+        Served from the payoff table when it is small enough to build,
+        otherwise computed with the vectorized demand path.
         
-        return prices * demand # shape: (n_firms,)
+        Args:
+            actions: Price indices of shape (..., n_firms), e.g. (n_episodes, n_firms)
+            out: Optional float array of the same shape to write the profits into
+            
+        Returns:
+            profit: Profits of shape (..., n_firms)
+        """
+        actions = np.asarray(actions)
+        if not self._use_payoff:
+            return self._calculate_profit(actions, out=out)
+        payoff = self._payoff if self._payoff is not None else self.payoff_table()
+        flat = np.ravel_multi_index(np.moveaxis(actions, -1, 0), payoff.shape[:-1])
+        return np.take(payoff.reshape(-1, self.n_firms), flat, axis=0, out=out)
     
+    def payoff_table(self):
+        """
+        Dense payoff tensor of shape (n_prices,) * n_firms + (n_firms,).
+
+        payoff[a_1, ..., a_n] is the profit vector of all firms when firm k
+        plays price index a_k. Built on first call and cached on disk keyed by
+        the environment parameters.
+
+        Returns:
+            payoff: Read-only array of profits
+        """
+        if self._payoff is None:
+            entries = self.n_prices ** self.n_firms * self.n_firms
+            if entries > self.max_payoff_entries:
+                raise ValueError(
+                    f"Payoff table with {entries} entries exceeds max_payoff_entries="
+                    f"{self.max_payoff_entries}; use _calculate_profit instead"
+                )
+            params = dict(n_firms=self.n_firms, n_prices=self.n_prices)
+            self._payoff = load_or_build(type(self).__name__, params, self._build_payoff_table,
+                                         cache_dir=self.payoff_cache_dir)
+        return self._payoff
+
+    def _build_payoff_table(self):
+        """
+        Evaluate _calculate_profit for every joint action on the price grid in one pass
+        """
+        shape = (self.n_prices,) * self.n_firms
+        joint = np.indices(shape).reshape(self.n_firms, -1).T  # (n_prices**n_firms, n_firms)
+        table = self._calculate_profit(joint)
+        self._scratch.pop(joint.shape, None)  # one-off buffers, do not keep them around
+        return table.reshape(shape + (self.n_firms,))
+
     def step(self, action_idx): 
         """
         Take a step in the environment by setting a price
         
         Args:
-            action: Price index chosen by all the firms in the current period. Shape: (n_firms,)
+            action: Price index chosen by all the firms in the current period. Shape: (n_firms,),
+                or (..., n_firms) for a batch of independent markets
             
         Returns:
             observation: Price set by opponent
@@ -126,7 +214,14 @@ class SequentialPricingEnv(gym.Env):
         """
         
         # Calculate profit for current firm
-        profit = self._calculate_profit(action_idx)
+        idx = np.asarray(action_idx)
+        if idx.ndim > 1:
+            profit = self.calculate_profits(idx)
+        elif self._use_payoff:
+            payoff = self._payoff if self._payoff is not None else self.payoff_table()
+            profit = payoff[tuple(idx)].copy()
+        else:
+            profit = self._calculate_profit(idx)
         
         # Update state. Note: In the future we may want to include more history.
         self.previous_prices_idx = action_idx
@@ -140,10 +235,13 @@ class SequentialPricingEnv(gym.Env):
         truncated = False
         
         # Additional info
-        info = {
-            "profit": profit,
-            "price": [self.prices[i] for i in action_idx],
-        }
+        if self.return_info:
+            info = {
+                "profit": profit,
+                "price": self.prices[idx],
+            }
+        else:
+            info = {}
         
         return observation, profit, terminated, truncated, info
     
@@ -0,0 +1,305 @@
+"""
+Nash, monopoly and collusive benchmarks for the pricing environments.
+
+Continuous benchmarks of the logit duopoly solve the first-order conditions
+directly. With inside shares s_i, logit demand gives
+
+    Nash:       p_i = c + mu / (1 - s_i)
+    collusive:  p   = c + mu / (1 - sum_i s_i)    (joint profit, symmetric firms)
+    monopoly:   p   = c + mu / (1 - s)            (one seller against the outside option)
+
+each solved as a one-dimensional root in the symmetric price. Grid benchmarks
+work on an environment's payoff table: best responses are argmaxes along one
+axis, pure Nash equilibria are the joint actions that are mutual best
+responses, and the collusive outcome maximizes joint profit. For the Amazon env
+the Buy Box winner of every price pair is fixed by an assignment rule first,
+which reduces the (G, G, 2, 2, 2) table to an ordinary (G, G, 2) game.
+
+All results are memoized, per parameter set for the continuous solvers and per
+payoff table for the grid ones, so benchmark lines cost nothing after the
+first config of a sweep.
+"""
+
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+Benchmarks = namedtuple("Benchmarks", ["nash", "monopoly", "collusive"])
+
+_GRID_MEMO = {}
+
+
+# ---------------------------------------------------------------------- #
+# continuous logit benchmarks
+# ---------------------------------------------------------------------- #
+def logit_shares(prices, a_0=0.0, a_12=10.0, mu=0.25):
+    """
+    Inside-good shares of the logit demand with outside option.
+
+    Args:
+        prices: Array of shape (..., n_firms)
+
+    Returns:
+        shares: Array of the same shape
+    """
+    u = (a_12 - np.asarray(prices, dtype=np.float64)) / mu
+    u0 = a_0 / mu
+    shift = np.maximum(u.max(axis=-1, keepdims=True), u0)  # stable softmax
+    e = np.exp(u - shift)
+    return e / (e.sum(axis=-1, keepdims=True) + np.exp(u0 - shift))
+
+
+def _symmetric_root(markup, cost, mu):
+    """
+    Solve p = cost + markup(p) for the symmetric price, markup(p) > 0 and decreasing.
+
+    Needs scipy, imported here so the grid benchmarks work without it.
+    """
+    from scipy.optimize import brentq
+
+    g = lambda p: p - cost - markup(p)
+    lo, hi = cost, cost + mu
+    while g(hi) < 0:
+        hi = cost + 2 * (hi - cost)
+    return brentq(g, lo, hi, xtol=1e-12)
+
+
+@lru_cache(maxsize=None)
+def logit_nash_price(cost=2.0, a_0=0.0, a_12=10.0, mu=0.25, n_firms=2):
+    """Symmetric Bertrand-Nash price of the logit oligopoly."""
+    def markup(p):
+        s = logit_shares(np.full(n_firms, p), a_0, a_12, mu)[0]
+        return mu / (1.0 - s)
+    return _symmetric_root(markup, cost, mu)
+
+
+@lru_cache(maxsize=None)
+def logit_collusive_price(cost=2.0, a_0=0.0, a_12=10.0, mu=0.25, n_firms=2):
+    """Symmetric price maximizing the joint profit of all firms."""
+    def markup(p):
+        s = logit_shares(np.full(n_firms, p), a_0, a_12, mu).sum()
+        return mu / (1.0 - s)
+    return _symmetric_root(markup, cost, mu)
+
+
+@lru_cache(maxsize=None)
+def logit_monopoly_price(cost=2.0, a_0=0.0, a_12=10.0, mu=0.25):
+    """
+    Price of a single seller facing only the outside option.
+
+    This is the "monopoly price" line of the simulation notebooks.
+    """
+    return logit_collusive_price(cost, a_0, a_12, mu, n_firms=1)
+
+
+def logit_benchmarks(env, n_firms=2):
+    """
+    Continuous benchmark prices for a logit env (LogitDemandPricingEnv,
+    AmazonLogitDemandPricingEnv ignoring the Buy Box, or any object with
+    cost, a_0, a_12 and mu attributes).
+    """
+    params = (float(env.cost), float(env.a_0), float(env.a_12), float(env.mu))
+    return Benchmarks(
+        nash=logit_nash_price(*params, n_firms=n_firms),
+        monopoly=logit_monopoly_price(*params),
+        collusive=logit_collusive_price(*params, n_firms=n_firms),
+    )
+
+
+# ---------------------------------------------------------------------- #
+# grid benchmarks from payoff tables
+# ---------------------------------------------------------------------- #
+def best_responses(table):
+    """
+    Best-response maps of a two-firm payoff table.
+
+    Args:
+        table: Payoff table of shape (G, G, 2), table[a_i, a_j] = (r_i, r_j)
+
+    Returns:
+        br_i: Array (G,), firm i's best price index against each a_j
+        br_j: Array (G,), firm j's best price index against each a_i
+    """
+    table = np.asarray(table)
+    return np.argmax(table[..., 0], axis=0), np.argmax(table[..., 1], axis=1)
+
+
+def grid_nash(table):
+    """
+    All pure-strategy Nash equilibria of a two-firm payoff table.
+
+    A joint action is an equilibrium when neither firm gains by deviating,
+    ties included, so every maximizer counts as a best response.
+
+    Returns:
+        equilibria: Read-only int array of shape (K, 2) with the (a_i, a_j) index pairs
+    """
+    memo_key = ("nash", _table_key(table))
+    if memo_key not in _GRID_MEMO:
+        table = np.asarray(table)
+        best_i = table[..., 0].max(axis=0, keepdims=True)
+        best_j = table[..., 1].max(axis=1, keepdims=True)
+        stable = (table[..., 0] >= best_i) & (table[..., 1] >= best_j)
+        equilibria = np.argwhere(stable)
+        equilibria.setflags(write=False)  # shared by every caller through the memo
+        _GRID_MEMO[memo_key] = equilibria
+    return _GRID_MEMO[memo_key]
+
+
+def grid_collusive(table, symmetric=True):
+    """
+    Joint action maximizing the sum of profits.
+
+    Args:
+        table: Payoff table of shape (G, G, 2)
+        symmetric: Restrict to equal price indices, the usual collusive benchmark
+
+    Returns:
+        (a_i, a_j): Index pair
+    """
+    memo_key = ("collusive", symmetric, _table_key(table))
+    if memo_key not in _GRID_MEMO:
+        joint = np.asarray(table).sum(axis=-1)
+        if symmetric:
+            k = int(np.argmax(np.diagonal(joint)))
+            _GRID_MEMO[memo_key] = (k, k)
+        else:
+            a_i, a_j = np.unravel_index(np.argmax(joint), joint.shape)
+            _GRID_MEMO[memo_key] = (int(a_i), int(a_j))
+    return _GRID_MEMO[memo_key]
+
+
+def grid_monopoly(profit):
+    """Index of the best price of a single-seller profit vector over the grid."""
+    return int(np.argmax(profit))
+
+
+def single_seller_profit(env):
+    """
+    Profit of a seller alone in the market at every grid price.
+
+    Logit envs (with a_0, a_12 and mu) use the logit demand against the outside
+    option, including the Buy Box utility if the env has one, since a sole seller
+    holds the box. Other envs are taken to have unit demand, as in Bertrand.
+    """
+    prices = np.asarray(env.prices, dtype=np.float64)
+    if not hasattr(env, "mu"):
+        return prices - env.cost
+    a_12 = env.a_12 + env.mu * getattr(env, "bb_utility", 0.0)
+    return (prices - env.cost) * logit_shares(prices[:, None], env.a_0, a_12, env.mu)[:, 0]
+
+
+def grid_benchmarks(env, table=None):
+    """
+    Grid-restricted benchmark prices of a two-firm env.
+
+    Args:
+        env: Env with `prices` and `payoff_table()` (LogitDemandPricingEnv, BertrandPricingEnv)
+        table: Optional (G, G, 2) table to use instead, e.g. from buy_box_table()
+
+    Returns:
+        Benchmarks: Price pairs (p_i, p_j). `nash` is the equilibrium with the
+        lowest joint profit when there are several, None when there is none.
+        `monopoly` is the best grid price of a single seller, see single_seller_profit().
+    """
+    prices = env.prices
+    table = env.payoff_table() if table is None else np.asarray(table)
+    equilibria = grid_nash(table)
+    nash = None
+    if len(equilibria):
+        joint = table[equilibria[:, 0], equilibria[:, 1]].sum(axis=-1)
+        a_i, a_j = equilibria[np.argmin(joint)]
+        nash = (prices[a_i], prices[a_j])
+    k = grid_monopoly(single_seller_profit(env))
+    a_i, a_j = grid_collusive(table)
+    return Benchmarks(nash=nash, monopoly=(prices[k], prices[k]),
+                      collusive=(prices[a_i], prices[a_j]))
+
+
+# ---------------------------------------------------------------------- #
+# Buy Box
+# ---------------------------------------------------------------------- #
+def lowest_price_assignment(grid_size):
+    """
+    Buy Box rule awarding the box to the cheaper seller, seller i on ties.
+
+    Returns:
+        winner: Int array (G, G); 0 if seller i holds the Buy Box at (a_i, a_j), 1 if seller j
+    """
+    a = np.arange(grid_size)
+    return (a[None, :] < a[:, None]).astype(np.int64)
+
+
+def stationary_rf_assignment(predictor, prices, is_amazon=0, is_fba=1):
+    """
+    Buy Box winners predicted by the RF model for every price pair held constant.
+
+    When both sellers keep their prices, every rolling average of
+    sequential_pricing_env.features equals the current value, so the feature
+    vector of a price pair does not depend on the history. The seller with the
+    higher Buy Box probability wins, seller i on ties, as in the simulations.
+
+    Args:
+        predictor: Callable X -> (pred, prob), e.g. BuyBoxCache(pipeline).predict_batch
+            or functools.partial(rf_interface.predict_batch, pipeline)
+        prices: Price grid (G,)
+
+    Returns:
+        winner: Int array (G, G), see lowest_price_assignment()
+    """
+    from .features import RollingFeatures
+
+    prices = np.asarray(prices, dtype=np.float64)
+    G = len(prices)
+    pairs = np.stack(np.meshgrid(prices, prices, indexing="ij"), axis=-1).reshape(-1, 2)
+    rolling = RollingFeatures(n_sellers=2, is_amazon=is_amazon, is_fba=is_fba, n_markets=len(pairs))
+    _, prob = predictor(rolling.update(pairs))
+    prob = np.asarray(prob).reshape(G, G, 2)
+    return (prob[..., 0] < prob[..., 1]).astype(np.int64)
+
+
+def buy_box_table(table, winner):
+    """
+    Reduce an Amazon payoff table to a two-firm game under a Buy Box rule.
+
+    Args:
+        table: AmazonLogitDemandPricingEnv.payoff_table(), shape (G, G, 2, 2, 2)
+        winner: Int array (G, G) from an assignment rule, 0 = seller i, 1 = seller j
+
+    Returns:
+        table: Array (G, G, 2) of profits with the Buy Box assigned
+    """
+    table = np.asarray(table)
+    winner = np.asarray(winner)
+    a_i, a_j = np.indices(winner.shape)
+    return table[a_i, a_j, (winner == 0).astype(np.int64), (winner == 1).astype(np.int64)]
+
+
+def buy_box_benchmarks(env, winner=None):
+    """
+    Grid benchmarks of AmazonLogitDemandPricingEnv under a Buy Box rule.
+
+    Args:
+        env: AmazonLogitDemandPricingEnv
+        winner: (G, G) assignment, default lowest_price_assignment()
+
+    Returns:
+        Benchmarks: See grid_benchmarks()
+    """
+    if winner is None:
+        winner = lowest_price_assignment(env.grid_size)
+    return grid_benchmarks(env, table=buy_box_table(env.payoff_table(), winner))
+
+
+def clear_memo():
+    """Drop all memoized benchmark results."""
+    _GRID_MEMO.clear()
+    for func in (logit_nash_price, logit_collusive_price, logit_monopoly_price):
+        func.cache_clear()
+
+
+def _table_key(table):
+    table = np.ascontiguousarray(table)
+    return table.shape, hashlib.sha1(table.view(np.uint8)).hexdigest()
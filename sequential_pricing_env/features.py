@@ -0,0 +1,167 @@
+"""
+Streaming seller features for the Buy Box random forest.
+
+RollingFeatures keeps the 14/30/60-period price and price-rank sums of every
+seller in ring buffers, so each period costs O(1) work per seller and window
+instead of re-sorting and re-averaging the whole price history. The feature
+matrix is preallocated and laid out in FEATURE_NAMES order, the column order
+of the `pipe_red_rf` model used by run_rf_prediction.py.
+"""
+
+import numpy as np
+
+# Column order expected by the reduced RF pipeline (see run_rf_prediction.py)
+FEATURE_NAMES = [
+    "isAmazon",
+    "isFBA",
+    "avg_price_rank_60d",
+    "avg_price_rank_14d",
+    "avg_price_rank_30d",
+    "avg_self_price_30d",
+    "avg_self_price_14d",
+    "price_rank",
+    "avg_self_price_60d",
+    "price_diff",
+]
+
+WINDOWS = (14, 30, 60)
+
+# feature columns fed by each window: (avg_price_rank_Nd, avg_self_price_Nd)
+_WINDOW_COLUMNS = {
+    14: (FEATURE_NAMES.index("avg_price_rank_14d"), FEATURE_NAMES.index("avg_self_price_14d")),
+    30: (FEATURE_NAMES.index("avg_price_rank_30d"), FEATURE_NAMES.index("avg_self_price_30d")),
+    60: (FEATURE_NAMES.index("avg_price_rank_60d"), FEATURE_NAMES.index("avg_self_price_60d")),
+}
+_IS_AMAZON = FEATURE_NAMES.index("isAmazon")
+_IS_FBA = FEATURE_NAMES.index("isFBA")
+_PRICE_RANK = FEATURE_NAMES.index("price_rank")
+_PRICE_DIFF = FEATURE_NAMES.index("price_diff")
+
+
+class RollingFeatures:
+    """
+    Incremental RF features for all sellers of one or many markets.
+
+    Per period and seller:
+      - price_rank: 1 + number of competitors in the same market with a strictly
+        lower price (1 = cheapest, ties share a rank)
+      - price_diff: own price minus the lowest price in the market
+      - avg_self_price_Nd / avg_price_rank_Nd: mean own price / price_rank over
+        the last N periods (over all periods seen while fewer than N)
+      - isAmazon / isFBA: constant seller flags
+    """
+
+    def __init__(self, n_sellers, is_amazon=0, is_fba=1, n_markets=None, resync_every=10_000):
+        """
+        Args:
+            n_sellers: Number of sellers per market
+            is_amazon: Scalar or per-seller (n_sellers,) flag
+            is_fba: Scalar or per-seller (n_sellers,) flag
+            n_markets: Optional number of independent markets stepped together.
+                None gives arrays of shape (n_sellers, ...), otherwise (n_markets, n_sellers, ...)
+            resync_every: Recompute the running price sums from the ring buffer every
+                this many updates, so floating point drift cannot build up in long runs
+        """
+        self.n_sellers = n_sellers
+        self.n_markets = n_markets
+        self.shape = (n_sellers,) if n_markets is None else (n_markets, n_sellers)
+        self.horizon = max(WINDOWS)
+        self.resync_every = resync_every
+
+        self._prices = np.zeros((self.horizon,) + self.shape)
+        self._ranks = np.zeros((self.horizon,) + self.shape)
+        self._price_sums = {w: np.zeros(self.shape) for w in WINDOWS}
+        self._rank_sums = {w: np.zeros(self.shape) for w in WINDOWS}
+        # scratch for the pairwise price comparison of the rank
+        self._lower = np.empty(self.shape + (n_sellers,), dtype=bool)
+        self._rank = np.empty(self.shape)
+        self._min = np.empty(self.shape[:-1] + (1,))
+
+        self.features = np.zeros(self.shape + (len(FEATURE_NAMES),))
+        self.features[..., _IS_AMAZON] = is_amazon
+        self.features[..., _IS_FBA] = is_fba
+        self.reset()
+
+    def reset(self):
+        """Forget the price history; the seller flags are kept."""
+        self.count = 0
+        self._head = 0
+        for w in WINDOWS:
+            self._price_sums[w].fill(0.0)
+            self._rank_sums[w].fill(0.0)
+        self.features[..., 2:] = 0.0
+
+    def update(self, prices):
+        """
+        Push one period of prices and refresh the feature matrix.
+
+        Args:
+            prices: Prices of all sellers, shape (n_sellers,) or (n_markets, n_sellers)
+
+        Returns:
+            features: The preallocated feature matrix, shape (..., n_sellers, 10),
+                columns in FEATURE_NAMES order. It is overwritten by the next update.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        feats = self.features
+
+        # rank and distance to the cheapest competitor in the market
+        np.less(prices[..., None, :], prices[..., :, None], out=self._lower)
+        np.sum(self._lower, axis=-1, out=self._rank)
+        self._rank += 1.0
+        np.min(prices, axis=-1, keepdims=True, out=self._min)
+        feats[..., _PRICE_RANK] = self._rank
+        np.subtract(prices, self._min, out=feats[..., _PRICE_DIFF])
+
+        # slide every window by one period: add the new value, drop the one leaving
+        head = self._head
+        for w in WINDOWS:
+            if self.count >= w:
+                old = (head - w) % self.horizon
+                self._price_sums[w] -= self._prices[old]
+                self._rank_sums[w] -= self._ranks[old]
+            self._price_sums[w] += prices
+            self._rank_sums[w] += self._rank
+        self._prices[head] = prices
+        self._ranks[head] = self._rank
+        self._head = (head + 1) % self.horizon
+        self.count += 1
+
+        if self.count % self.resync_every == 0:
+            self._resync()
+
+        for w, (rank_col, price_col) in _WINDOW_COLUMNS.items():
+            n = min(self.count, w)
+            np.divide(self._rank_sums[w], n, out=feats[..., rank_col])
+            np.divide(self._price_sums[w], n, out=feats[..., price_col])
+        return feats
+
+    def state_dict(self):
+        """Ring buffers, running sums and feature matrix, see sequential_pricing_env.checkpoint."""
+        return {
+            "count": self.count,
+            "head": self._head,
+            "prices": self._prices,
+            "ranks": self._ranks,
+            "price_sums": {str(w): self._price_sums[w] for w in WINDOWS},
+            "rank_sums": {str(w): self._rank_sums[w] for w in WINDOWS},
+            "features": self.features,
+        }
+
+    def load_state_dict(self, state):
+        """Restore a state_dict() of features with the same shape; values are copied into place."""
+        self.count = state["count"]
+        self._head = state["head"]
+        self._prices[...] = state["prices"]
+        self._ranks[...] = state["ranks"]
+        for w in WINDOWS:
+            self._price_sums[w][...] = state["price_sums"][str(w)]
+            self._rank_sums[w][...] = state["rank_sums"][str(w)]
+        self.features[...] = state["features"]
+
+    def _resync(self):
+        for w in WINDOWS:
+            n = min(self.count, w)
+            last = (self._head - 1 - np.arange(n)) % self.horizon
+            self._price_sums[w][...] = self._prices[last].sum(axis=0)
+            self._rank_sums[w][...] = self._ranks[last].sum(axis=0)
@@ -0,0 +1,257 @@
+"""
+Batched training engine for the Klein (2021) sequential pricing game.
+
+`train_sessions` trains K independent pairs of KleinQLearningAgent at once.
+The Q-tables of all sessions are stacked into arrays of shape
+(K, n_prices, n_prices), indexed [session, rival price, own price], and every
+period is a handful of NumPy operations over the session axis: the moving
+firm's ε-greedy choice, the profits from the env's payoff table and the
+two-period update of the firm that moved in the previous period. Exploration
+coins and random prices are drawn in blocks, in period order, so results do not
+depend on the block size.
+
+Once training ends the greedy policies are deterministic, so the long-run
+outcome of greedy play needs no simulation. Firm 0's reply to firm 1's price
+followed by firm 1's reply defines a map f(p1) = g1(g0(p1)) on the price
+grid; iterating it n_prices times lands every session on its limit cycle,
+which `greedy_limit` then walks once. A cycle of a single round is a constant
+(focal) price, longer ones are Edgeworth cycles.
+
+With a `checkpoint`, training is saved at block boundaries and resumed from
+the last save; a finished checkpoint returns its trained Q-tables without
+training, so the greedy evaluation of trained sessions can be rerun at will.
+
+Example, the paper's Figure 1 grid:
+    env = SequentialPricingEnv(n_prices=7)
+    for T in (50_000, 100_000, 500_000):
+        res = simulate_klein(env, T, sessions=1000, seed=T)
+        print(T, res["profitability"].mean())
+"""
+
+import numpy as np
+
+from .agents.klein import EPSILON_TARGET, HALF_LIFE, KleinQLearningAgent, klein_theta
+from .equilibrium import grid_collusive
+
+
+def klein_epsilon_schedule(periods, theta, start=0):
+    """
+    Exploration probabilities ε_t = (1 - θ)^t for t = start … periods-1.
+
+    Klein's parameterization by θ; rng.epsilon_schedule is the exp(-t * ω) schedule
+    of the other agents.
+    """
+    return (1.0 - theta) ** np.arange(start, periods, dtype=np.float64)
+
+
+def train_sessions(payoff, periods, sessions, alpha=0.30, delta=0.95, seed=None,
+                   epsilon_target=EPSILON_TARGET, half_life=HALF_LIFE, block=4096,
+                   monitor=None, checkpoint=None):
+    """
+    Train `sessions` independent Klein agent pairs on a two-firm payoff table.
+
+    Firm 0 moves in even periods and firm 1 in odd ones. Greedy choices take the
+    first maximizer on ties; Q-values are continuous, so ties practically never
+    occur.
+
+    Args:
+        payoff: Payoff table of shape (n_prices, n_prices, 2), see env.payoff_table()
+        periods: Number of periods T; ε is calibrated on it, see klein_theta()
+        sessions: Number of independent sessions K
+        alpha, delta: Learning rate and discount factor of all agents
+        seed: Seed of the engine's Generator
+        epsilon_target, half_life: ε reaches epsilon_target after half_life * T periods
+        block: Number of periods whose random draws are made at once; only a speed
+            knob, the draws come in period order and results do not depend on it
+        monitor: Optional ConvergenceMonitor. It sees the stacked Q-tables of all
+            sessions, so training stops once no greedy choice changed in any session,
+            and by default not while ε is above the monitor's eps_tol.
+        checkpoint: Optional Checkpointer (see sequential_pricing_env.checkpoint). An
+            existing checkpoint is resumed, `seed` is then ignored. Saves happen at the
+            first block boundary after every checkpoint.every periods and at the end.
+            ε is calibrated on `periods`, so resuming with another `periods` changes
+            the schedule of the remaining periods.
+
+    Returns:
+        result: dict with the final Q-tables "Q0", "Q1" of shape (K, n_prices, n_prices),
+            the final price indices "state" of shape (K, 2) and "periods_run"
+    """
+    payoff = np.ascontiguousarray(payoff, dtype=np.float64)
+    n = payoff.shape[0]
+    K = int(sessions)
+    rng = np.random.default_rng(seed)
+    theta = klein_theta(periods, epsilon_target, half_life)
+    rows = np.arange(K)
+    disc2 = delta * delta
+    check_every = monitor.check_every if monitor is not None else None
+    if monitor is not None:
+        monitor.reset(omega=-np.log1p(-theta))  # ε_t = (1 - θ)^t = exp(-t ω)
+
+    if checkpoint is not None and checkpoint.exists:
+        saved = checkpoint.load()
+        if saved["Q"].shape != (2, K, n, n):
+            raise ValueError(f"'{checkpoint.path}' holds {saved['Q'].shape[1]} sessions on "
+                             f"{saved['Q'].shape[2]} prices, not {K} on {n}")
+        Q = saved["Q"]
+        state = np.array(saved["state"])
+        last_state, last_action = np.array(saved["last_state"]), np.array(saved["last_action"])
+        last_profit = np.array(saved["last_profit"])
+        t = saved["t"]
+        rng.bit_generator.state = saved["rng"]
+        if monitor is not None and saved["monitor"] is not None:
+            monitor.load_state_dict(saved["monitor"])
+            if monitor.stopped_at is not None:
+                periods = t
+    else:
+        Q = rng.uniform(0.0, 1.0, size=(2, K, n, n))
+        state = rng.integers(n, size=(K, 2))
+        last_state = np.zeros((2, K), dtype=np.int64)   # rival price when the firm last moved
+        last_action = np.zeros((2, K), dtype=np.int64)  # price it set then
+        last_profit = np.zeros((2, K))                  # profit in the period it moved
+        t = 0
+
+    while t < periods:
+        stop = min(t + block, periods)
+        eps = klein_epsilon_schedule(stop, theta, start=t)
+        # an exploration coin and a random price per period and session, drawn in period
+        # order from one stream of doubles, so the draws of a period do not depend on `block`
+        u = rng.random((stop - t, K, 2))
+        explore = u[:, :, 0] < eps[:, None]
+        random_price = (u[:, :, 1] * n).astype(np.int64)
+        for b in range(stop - t):
+            i = t & 1
+            j = 1 - i
+            s = state[:, j]
+            a = Q[i][rows, s].argmax(axis=1)
+            if eps[b] > 0:
+                a = np.where(explore[b], random_price[b], a)
+            state[:, i] = a
+            profit = payoff[state[:, 0], state[:, 1]]
+
+            if t > 0:
+                # firm j's price from period t-1 has now met firm i's response `a`
+                Qj = Q[j]
+                target = last_profit[j] + delta * profit[:, j] + disc2 * Qj[rows, a].max(axis=1)
+                sj, aj = last_state[j], last_action[j]
+                Qj[rows, sj, aj] = (1 - alpha) * Qj[rows, sj, aj] + alpha * target
+            last_state[i] = s
+            last_action[i] = a
+            last_profit[i] = profit[:, i]
+            t += 1
+            if monitor is not None and t % check_every == 0 and monitor.update(t, Q[0], Q[1]):
+                periods = t
+                break
+        if checkpoint is not None and (t >= periods or checkpoint.due(t)):
+            checkpoint.save({
+                "t": t, "Q": Q, "state": state, "last_state": last_state, "last_action": last_action,
+                "last_profit": last_profit, "rng": rng.bit_generator.state,
+                "monitor": None if monitor is None else monitor.state_dict(),
+            }, t, kernel="klein", alpha=alpha, delta=delta, theta=theta)
+
+    return {"Q0": Q[0], "Q1": Q[1], "state": state, "periods_run": t}
+
+
+def greedy_policies(Q0, Q1):
+    """Greedy replies g0[k, p1] of firm 0 and g1[k, p0] of firm 1, shape (K, n_prices)."""
+    return np.argmax(Q0, axis=-1), np.argmax(Q1, axis=-1)
+
+
+def greedy_limit(Q0, Q1, payoff, start=None):
+    """
+    Limit cycle of greedy play for a stack of sessions, without simulating it.
+
+    Play starts with firm 0 replying to firm 1's price `start`.
+
+    Args:
+        Q0, Q1: Q-tables of shape (K, n_prices, n_prices) or (n_prices, n_prices)
+        payoff: Payoff table of shape (n_prices, n_prices, 2)
+        start: Firm 1's price index per session, default 0
+
+    Returns:
+        result: dict with
+            "cycle_length": periods per cycle, 2 * the number of firm-1 prices on it, shape (K,)
+            "cycle": price indices over one cycle, shape (K, 2, max cycle length), padded with -1
+            "profit": average per-period profit of both firms on the cycle, shape (K, 2)
+            "price": average price index of both firms on the cycle, shape (K, 2)
+            "focal": True where both prices are constant in the limit
+    """
+    g0, g1 = greedy_policies(np.asarray(Q0), np.asarray(Q1))
+    g0, g1 = np.atleast_2d(g0), np.atleast_2d(g1)
+    K, n = g0.shape
+    rows = np.arange(K)[:, None]
+    f = g1[rows, g0]  # f[k, p1]: firm 1's price after one round of replies
+    x = np.zeros(K, dtype=np.int64) if start is None else np.broadcast_to(start, (K,)).astype(np.int64)
+    for _ in range(n):
+        x = f[rows[:, 0], x]  # every orbit enters its cycle within n rounds
+
+    # walk the cycle once: round m moves firm 0 to g0[y_m], then firm 1 to y_{m+1}
+    p1 = np.empty((K, n + 1), dtype=np.int64)
+    p1[:, 0] = x
+    for m in range(n):
+        p1[:, m + 1] = f[rows[:, 0], p1[:, m]]
+    rounds = np.argmax(p1[:, 1:] == x[:, None], axis=1) + 1
+    p0 = g0[rows, p1[:, :n]]
+
+    valid = np.repeat(np.arange(n)[None, :] < rounds[:, None], 2, axis=1)  # (K, 2n) periods
+    cycle = np.empty((K, 2, 2 * n), dtype=np.int64)
+    cycle[:, 0, 0::2] = cycle[:, 0, 1::2] = p0
+    cycle[:, 1, 0::2], cycle[:, 1, 1::2] = p1[:, :n], p1[:, 1:]
+    profit = payoff[cycle[:, 0], cycle[:, 1]]  # (K, 2n, 2)
+    mean_price = (cycle * valid[:, None, :]).sum(axis=2)
+    cycle[~valid[:, None, :].repeat(2, axis=1)] = -1
+    length = 2 * rounds
+    return {
+        "cycle_length": length,
+        "cycle": cycle[:, :, :2 * rounds.max()],
+        "profit": (profit * valid[..., None]).sum(axis=1) / length[:, None],
+        "price": mean_price / length[:, None],
+        "focal": rounds == 1,
+    }
+
+
+def profitability(profit, payoff):
+    """
+    Average profit of a session as a share of the per-firm collusive profit.
+
+    Args:
+        profit: Per-firm profits of shape (..., 2), e.g. greedy_limit()["profit"]
+        payoff: Payoff table of shape (n_prices, n_prices, 2)
+    """
+    a_i, a_j = grid_collusive(payoff)
+    return np.asarray(profit).mean(axis=-1) / (payoff[a_i, a_j].sum() / 2)
+
+
+def simulate_klein(env, periods, sessions, alpha=0.30, delta=None, seed=None, **kwargs):
+    """
+    Train `sessions` Klein agent pairs on a SequentialPricingEnv and evaluate greedy play.
+
+    Args:
+        env: Two-firm SequentialPricingEnv
+        periods, sessions, alpha, seed, **kwargs: See train_sessions
+        delta: Discount factor, default env.discount_factor
+
+    Returns:
+        result: train_sessions() output updated with greedy_limit() of the final
+            policies, started from each session's final firm-1 price, and
+            "profitability", see profitability()
+    """
+    payoff = env.payoff_table()
+    delta = env.discount_factor if delta is None else delta
+    result = train_sessions(payoff, periods, sessions, alpha, delta, seed=seed, **kwargs)
+    result.update(greedy_limit(result["Q0"], result["Q1"], payoff, start=result["state"][:, 1]))
+    result["profitability"] = profitability(result["profit"], payoff)
+    return result
+
+
+def session_agents(result, k, alpha=0.30, delta=0.95):
+    """
+    KleinQLearningAgent pair holding the Q-tables of session k, e.g. for
+    step-by-step greedy play with the env.
+    """
+    n = result["Q0"].shape[-1]
+    agents = []
+    for name, Q in (("Agent 0", result["Q0"][k]), ("Agent 1", result["Q1"][k])):
+        agent = KleinQLearningAgent(n, n, alpha=alpha, discount_factor=delta, name=name)
+        agent.Q = np.array(Q)
+        agents.append(agent)
+    return tuple(agents)
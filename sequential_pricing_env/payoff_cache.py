@@ -0,0 +1,122 @@
+"""
+Dense payoff tables for the discrete pricing environments.
+
+Every environment in this project has a finite action grid, so the profit of
+each firm can be tabulated once for all joint actions and `step` reduces to an
+indexed lookup.  Tables are built lazily, kept in memory for the lifetime of
+the process and cached on disk under a key derived from the environment name
+and its parameters, so repeated runs with the same configuration skip the
+build entirely.
+
+The cache directory defaults to ``~/.cache/sequential_pricing_env/payoff`` and
+can be moved with the ``PAYOFF_CACHE_DIR`` environment variable.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+CACHE_DIR = os.environ.get(
+    "PAYOFF_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "sequential_pricing_env", "payoff"),
+)
+
+# Bump when the layout or the numerics of any table builder change.
+CACHE_VERSION = 1
+
+_MEMORY = {}
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return [_jsonable(v) for v in value.tolist()]
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value)
+    return value
+
+
+def payoff_key(name, params):
+    """
+    Stable cache key for a payoff table.
+
+    Args:
+        name: Name of the environment class
+        params: Dict of every parameter the table depends on
+
+    Returns:
+        key: Hex digest identifying the table
+    """
+    blob = json.dumps(
+        {"name": name, "version": CACHE_VERSION, "params": _jsonable(params)},
+        sort_keys=True,
+    )
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def load_or_build(name, params, builder, cache_dir=None):
+    """
+    Return the payoff table for `params`, building and caching it if needed.
+
+    Args:
+        name: Name of the environment class
+        params: Dict of every parameter the table depends on
+        builder: Zero-argument callable returning the table as a NumPy array
+        cache_dir: Directory for the on-disk cache. None uses CACHE_DIR,
+            False keeps the table in memory only.
+
+    Returns:
+        table: Read-only NumPy array
+    """
+    key = payoff_key(name, params)
+    table = _MEMORY.get(key)
+    if table is not None:
+        return table
+
+    if cache_dir is None:
+        cache_dir = CACHE_DIR
+    path = os.path.join(cache_dir, f"{name}-{key}.npy") if cache_dir else None
+
+    if path is not None and os.path.exists(path):
+        try:
+            table = np.load(path)
+        except (OSError, ValueError):
+            table = None  # corrupt or truncated file, rebuild below
+
+    if table is None:
+        table = np.ascontiguousarray(builder(), dtype=np.float64)
+        if path is not None:
+            _atomic_save(path, table)
+
+    table.flags.writeable = False
+    _MEMORY[key] = table
+    return table
+
+
+def _atomic_save(path, table):
+    """Write `table` to `path` so that readers never see a partial file."""
+    directory = os.path.dirname(path)
+    tmp = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npy.tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, table)
+        os.replace(tmp, path)
+    except OSError:
+        # A read-only or full cache directory only costs us the rebuild next time.
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def clear_memory_cache():
+    """Drop the in-process copies of all payoff tables."""
+    _MEMORY.clear()
@@ -0,0 +1,320 @@
+"""
+Opt-in instrumentation of the simulation hot paths.
+
+A Profiler wraps selected methods and functions (env `step`, agent
+`take_action`/`update`, feature updates, Buy Box inference, ...) while it is
+enabled and restores the originals when it is disabled, so code that is not
+being profiled runs exactly as before, with no checks on the hot path.
+
+For every wrapped call it records wall time, inclusive and exclusive of nested
+wrapped calls, and the change in the number of allocated Python memory blocks
+(`sys.getallocatedblocks`). When tracemalloc is tracing, the net number of
+bytes allocated, NumPy buffers included, is recorded as well.
+
+Example:
+    profiler = Profiler()
+    with profiler.enable(default_targets()):
+        simulate_DQNpQr(env, periods, alpha, gamma)
+        with profiler.phase("DataFrame build"):
+            df = pd.DataFrame(...)
+    print(profiler.report())
+    profiler.write_chrome_trace("run.trace.json")   # chrome://tracing, Perfetto
+    profiler.write_collapsed("run.folded")          # flamegraph.pl, speedscope
+
+Module-level functions are patched in their module, so callers that imported
+them with `from rf_interface import predict` before enabling keep calling the
+original. Functions defined in a notebook can be wrapped with `profiler.wrap`.
+"""
+
+import contextlib
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+# methods wrapped on every target class that defines them
+HOT_METHODS = (
+    "step", "reset", "profits", "calculate_profits", "payoff_table",
+    "take_action", "take_actions", "select_action", "act", "update", "observe",
+    "predict", "predict_batch",
+)
+# functions wrapped on target modules
+HOT_FUNCTIONS = ("predict", "predict_batch", "predict_proba_array")
+# env classes living outside the package (env/*.py), found in sys.modules by name
+ENV_CLASS_NAMES = (
+    "LogitDemandPricingEnv", "VectorLogitDemandPricingEnv",
+    "AmazonLogitDemandPricingEnv", "MultiSellerAmazonLogitDemandPricingEnv", "BertrandPricingEnv",
+)
+
+
+def default_targets():
+    """
+    Classes and modules to instrument by default.
+
+    Covers SequentialPricingEnv, the env classes of env/ that have been
+    imported, every agent class, RollingFeatures, and rf_interface with its
+    BuyBoxCache when it is importable.
+    """
+    from . import agents, features
+    from .envs.sequential_pricing_env import SequentialPricingEnv
+
+    targets = [SequentialPricingEnv, features.RollingFeatures]
+    targets += [getattr(agents, name) for name in agents.__all__ if isinstance(getattr(agents, name), type)]
+    dqn = sys.modules.get("sequential_pricing_env.agents.dqn")  # needs torch, only if already loaded
+    if dqn is not None:
+        targets.append(dqn.DQNAgent)
+    for module in list(sys.modules.values()):
+        for name in ENV_CLASS_NAMES:
+            cls = getattr(module, name, None)
+            if isinstance(cls, type) and cls.__module__ == getattr(module, "__name__", None):
+                targets.append(cls)
+    try:
+        import rf_interface
+    except ImportError:
+        pass
+    else:
+        targets += [rf_interface, rf_interface.BuyBoxCache]
+    return targets
+
+
+def _no_blocks():
+    return 0
+
+
+class Profiler:
+    """
+    Call timings, counts and allocations of instrumented functions.
+
+    Attributes:
+        runs: Summaries of the previous runs, one dict per reset()
+        max_events: Cap on stored trace events; statistics keep accumulating past it
+    """
+
+    def __init__(self, max_events=1_000_000, allocations=True):
+        """
+        Args:
+            max_events: Cap on stored trace events
+            allocations: Record allocated-block deltas. sys.getallocatedblocks walks
+                the allocator's arenas, which costs several microseconds per call
+                once large libraries are loaded; switch off for pure timings.
+        """
+        self.max_events = max_events
+        self.allocations = allocations
+        self._blocks = sys.getallocatedblocks if allocations else _no_blocks
+        self.runs = []
+        self._patches = []  # (owner, attribute, original value)
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._origin = time.perf_counter_ns()
+        self._stats = defaultdict(lambda: [0, 0, 0, 0, 0])  # calls, total_ns, self_ns, blocks, bytes
+        self._stacks = defaultdict(float)  # collapsed call path -> exclusive ns
+        self._events = []
+        self.dropped_events = 0
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------ #
+    # switching on and off
+    # ------------------------------------------------------------------ #
+    @property
+    def enabled(self):
+        return bool(self._patches)
+
+    def enable(self, targets=None, methods=HOT_METHODS, functions=HOT_FUNCTIONS):
+        """
+        Instrument the targets until disable().
+
+        Args:
+            targets: Classes and modules, default default_targets()
+            methods: Method names wrapped on classes that define or inherit them
+            functions: Function names wrapped on modules
+
+        Returns:
+            self, usable as a context manager that disables on exit
+        """
+        if self.enabled:
+            raise RuntimeError("profiler is already enabled")
+        seen = set()
+        for target in default_targets() if targets is None else targets:
+            if isinstance(target, type):
+                for name in methods:
+                    owner = next((c for c in target.__mro__ if name in c.__dict__), None)
+                    if owner is None or owner is object or (owner, name) in seen:
+                        continue
+                    seen.add((owner, name))
+                    self._patch_method(owner, name)
+            else:
+                for name in functions:
+                    func = getattr(target, name, None)
+                    if callable(func) and (target, name) not in seen:
+                        seen.add((target, name))
+                        label = f"{target.__name__.rsplit('.', 1)[-1]}.{name}"
+                        self._patches.append((target, name, func))
+                        setattr(target, name, self.wrap(func, label))
+        return self
+
+    def disable(self):
+        """Restore every patched attribute."""
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def reset(self):
+        """Archive the summary of the current run (if any) and start a new one."""
+        if self._stats:
+            self.runs.append(self.summary())
+        self._clear()
+
+    def _patch_method(self, owner, name):
+        raw = owner.__dict__[name]
+        label = f"{owner.__name__}.{name}"
+        if isinstance(raw, staticmethod):
+            wrapped = staticmethod(self.wrap(raw.__func__, label))
+        elif isinstance(raw, classmethod):
+            wrapped = classmethod(self.wrap(raw.__func__, label))
+        elif callable(raw):
+            wrapped = self.wrap(raw, label)
+        else:
+            return
+        self._patches.append((owner, name, raw))
+        setattr(owner, name, wrapped)
+
+    # ------------------------------------------------------------------ #
+    # recording
+    # ------------------------------------------------------------------ #
+    def wrap(self, func, name=None):
+        """Return `func` recording each call under `name` (default its qualified name)."""
+        name = name or getattr(func, "__qualname__", repr(func))
+        enter, leave = self._enter, self._leave
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            frame = enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                leave(frame)
+        return wrapper
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Record a block of code as if it were a call named `name`."""
+        frame = self._enter(name)
+        try:
+            yield
+        finally:
+            self._leave(frame)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, name):
+        stack = self._stack()
+        path = f"{stack[-1][1]};{name}" if stack else name
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        # name, path, start, nested ns, blocks, traced bytes
+        frame = [name, path, time.perf_counter_ns(), 0, self._blocks(), traced]
+        stack.append(frame)
+        return frame
+
+    def _leave(self, frame):
+        end = time.perf_counter_ns()
+        blocks = self._blocks() - frame[4]
+        traced = tracemalloc.get_traced_memory()[0] - frame[5] if tracemalloc.is_tracing() else 0
+        stack = self._stack()
+        stack.pop()
+        duration = end - frame[2]
+        exclusive = duration - frame[3]
+        if stack:
+            stack[-1][3] += duration
+        with self._lock:
+            stats = self._stats[frame[0]]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] += exclusive
+            stats[3] += blocks
+            stats[4] += traced
+            self._stacks[frame[1]] += exclusive
+            if len(self._events) < self.max_events:
+                self._events.append((frame[0], frame[2], duration, threading.get_ident()))
+            else:
+                self.dropped_events += 1
+
+    # ------------------------------------------------------------------ #
+    # output
+    # ------------------------------------------------------------------ #
+    def summary(self):
+        """
+        Per-name statistics of the current run.
+
+        Returns:
+            dict name -> {"calls", "total_s", "self_s", "mean_us", "blocks", "bytes"},
+            with `blocks` and `bytes` the net allocations over all calls
+        """
+        with self._lock:
+            items = list(self._stats.items())
+        return {
+            name: {
+                "calls": calls,
+                "total_s": total / 1e9,
+                "self_s": exclusive / 1e9,
+                "mean_us": total / calls / 1e3,
+                "blocks": blocks,
+                "bytes": nbytes,
+            }
+            for name, (calls, total, exclusive, blocks, nbytes) in items
+        }
+
+    def report(self, sort="self_s", limit=None):
+        """Text table of summary(), most expensive first."""
+        rows = sorted(self.summary().items(), key=lambda item: item[1][sort], reverse=True)[:limit]
+        width = max([len(name) for name, _ in rows] + [4])
+        lines = [f"{'name':<{width}} {'calls':>10} {'total s':>10} {'self s':>10} "
+                 f"{'mean us':>10} {'blocks':>10} {'bytes':>12}"]
+        for name, s in rows:
+            lines.append(f"{name:<{width}} {s['calls']:>10d} {s['total_s']:>10.4f} {s['self_s']:>10.4f} "
+                         f"{s['mean_us']:>10.2f} {s['blocks']:>10d} {s['bytes']:>12d}")
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path):
+        """
+        Write the recorded calls in the Chrome trace event format.
+
+        Opens in chrome://tracing, Perfetto and speedscope.
+        """
+        with self._lock:
+            events = list(self._events)
+        trace = [
+            {"name": name, "ph": "X", "ts": (start - self._origin) / 1e3, "dur": duration / 1e3,
+             "pid": 0, "tid": tid, "cat": name.split(".", 1)[0]}
+            for name, start, duration, tid in events
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms",
+                       "otherData": {"dropped_events": self.dropped_events}}, f)
+
+    def write_collapsed(self, path):
+        """
+        Write exclusive time per call path as collapsed stacks, in microseconds.
+
+        One "outer;inner;leaf <us>" line per path, the input format of
+        flamegraph.pl, inferno and speedscope.
+        """
+        with self._lock:
+            stacks = dict(self._stacks)
+        with open(path, "w") as f:
+            for stack, ns in sorted(stacks.items()):
+                f.write(f"{stack} {int(round(ns / 1e3))}\n")
@@ -0,0 +1,141 @@
+"""
+Reproducible random streams for parallel simulation runs.
+
+Every (run, role) pair, e.g. (3, "agent0") or (3, "env"), gets its own
+np.random.Generator derived from one root seed:
+
+    SeedSequence(root_seed, spawn_key=(run, crc32(role)))  ->  Philox
+
+Philox is a counter-based generator, so streams are cheap to create,
+statistically independent and identical no matter which worker process
+builds them or in which order. A sweep therefore gives the same results
+with 1 or 64 workers, which NumPy's global state shared by forked workers
+does not.
+
+ExplorationStream pre-draws exploration coins and random actions in large
+blocks and evaluates the ε schedule exp(-t * ω) block-wise, so an agent's
+per-step exploration decision is two list lookups instead of two calls into
+the global RandomState and one np.exp.
+"""
+
+import zlib
+
+import numpy as np
+
+OMEGA = 1.5e-5  # ε decay rate of the agents, ε_t = exp(-t * ω)
+ROLES = ("agent0", "agent1", "env")
+
+
+def epsilon_schedule(periods, omega=OMEGA, start=0):
+    """
+    Exploration probabilities ε_t = exp(-t * ω) for t = start … periods-1.
+
+    Evaluated with NumPy so the values match the agents' per-step np.exp bit for bit.
+    """
+    return np.exp(-np.arange(start, periods) * omega)
+
+
+def epsilon_horizon(eps, omega=OMEGA):
+    """First period t at which ε_t = exp(-t * ω) has fallen below `eps`."""
+    return int(np.floor(np.log(1.0 / eps) / omega)) + 1
+
+
+def _seed_sequence(root_seed, run, role):
+    return np.random.SeedSequence(root_seed, spawn_key=(int(run), zlib.crc32(role.encode())))
+
+
+def stream(root_seed, run, role):
+    """Generator of one (run, role) pair."""
+    return np.random.Generator(np.random.Philox(_seed_sequence(root_seed, run, role)))
+
+
+def run_streams(root_seed, run, roles=ROLES):
+    """
+    Generators of all roles of one run.
+
+    Args:
+        root_seed: Seed of the whole experiment
+        run: Run index
+        roles: Role names; any string works, the default covers two agents and the env
+
+    Returns:
+        streams: dict role -> np.random.Generator
+    """
+    return {role: stream(root_seed, run, role) for role in roles}
+
+
+def run_seed(root_seed, run, role="run"):
+    """
+    Integer seed of one (run, role) pair, for APIs that take a seed rather than
+    a Generator: env.reset(seed=...), simulate_*(seed=...), np.random.seed(...)
+    in a worker running legacy code.
+    """
+    return int(_seed_sequence(root_seed, run, role).generate_state(1)[0])
+
+
+class ExplorationStream:
+    """
+    Block-drawn ε-greedy exploration decisions of one agent.
+
+    Example:
+        explore = ExplorationStream(rng, n_actions)
+        action = explore.draw(t)
+        if action is None:
+            action = greedy action
+    """
+
+    def __init__(self, rng, n_actions, omega=OMEGA, block=65_536):
+        """
+        Args:
+            rng: np.random.Generator of the agent, see run_streams()
+            n_actions: Number of actions random exploration picks from
+            omega: ε decay rate
+            block: Number of draws and schedule values computed at once
+        """
+        self.rng = rng
+        self.n_actions = n_actions
+        self.omega = omega
+        self.block = block
+        self._coins = self._actions = ()
+        self._k = 0
+        self._eps = []
+        self._eps_start = 0
+
+    def draw(self, t):
+        """
+        Exploration decision at period t.
+
+        Consumes one coin and one random action per call, whether or not the
+        agent explores, so the stream position only depends on the number of calls.
+
+        Returns:
+            action: Random action when exploring, None when the agent should play greedily
+        """
+        k = self._k
+        if k == len(self._coins):
+            self._coins = self.rng.random(self.block).tolist()
+            self._actions = self.rng.integers(self.n_actions, size=self.block).tolist()
+            k = 0
+        self._k = k + 1
+        offset = t - self._eps_start
+        if not 0 <= offset < len(self._eps):
+            self._eps = epsilon_schedule(t + self.block, self.omega, start=t).tolist()
+            self._eps_start, offset = t, 0
+        if self._coins[k] < self._eps[offset]:
+            return self._actions[k]
+        return None
+
+    def state_dict(self):
+        """Generator state and the unused part of the current block, see sequential_pricing_env.checkpoint."""
+        return {
+            "rng": self.rng.bit_generator.state,
+            "coins": np.array(self._coins[self._k:], dtype=np.float64),
+            "actions": np.array(self._actions[self._k:], dtype=np.int64),
+        }
+
+    def load_state_dict(self, state):
+        self.rng.bit_generator.state = state["rng"]
+        self._coins = np.asarray(state["coins"]).tolist()
+        self._actions = np.asarray(state["actions"]).tolist()
+        self._k = 0
+        self._eps = []  # recomputed on the next draw, bit for bit the same values
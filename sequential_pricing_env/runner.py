@@ -0,0 +1,217 @@
+"""
+Multi-process experiment runner for parameter sweeps.
+
+A sweep is a list of configs (dicts with at least `alpha` and `gamma`, usually
+also `grid_size` and `cost`) times a number of runs per config. Every
+(config, run) pair is one task. Workers write their histories straight into
+`.npy` files opened as memory maps, so nothing is pickled back to the parent
+and nothing is stacked afterwards. A per-task `done` flag in the same output
+directory makes an interrupted sweep resumable: calling `run_sweep` again with
+the same arguments only runs the tasks that have not finished.
+
+Layout of `out_dir`:
+    meta.json       configs, runs, periods, series names and seed of the sweep
+    <series>.npy    one array of shape (n_configs, runs, periods) per series
+    done.npy        uint8 flag per task, shape (n_configs, runs)
+
+Expensive per-process state, such as the Buy Box random forest, is built once
+per worker by an `initializer` and read back inside the simulation with
+`worker_context()`.
+"""
+
+import itertools
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+SERIES = ("price", "action", "profit")
+
+_WORKER = {}  # per-process context filled by the initializer
+
+
+def config_grid(alpha=(0.1,), gamma=(0.9,), grid_size=(25,), cost=(2.0,), **extra):
+    """
+    Cartesian product of sweep parameters.
+
+    Args:
+        alpha, gamma, grid_size, cost: Iterables of values to sweep
+        **extra: Further iterables, added to every config under their keyword
+
+    Returns:
+        configs: List of dicts, last parameter varying fastest
+    """
+    axes = dict(alpha=alpha, gamma=gamma, grid_size=grid_size, cost=cost, **extra)
+    keys = list(axes)
+    return [dict(zip(keys, values)) for values in itertools.product(*(axes[k] for k in keys))]
+
+
+def worker_context():
+    """
+    State built by the sweep initializer in the current process.
+
+    Inside a task this is the dict returned by `initializer(*initargs)`, e.g.
+    `worker_context()["pipeline"]` with `initializer=load_rf_pipeline`.
+    """
+    return _WORKER
+
+
+def load_rf_pipeline(path=None):
+    """
+    Sweep initializer loading the Buy Box RF pipeline once per worker.
+
+    A directory written by rf_interface.export_compact() is memory-mapped
+    instead of unpickled, so workers start quickly and share its pages.
+    """
+    from rf_interface import PIPELINE_PATH, load_pipeline
+
+    return {"pipeline": load_pipeline(path or PIPELINE_PATH, verbose=False)}
+
+
+def _init_worker(initializer, initargs):
+    _WORKER.clear()
+    if initializer is not None:
+        _WORKER.update(initializer(*initargs) or {})
+
+
+def run_sweep(simfunc, make_env, configs, runs, periods, out_dir, series=SERIES, seed=0,
+              n_jobs=None, initializer=None, initargs=(), resume=True):
+    """
+    Run every (config, run) task and store the histories under `out_dir`.
+
+    Args:
+        simfunc: Simulation function called as simfunc(env, periods, alpha, gamma, seed=seed)
+            (without `seed` when seed is None), returning one 1D array of length
+            `periods` per entry of `series`. Must be picklable, i.e. defined at module level.
+        make_env: Picklable factory building the env of a config, make_env(config).
+            Each worker builds the env of a config once and reuses it for all its runs.
+        configs: List of config dicts, e.g. from config_grid()
+        runs: Number of runs per config
+        periods: Number of periods per run
+        out_dir: Output directory, created if needed
+        series: Names of the arrays returned by `simfunc`
+        seed: Root seed; task seeds are derived from it so that results do not
+            depend on n_jobs or on how often the sweep was resumed. None leaves
+            seeding to `simfunc`.
+        n_jobs: Number of worker processes. None uses os.cpu_count() - 1, 1 runs in-process.
+        initializer, initargs: Per-worker setup, see worker_context()
+        resume: Reuse the finished tasks of an existing sweep in `out_dir`.
+            False starts over.
+
+    Returns:
+        results: Dict as returned by open_sweep(out_dir)
+    """
+    configs = [dict(c) for c in configs]
+    meta = {
+        "configs": configs,
+        "runs": int(runs),
+        "periods": int(periods),
+        "series": list(series),
+        "seed": seed,
+        "simfunc": f"{simfunc.__module__}.{simfunc.__qualname__}",
+    }
+    _prepare(out_dir, meta, resume)
+
+    done = np.load(os.path.join(out_dir, "done.npy"), mmap_mode="r")
+    pending = [(c, r) for c in range(len(configs)) for r in range(runs) if not done[c, r]]
+    del done
+    if not pending:
+        return open_sweep(out_dir)
+
+    task_seeds = None
+    if seed is not None:
+        task_seeds = np.random.SeedSequence(seed).generate_state(len(configs) * runs)
+    tasks = [
+        (out_dir, c, r, configs[c], periods,
+         None if task_seeds is None else int(task_seeds[c * runs + r]), simfunc, make_env)
+        for c, r in pending
+    ]
+
+    if n_jobs is None:
+        n_jobs = max(1, (os.cpu_count() or 2) - 1)
+    if n_jobs == 1:
+        _init_worker(initializer, initargs)
+        for task in tasks:
+            _run_task(*task)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(initializer, initargs)) as pool:
+            futures = [pool.submit(_run_task, *task) for task in tasks]
+            for future in as_completed(futures):
+                future.result()  # re-raise worker errors; finished tasks stay marked done
+    return open_sweep(out_dir)
+
+
+def open_sweep(out_dir, mode="r"):
+    """
+    Open the results of a sweep without loading them into memory.
+
+    Args:
+        out_dir: Directory written by run_sweep
+        mode: Memory-map mode, "r" for read-only or "r+" to modify in place
+
+    Returns:
+        results: Dict with "meta", "done" (n_configs, runs) and one memory-mapped
+            array of shape (n_configs, runs, periods) per series
+    """
+    with open(os.path.join(out_dir, "meta.json")) as f:
+        meta = json.load(f)
+    results = {"meta": meta, "done": np.load(os.path.join(out_dir, "done.npy"), mmap_mode=mode)}
+    for name in meta["series"]:
+        results[name] = np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode=mode)
+    return results
+
+
+def _prepare(out_dir, meta, resume):
+    """Create the result files, or check that the existing ones belong to the same sweep."""
+    meta_path = os.path.join(out_dir, "meta.json")
+    if resume and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            existing = json.load(f)
+        if existing != json.loads(json.dumps(meta)):
+            raise ValueError(f"'{out_dir}' holds a different sweep; pass resume=False to overwrite it")
+        return
+
+    os.makedirs(out_dir, exist_ok=True)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    shape = (len(meta["configs"]), meta["runs"])
+    for name in meta["series"]:
+        np.lib.format.open_memmap(os.path.join(out_dir, f"{name}.npy"), mode="w+",
+                                  dtype=np.float64, shape=shape + (meta["periods"],)).flush()
+    np.lib.format.open_memmap(os.path.join(out_dir, "done.npy"), mode="w+",
+                              dtype=np.uint8, shape=shape).flush()
+    # meta.json goes last: its presence means the result files are complete
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix=".json.tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, meta_path)
+
+
+def _worker_env(config, make_env):
+    envs = _WORKER.setdefault("_envs", {})
+    key = json.dumps(config, sort_keys=True, default=str)
+    if key not in envs:
+        envs[key] = make_env(config)
+    return envs[key]
+
+
+def _run_task(out_dir, c, r, config, periods, seed, simfunc, make_env):
+    env = _worker_env(config, make_env)
+    if seed is None:
+        histories = simfunc(env, periods, config["alpha"], config["gamma"])
+    else:
+        histories = simfunc(env, periods, config["alpha"], config["gamma"], seed=seed)
+
+    results = open_sweep(out_dir, mode="r+")
+    if len(histories) != len(results["meta"]["series"]):
+        raise ValueError(f"simfunc returned {len(histories)} series, expected {results['meta']['series']}")
+    for name, hist in zip(results["meta"]["series"], histories):
+        results[name][c, r] = hist
+        results[name].flush()
+    # the flag is set only after the data hit the file, so a crash re-runs the task
+    results["done"][c, r] = 1
+    results["done"].flush()
+    return c, r
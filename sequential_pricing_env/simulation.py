@@ -0,0 +1,667 @@
+"""
+Compiled simulation drivers for the Q-learning repricing experiments.
+
+`simulate_QrQr` (rule agent vs. rule agent), `simulate_QpQr` (price agent
+vs. rule agent) and `simulate_QpQp` (price agent vs. price agent) run a whole
+episode of agent/env interaction inside a single JIT-compiled loop over the
+environment's payoff table. The kernels consume random numbers in exactly the
+same order as the Python agents in sequential_pricing_env.agents, so for a
+given seed the compiled and the reference (`compiled=False`) runs produce
+identical trajectories.
+
+Numba is optional. Without it the kernels run as plain Python, which is still
+correct but no faster than the reference loop.
+
+Compiled runs take a `checkpoint` (see sequential_pricing_env.checkpoint): the
+Q-tables, agent state, kernel random state, histories and monitor are saved
+every `checkpoint.every` periods and at the end, and a run started on an
+existing checkpoint continues from it, bit for bit as if never interrupted.
+Resuming with a larger `periods` extends a finished run; resuming a branch()
+with other alpha/gamma continues a trained prefix under new parameters.
+"""
+
+import os
+
+import numpy as np
+
+from .agents.q_learning import (
+    N_RULES,
+    QLearningAgent,
+    QLearningRuleAgent,
+    joint_to_index,
+)
+from .checkpoint import (
+    Checkpointer,
+    history_segments,
+    numba_rng_state,
+    restore_history,
+    rng_state,
+    set_numba_rng_state,
+    set_rng_state,
+)
+from .convergence import greedy_cycle
+from .rng import OMEGA, epsilon_schedule
+
+try:
+    from numba import config as _numba_config
+    from numba import njit
+    _NUMBA_RNG = not _numba_config.DISABLE_JIT  # compiled kernels draw from numba's own state
+except ImportError:  # pragma: no cover - numba is an optional speed-up
+    _NUMBA_RNG = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+# ---------------------------------------------------------------------- #
+# kernels
+# ---------------------------------------------------------------------- #
+@njit(cache=True)
+def _seed(seed):
+    np.random.seed(seed)
+
+
+@njit(cache=True)
+def _uniform_table(n_rows, n_cols, low, high):
+    return np.random.uniform(low, high, (n_rows, n_cols))
+
+
+@njit(cache=True)
+def _random_start(n_prices):
+    # same draws as LogitDemandPricingEnv.reset
+    obs0 = np.random.randint(n_prices)
+    obs1 = np.random.randint(n_prices)
+    return obs0, obs1
+
+
+@njit(cache=True)
+def _argmax(row):
+    best = 0
+    for k in range(1, row.shape[0]):
+        if row[k] > row[best]:
+            best = k
+    return best
+
+
+@njit(cache=True)
+def _row_max(row):
+    best = row[0]
+    for k in range(1, row.shape[0]):
+        if row[k] > best:
+            best = row[k]
+    return best
+
+
+@njit(cache=True)
+def _apply_rule(rule, rival_idx, own_idx, n_prices):
+    if rule == 0:
+        return rival_idx
+    elif rule == 1:
+        return min(rival_idx + 1, n_prices - 1)
+    elif rule == 2:
+        return max(rival_idx - 1, 0)
+    return own_idx
+
+
+@njit(cache=True)
+def _choose_rule(Q, s, eps_t):
+    if np.random.rand() < eps_t:
+        return np.random.randint(Q.shape[1])
+    return _argmax(Q[s])
+
+
+@njit(cache=True)
+def _td_update(Q, s, a, reward, next_s, alpha, gamma):
+    best_next = _row_max(Q[next_s])
+    td_target = reward + gamma * best_next
+    Q[s, a] += alpha * (td_target - Q[s, a])
+
+
+@njit(cache=True)
+def _run_rule_rule(payoff, prices, Q0, Q1, state, eps, alpha, gamma, rule_timer_thr,
+                   start, stop, price_hist, action_hist, profit_hist):
+    """
+    Periods [start, stop) of a QLearningRuleAgent vs. QLearningRuleAgent run.
+
+    state = [obs0, obs1, rule0, rule1, timer0, timer1] is updated in place, so
+    a run can be continued by calling the kernel again with the next range.
+    """
+    n_prices = prices.shape[0]
+    obs0, obs1 = state[0], state[1]
+    rule0, rule1 = state[2], state[3]
+    timer0, timer1 = state[4], state[5]
+    for t in range(start, stop):
+        s = obs0 * n_prices + obs1
+        # agent 0 picks a rule (or sticks with the current one) and applies it
+        if timer0 >= rule_timer_thr:
+            rule0 = _choose_rule(Q0, s, eps[t])
+            timer0 = 0
+        a0 = _apply_rule(rule0, obs1, obs0, n_prices)
+        timer0 += 1
+        # agent 1
+        if timer1 >= rule_timer_thr:
+            rule1 = _choose_rule(Q1, s, eps[t])
+            timer1 = 0
+        a1 = _apply_rule(rule1, obs0, obs1, n_prices)
+        timer1 += 1
+
+        r0 = payoff[a0, a1, 0]
+        r1 = payoff[a0, a1, 1]
+        next_s = a0 * n_prices + a1
+        _td_update(Q0, s, rule0, r0, next_s, alpha, gamma)
+        _td_update(Q1, s, rule1, r1, next_s, alpha, gamma)
+
+        price_hist[0, t] = prices[a0]
+        price_hist[1, t] = prices[a1]
+        action_hist[0, t] = rule0
+        action_hist[1, t] = rule1
+        profit_hist[0, t] = r0
+        profit_hist[1, t] = r1
+        obs0, obs1 = a0, a1
+
+    state[0], state[1] = obs0, obs1
+    state[2], state[3] = rule0, rule1
+    state[4], state[5] = timer0, timer1
+
+
+@njit(cache=True)
+def _run_price_rule(payoff, prices, Q0, Q1, state, eps, alpha, gamma, rule_timer_thr,
+                    start, stop, price_hist, action_hist, profit_hist):
+    """
+    Periods [start, stop) of a QLearningAgent vs. QLearningRuleAgent run.
+
+    state = [obs0, obs1, unused, rule1, unused, timer1] is updated in place.
+    As in the notebooks, the rule agent reacts to the price agent's current action.
+    """
+    n_prices = prices.shape[0]
+    obs0, obs1 = state[0], state[1]
+    rule1, timer1 = state[3], state[5]
+    for t in range(start, stop):
+        s = obs0 * n_prices + obs1
+        # price agent: ε-greedy over price indices
+        if np.random.rand() < eps[t]:
+            a0 = np.random.randint(n_prices)
+        else:
+            a0 = _argmax(Q0[s])
+        # rule agent
+        if timer1 >= rule_timer_thr:
+            rule1 = _choose_rule(Q1, s, eps[t])
+            timer1 = 0
+        a1 = _apply_rule(rule1, a0, obs1, n_prices)
+        timer1 += 1
+
+        r0 = payoff[a0, a1, 0]
+        r1 = payoff[a0, a1, 1]
+        next_s = a0 * n_prices + a1
+        _td_update(Q0, s, a0, r0, next_s, alpha, gamma)
+        _td_update(Q1, s, rule1, r1, next_s, alpha, gamma)
+
+        price_hist[0, t] = prices[a0]
+        price_hist[1, t] = prices[a1]
+        action_hist[0, t] = a0
+        action_hist[1, t] = rule1
+        profit_hist[0, t] = r0
+        profit_hist[1, t] = r1
+        obs0, obs1 = a0, a1
+
+    state[0], state[1] = obs0, obs1
+    state[3], state[5] = rule1, timer1
+
+
+@njit(cache=True)
+def _run_price_price(payoff, prices, Q0, Q1, state, eps, alpha, gamma, rule_timer_thr,
+                     start, stop, price_hist, action_hist, profit_hist):
+    """
+    Periods [start, stop) of a QLearningAgent vs. QLearningAgent run.
+
+    state = [obs0, obs1, unused, unused, unused, unused] is updated in place;
+    rule_timer_thr is not used and only keeps the kernel signature.
+    """
+    n_prices = prices.shape[0]
+    obs0, obs1 = state[0], state[1]
+    for t in range(start, stop):
+        s = obs0 * n_prices + obs1
+        # both agents: ε-greedy over price indices
+        if np.random.rand() < eps[t]:
+            a0 = np.random.randint(n_prices)
+        else:
+            a0 = _argmax(Q0[s])
+        if np.random.rand() < eps[t]:
+            a1 = np.random.randint(n_prices)
+        else:
+            a1 = _argmax(Q1[s])
+
+        r0 = payoff[a0, a1, 0]
+        r1 = payoff[a0, a1, 1]
+        next_s = a0 * n_prices + a1
+        _td_update(Q0, s, a0, r0, next_s, alpha, gamma)
+        _td_update(Q1, s, a1, r1, next_s, alpha, gamma)
+
+        price_hist[0, t] = prices[a0]
+        price_hist[1, t] = prices[a1]
+        action_hist[0, t] = a0
+        action_hist[1, t] = a1
+        profit_hist[0, t] = r0
+        profit_hist[1, t] = r1
+        obs0, obs1 = a0, a1
+
+    state[0], state[1] = obs0, obs1
+
+
+# ---------------------------------------------------------------------- #
+# drivers
+# ---------------------------------------------------------------------- #
+def _resolve_seed(seed):
+    if seed is None:
+        seed = np.random.randint(2**31 - 1)
+    return int(seed)
+
+
+_HISTORIES = ("price", "action", "profit")
+
+
+def _kernel_rng_state():
+    return numba_rng_state() if _NUMBA_RNG else rng_state(np.random)
+
+
+def _resume(checkpoint, kernel, prices, periods):
+    """Saved state of a compiled run, with the kernel random state restored; None to start afresh."""
+    if checkpoint is None or not checkpoint.exists:
+        return None
+    if checkpoint.meta.get("kernel") != kernel.__name__:
+        raise ValueError(f"'{checkpoint.path}' holds a {checkpoint.meta.get('kernel')} run, "
+                         f"not {kernel.__name__}")
+    saved = checkpoint.load()
+    if not np.array_equal(saved["prices"], prices):
+        raise ValueError(f"'{checkpoint.path}' was written for another price grid")
+    if saved["t"] > periods:
+        raise ValueError(f"'{checkpoint.path}' is at period {saved['t']}, beyond periods={periods}")
+    if _NUMBA_RNG:
+        set_numba_rng_state(saved["rng"])
+    else:
+        set_rng_state(np.random, saved["rng"])
+    return saved
+
+
+def _drive(kernel, payoff, prices, Q0, Q1, state, periods, omega, alpha, gamma, rule_timer_thr,
+           monitor, checkpoint=None, resumed=None, fill_cycle=False):
+    result = {name: np.zeros((2, periods)) for name in _HISTORIES}
+    eps = epsilon_schedule(periods, omega)
+    if monitor is None and checkpoint is None:
+        kernel(payoff, prices, Q0, Q1, state, eps, alpha, gamma, rule_timer_thr, 0, periods,
+               result["price"], result["action"], result["profit"])
+        result["Q0"], result["Q1"] = Q0, Q1
+        result["periods_run"] = periods
+        return result
+
+    stop, bounds = 0, [0]
+    if resumed is not None:
+        stop = resumed["t"]
+        bounds = restore_history(result, resumed["history"])
+    if monitor is not None:
+        monitor.reset(omega)
+        if resumed is not None and resumed["monitor"] is not None:
+            monitor.load_state_dict(resumed["monitor"])
+    converged = monitor is not None and monitor.stopped_at is not None
+    while stop < periods and not converged:
+        start = stop
+        stop = periods
+        if monitor is not None:
+            stop = min(stop, (start // monitor.check_every + 1) * monitor.check_every)
+        if checkpoint is not None and checkpoint.every is not None:
+            stop = min(stop, max(checkpoint.next_due(), start + 1))
+        kernel(payoff, prices, Q0, Q1, state, eps, alpha, gamma, rule_timer_thr, start, stop,
+               result["price"], result["action"], result["profit"])
+        if monitor is not None and (stop % monitor.check_every == 0 or stop == periods):
+            converged = monitor.update(stop, Q0, Q1)
+        if checkpoint is not None and (converged or stop == periods or checkpoint.due(stop)):
+            bounds.append(stop)
+            checkpoint.save({
+                "t": stop, "Q0": Q0, "Q1": Q1, "state": state, "rng": _kernel_rng_state(),
+                "prices": prices, "history": history_segments(result, _HISTORIES, bounds),
+                "monitor": None if monitor is None else monitor.state_dict(),
+            }, stop, kernel=kernel.__name__, alpha=alpha, gamma=gamma, omega=omega,
+                rule_timer_thr=rule_timer_thr)
+    result["Q0"], result["Q1"] = Q0, Q1
+    result["periods_run"] = stop
+    if monitor is None:
+        return result
+    result["converged_at"] = monitor.converged_at
+
+    # greedy play from the final state: a transient, then the limit cycle forever
+    path, cycle_start = greedy_cycle(kernel, payoff, prices, Q0, Q1, state, rule_timer_thr)
+    result["cycle"] = monitor.cycle = path["price"][:, cycle_start:]
+    if stop < periods and not fill_cycle:
+        for name in _HISTORIES:
+            result[name][:, stop:] = np.nan
+    elif stop < periods:
+        n = periods - stop
+        cycle_len = path["price"].shape[1] - cycle_start
+        reps = -(-max(n - cycle_start, 0) // cycle_len)
+        for name in _HISTORIES:
+            seq = path[name]
+            tail = np.concatenate([seq[:, :cycle_start]] + [seq[:, cycle_start:]] * reps, axis=1)
+            result[name][:, stop:] = tail[:, :n]
+    return result
+
+
+def run_QrQr(payoff, prices, periods, alpha=0.1, gamma=0.9, rule_timer_thr=2, seed=None,
+             omega=OMEGA, init_low=10.0, init_high=20.0, monitor=None, checkpoint=None,
+             fill_cycle=False):
+    """
+    Compiled QLearningRuleAgent vs. QLearningRuleAgent run on a payoff table.
+
+    Args:
+        payoff: Payoff tensor of shape (n_prices, n_prices, 2), see env.payoff_table()
+        prices: Price grid of shape (n_prices,)
+        periods: Number of periods to simulate
+        alpha, gamma: Learning rate and discount factor of both agents
+        rule_timer_thr: Number of periods a chosen rule is kept
+        seed: Seed of the run. None draws one from NumPy's global state
+        omega: ε decay rate
+        init_low, init_high: Range of the uniform Q-table initialisation
+        monitor: Optional ConvergenceMonitor. The run stops once it reports
+            convergence; the periods after "periods_run" are NaN.
+        checkpoint: Optional Checkpointer. An existing checkpoint is resumed, `seed`
+            and the initialisation are then ignored; the run is saved every
+            checkpoint.every periods, at convergence and at the end.
+        fill_cycle: Fill the periods after a stop with greedy play from the final
+            state instead of NaN. This is an extrapolation: real play would still
+            explore now and then and may move to another cycle of the same policies.
+
+    Returns:
+        result: dict with "price", "action" (rule index) and "profit" histories
+            of shape (2, periods), the final Q-tables "Q0", "Q1" and "periods_run",
+            the number of periods actually simulated. With a monitor also
+            "converged_at" (None if the run did not converge) and "cycle", the
+            greedy limit cycle of prices with shape (2, cycle_length).
+    """
+    payoff = np.ascontiguousarray(payoff, dtype=np.float64)
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    n_prices = prices.shape[0]
+    resumed = _resume(checkpoint, _run_rule_rule, prices, periods)
+    if resumed is None:
+        _seed(_resolve_seed(seed))
+        Q0 = _uniform_table(n_prices * n_prices, N_RULES, init_low, init_high)
+        Q1 = _uniform_table(n_prices * n_prices, N_RULES, init_low, init_high)
+        obs0, obs1 = _random_start(n_prices)
+        state = np.array([obs0, obs1, 0, 0, rule_timer_thr, rule_timer_thr], dtype=np.int64)
+    else:
+        Q0, Q1, state = resumed["Q0"], resumed["Q1"], np.array(resumed["state"])
+    return _drive(_run_rule_rule, payoff, prices, Q0, Q1, state, periods, omega,
+                  alpha, gamma, rule_timer_thr, monitor, checkpoint, resumed, fill_cycle)
+
+
+def run_QpQr(payoff, prices, periods, alpha=0.1, gamma=0.9, rule_timer_thr=2, seed=None,
+             omega=OMEGA, init_low=10.0, init_high=20.0, monitor=None, checkpoint=None,
+             fill_cycle=False):
+    """
+    Compiled QLearningAgent vs. QLearningRuleAgent run on a payoff table.
+
+    Arguments and return value as in run_QrQr; firm 0's "action" is its price index.
+    """
+    payoff = np.ascontiguousarray(payoff, dtype=np.float64)
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    n_prices = prices.shape[0]
+    resumed = _resume(checkpoint, _run_price_rule, prices, periods)
+    if resumed is None:
+        _seed(_resolve_seed(seed))
+        Q0 = _uniform_table(n_prices * n_prices, n_prices, init_low, init_high)
+        Q1 = _uniform_table(n_prices * n_prices, N_RULES, init_low, init_high)
+        obs0, obs1 = _random_start(n_prices)
+        state = np.array([obs0, obs1, 0, 0, 0, rule_timer_thr], dtype=np.int64)
+    else:
+        Q0, Q1, state = resumed["Q0"], resumed["Q1"], np.array(resumed["state"])
+    return _drive(_run_price_rule, payoff, prices, Q0, Q1, state, periods, omega,
+                  alpha, gamma, rule_timer_thr, monitor, checkpoint, resumed, fill_cycle)
+
+
+def run_QpQp(payoff, prices, periods, alpha=0.1, gamma=0.9, seed=None, omega=OMEGA,
+             init_low=10.0, init_high=20.0, monitor=None, checkpoint=None, fill_cycle=False):
+    """
+    Compiled QLearningAgent vs. QLearningAgent run on a payoff table.
+
+    Arguments and return value as in run_QrQr, without rule_timer_thr; both
+    firms' "action" is their price index.
+    """
+    payoff = np.ascontiguousarray(payoff, dtype=np.float64)
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    n_prices = prices.shape[0]
+    resumed = _resume(checkpoint, _run_price_price, prices, periods)
+    if resumed is None:
+        _seed(_resolve_seed(seed))
+        Q0 = _uniform_table(n_prices * n_prices, n_prices, init_low, init_high)
+        Q1 = _uniform_table(n_prices * n_prices, n_prices, init_low, init_high)
+        obs0, obs1 = _random_start(n_prices)
+        state = np.array([obs0, obs1, 0, 0, 0, 0], dtype=np.int64)
+    else:
+        Q0, Q1, state = resumed["Q0"], resumed["Q1"], np.array(resumed["state"])
+    return _drive(_run_price_price, payoff, prices, Q0, Q1, state, periods, omega,
+                  alpha, gamma, 1, monitor, checkpoint, resumed, fill_cycle)
+
+
+def simulate_QrQr(env, periods, alpha=0.1, gamma=0.9, rule_timer_thr=2, seed=None, compiled=True,
+                  monitor=None, checkpoint=None, fill_cycle=False):
+    """
+    Run a Q-learning-rule vs. Q-learning-rule price competition for `periods` steps.
+
+    Args:
+        env: Two-firm pricing env with .prices, .reset(), .step() and .payoff_table()
+        periods: Number of periods to simulate
+        alpha, gamma: Learning rate and discount factor
+        rule_timer_thr: Number of periods a chosen rule is kept
+        seed: Seed of the run. None draws one from NumPy's global state
+        compiled: Use the compiled kernel (True) or the Python agents and env.step (False)
+        monitor: Optional ConvergenceMonitor, see run_QrQr. Its `report()` holds the
+            convergence period and limit cycle of the run afterwards.
+        checkpoint: Optional Checkpointer the run is saved to and resumed from, see run_QrQr
+        fill_cycle: Fill the periods after an early stop with greedy play, see run_QrQr
+
+    Returns:
+        history1, history_action_1, history_profit_1: Firm 1's prices, rule indices
+            and profits, each of shape (periods,); NaN after an early stop
+    """
+    seed = _resolve_seed(seed)
+    if monitor is not None and not compiled:
+        raise ValueError("early stopping with a monitor needs compiled=True")
+    if checkpoint is not None and not compiled:
+        raise ValueError("checkpointing needs compiled=True")
+    if compiled:
+        res = run_QrQr(env.payoff_table(), env.prices, periods, alpha, gamma, rule_timer_thr, seed,
+                       monitor=monitor, checkpoint=checkpoint, fill_cycle=fill_cycle)
+        return res["price"][1], res["action"][1], res["profit"][1]
+
+    np.random.seed(seed)
+    n_actions = len(env.prices)
+    agent0 = QLearningRuleAgent(n_actions, alpha=alpha, gamma=gamma, prices=env.prices, cost=env.cost,
+                                rule_timer_thr=rule_timer_thr)
+    agent1 = QLearningRuleAgent(n_actions, alpha=alpha, gamma=gamma, prices=env.prices, cost=env.cost,
+                                rule_timer_thr=rule_timer_thr)
+    history1 = np.zeros(periods)
+    history_action_1 = np.zeros(periods)
+    history_profit_1 = np.zeros(periods)
+
+    (obs_0, obs_1), info = env.reset()
+    state = joint_to_index(obs_0, obs_1, n_actions)
+    for t in range(periods):
+        a0 = agent0.take_action(state, rival_pre_price_idx=obs_1, own_pre_price_idx=obs_0)
+        a1 = agent1.take_action(state, rival_pre_price_idx=obs_0, own_pre_price_idx=obs_1)
+        (next_obs_0, next_obs_1), (r0, r1), term, trunc, info = env.step((a0, a1))
+        next_state = joint_to_index(next_obs_0, next_obs_1, n_actions)
+        agent0.update(state, agent0.current_rule, r0, next_state)
+        agent1.update(state, agent1.current_rule, r1, next_state)
+
+        history1[t] = env.prices[a1]
+        history_action_1[t] = agent1.current_rule
+        history_profit_1[t] = r1
+        obs_0, obs_1 = next_obs_0, next_obs_1
+        state = next_state
+        if term or trunc:
+            break
+
+    return history1, history_action_1, history_profit_1
+
+
+def simulate_QpQr(env, periods, alpha=0.1, gamma=0.9, rule_timer_thr=2, seed=None, compiled=True,
+                  monitor=None, checkpoint=None, fill_cycle=False):
+    """
+    Run a Q-learning (price) vs. Q-learning-rule price competition for `periods` steps.
+
+    Arguments and return value as in simulate_QrQr; firm 1 is the rule agent.
+    """
+    seed = _resolve_seed(seed)
+    if monitor is not None and not compiled:
+        raise ValueError("early stopping with a monitor needs compiled=True")
+    if checkpoint is not None and not compiled:
+        raise ValueError("checkpointing needs compiled=True")
+    if compiled:
+        res = run_QpQr(env.payoff_table(), env.prices, periods, alpha, gamma, rule_timer_thr, seed,
+                       monitor=monitor, checkpoint=checkpoint, fill_cycle=fill_cycle)
+        return res["price"][1], res["action"][1], res["profit"][1]
+
+    np.random.seed(seed)
+    n_actions = len(env.prices)
+    agent0 = QLearningAgent(n_actions=n_actions, alpha=alpha, gamma=gamma, prices=env.prices, cost=env.cost)
+    agent1 = QLearningRuleAgent(n_actions=n_actions, alpha=alpha, gamma=gamma, prices=env.prices,
+                                cost=env.cost, rule_timer_thr=rule_timer_thr)
+    history1 = np.zeros(periods)
+    history_action_1 = np.zeros(periods)
+    history_profit_1 = np.zeros(periods)
+
+    (obs_0, obs_1), info = env.reset()
+    state0 = joint_to_index(obs_0, obs_1, n_actions)
+    state1 = joint_to_index(obs_0, obs_1, n_actions)
+    for t in range(periods):
+        a0 = agent0.take_action(state0)
+        a1 = agent1.take_action(state=state1, rival_pre_price_idx=a0, own_pre_price_idx=obs_1)
+        (next_obs_0, next_obs_1), (r0, r1), terminated, truncated, info = env.step((a0, a1))
+        next_state0 = joint_to_index(next_obs_0, next_obs_1, n_actions)
+        next_state1 = joint_to_index(next_obs_0, next_obs_1, n_actions)
+        agent0.update(state0, a0, r0, next_state0)
+        agent1.update(state1, agent1.current_rule, r1, next_state1)
+
+        history1[t] = env.prices[a1]
+        history_action_1[t] = agent1.current_rule
+        history_profit_1[t] = r1
+        obs_0, obs_1 = next_obs_0, next_obs_1
+        state0, state1 = next_state0, next_state1
+        if terminated or truncated:
+            break
+
+    return history1, history_action_1, history_profit_1
+
+
+def simulate_QpQp(env, periods, alpha=0.1, gamma=0.9, seed=None, compiled=True, monitor=None,
+                  checkpoint=None, fill_cycle=False):
+    """
+    Run a Q-learning vs. Q-learning price competition for `periods` steps.
+
+    Arguments as in simulate_QrQr, without rule_timer_thr. As in Q_Q_simulation.ipynb
+    the histories are firm 0's: prices, price indices and profits, each of shape (periods,).
+    """
+    seed = _resolve_seed(seed)
+    if monitor is not None and not compiled:
+        raise ValueError("early stopping with a monitor needs compiled=True")
+    if checkpoint is not None and not compiled:
+        raise ValueError("checkpointing needs compiled=True")
+    if compiled:
+        res = run_QpQp(env.payoff_table(), env.prices, periods, alpha, gamma, seed,
+                       monitor=monitor, checkpoint=checkpoint, fill_cycle=fill_cycle)
+        return res["price"][0], res["action"][0], res["profit"][0]
+
+    np.random.seed(seed)
+    n_actions = len(env.prices)
+    agent0 = QLearningAgent(n_actions=n_actions, alpha=alpha, gamma=gamma, prices=env.prices, cost=env.cost)
+    agent1 = QLearningAgent(n_actions=n_actions, alpha=alpha, gamma=gamma, prices=env.prices, cost=env.cost)
+    history0 = np.zeros(periods)
+    history_action_0 = np.zeros(periods)
+    history_profit_0 = np.zeros(periods)
+
+    (obs_0, obs_1), info = env.reset()
+    state = joint_to_index(obs_0, obs_1, n_actions)
+    for t in range(periods):
+        a0 = agent0.take_action(state)
+        a1 = agent1.take_action(state)
+        (next_obs_0, next_obs_1), (r0, r1), terminated, truncated, info = env.step((a0, a1))
+        next_state = joint_to_index(next_obs_0, next_obs_1, n_actions)
+        agent0.update(state, a0, r0, next_state)
+        agent1.update(state, a1, r1, next_state)
+
+        history0[t] = env.prices[a0]
+        history_action_0[t] = a0
+        history_profit_0[t] = r0
+        state = next_state
+        if terminated or truncated:
+            break
+
+    return history0, history_action_0, history_profit_0
+
+
+def simulate_batch(periods, runs, alpha, gamma, env, simfunc, seed=None, monitor=None, aggregator=None,
+                   checkpoint_dir=None, checkpoint_every=None):
+    """
+    Run `runs` simulations in batch.
+
+    Args:
+        periods, runs: Length and number of runs
+        alpha, gamma: Learning rate and discount factor
+        env: Pricing env passed to `simfunc`
+        simfunc: One of the simulate_* functions, called as simfunc(env, periods, alpha, gamma)
+        seed: Root seed. When given, run k gets an independent seed derived from it
+            and `simfunc` must accept a `seed` keyword
+        monitor: Optional ConvergenceMonitor passed to `simfunc`; afterwards
+            monitor.reports holds one convergence summary per run. Periods after
+            a run's early stop are NaN in the returned arrays and left out of the
+            aggregator.
+        aggregator: Optional RunAggregator. Each run's histories are folded into it
+            as "price", "action" and "profit" and no (runs, periods) arrays are built.
+            Series without a histogram range of their own start from the bounds of the
+            price grid, the action indices and the payoff table.
+        checkpoint_dir: Optional directory with one checkpoint per run (run<k>), passed
+            to `simfunc` as `checkpoint`. Rerunning the batch resumes interrupted runs
+            and reloads finished ones instead of simulating them again.
+        checkpoint_every: Periods between two saves of a run
+
+    Returns:
+        history1_all, history_action_1_all, history_profit_1_all: arrays of shape (runs, periods),
+            or the aggregator when one is given
+    """
+    run_seeds = None
+    if seed is not None:
+        run_seeds = np.random.SeedSequence(seed).generate_state(runs)
+
+    if aggregator is not None:
+        payoff = env.payoff_table()
+        aggregator.ranges.setdefault("price", (float(env.prices.min()), float(env.prices.max())))
+        aggregator.ranges.setdefault("action", (0.0, float(max(len(env.prices), N_RULES) - 1)))
+        aggregator.ranges.setdefault("profit", (float(payoff.min()), float(payoff.max())))
+    else:
+        history1_all = np.zeros((runs, periods))
+        history_action_1_all = np.zeros((runs, periods))
+        history_profit_1_all = np.zeros((runs, periods))
+    kwargs = {} if monitor is None else {"monitor": monitor}
+    for run in range(runs):
+        if run_seeds is not None:
+            kwargs["seed"] = int(run_seeds[run])
+        if checkpoint_dir is not None:
+            kwargs["checkpoint"] = Checkpointer(os.path.join(checkpoint_dir, f"run{run}"), every=checkpoint_every)
+        h1, ha1, hp1 = simfunc(env, periods, alpha, gamma, **kwargs)
+        if aggregator is not None:
+            if monitor is not None and monitor.stopped_at is not None:
+                n = monitor.stopped_at
+                aggregator.append(run, price=h1[:n], action=ha1[:n], profit=hp1[:n])
+                aggregator.close_run(run)
+            else:
+                aggregator.write(price=h1, action=ha1, profit=hp1)
+            continue
+        history1_all[run] = h1
+        history_action_1_all[run] = ha1
+        history_profit_1_all[run] = hp1
+    if monitor is not None:
+        monitor.reset()  # archive the last run's report
+    if aggregator is not None:
+        return aggregator
+
+    return history1_all, history_action_1_all, history_profit_1_all
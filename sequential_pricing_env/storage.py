@@ -0,0 +1,318 @@
+"""
+Chunked on-disk storage for simulation histories.
+
+A history store is a directory with one sub-directory per series (price,
+action, profit, buy box, ...) and one directory per run within it. Each run is
+cut into fixed-length time chunks, stored as `.npy` files (memory-mappable) or,
+with `compress=True`, as compressed `.npz` files:
+
+    <path>/meta.json
+    <path>/<series>/r<run>/t<chunk>.npy
+
+Writers stream values in while the simulation runs, so a 200k-period history
+never has to sit in memory as one wide table. Readers only touch the chunks
+that overlap the requested runs and time window.
+
+Writing to the path of an existing store replaces it, as the CSV writer did;
+append=True extends it instead, e.g. to resume an interrupted run.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+SERIES = ("price", "action", "profit")
+STORE_VERSION = 1
+
+
+class HistoryWriter:
+    """
+    Stream per-run histories into a chunked store.
+
+    Example:
+        with HistoryWriter("DATA_DIR/qr-qr", chunk_size=50_000) as writer:
+            for t in range(periods):
+                ...
+                writer.append(run, price=p, action=a, profit=r)
+    """
+
+    def __init__(self, path, chunk_size=65_536, compress=False, dtype=np.float64, attrs=None,
+                 append=False):
+        """
+        Args:
+            path: Directory of the store
+            chunk_size: Number of periods per chunk file
+            compress: Write compressed .npz chunks instead of memory-mappable .npy ones
+            dtype: dtype of newly created series
+            attrs: JSON-serializable dict saved with the store, e.g. the run parameters
+            append: Extend an existing store at `path`, e.g. to resume an interrupted
+                run. By default an existing store is replaced, like the CSV writer did.
+        """
+        self.path = path
+        self.compress = compress
+        self.dtype = np.dtype(dtype)
+        self._buffers = {}  # (series, run) -> (buffer, fill)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path) and not append:
+            _remove_store(path)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+            if self.meta["chunk_size"] != chunk_size:
+                raise ValueError(f"'{path}' was written with chunk_size={self.meta['chunk_size']}")
+            self.meta["attrs"].update(attrs or {})
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.meta = {"version": STORE_VERSION, "chunk_size": int(chunk_size),
+                         "series": {}, "attrs": dict(attrs or {})}
+        self.chunk_size = self.meta["chunk_size"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, run, **series):
+        """
+        Append values to the histories of one run.
+
+        Args:
+            run: Run index
+            **series: Scalar or 1D array per series name, e.g. price=p_t or price=prices[t0:t1]
+        """
+        for name, values in series.items():
+            values = np.atleast_1d(values)
+            buffer, fill = self._buffer(name, run)
+            while len(values):
+                n = min(len(values), self.chunk_size - fill)
+                buffer[fill:fill + n] = values[:n]
+                values = values[n:]
+                fill += n
+                if fill == self.chunk_size:
+                    self._write_chunk(name, run, buffer, fill)
+                    fill = 0
+            self._buffers[name, run] = (buffer, fill)
+
+    def write(self, **series):
+        """Append whole (runs, periods) arrays, run i going to run index i."""
+        for name, values in series.items():
+            for run, row in enumerate(np.asarray(values)):
+                self.append(run, **{name: row})
+
+    def flush(self):
+        """Write the partially filled chunks; later appends continue them."""
+        for (name, run), (buffer, fill) in self._buffers.items():
+            if fill:
+                self._write_chunk(name, run, buffer, fill, partial=True)
+        self._save_meta()
+
+    def close(self):
+        self.flush()
+        self._buffers.clear()
+
+    def _buffer(self, name, run):
+        entry = self._buffers.get((name, run))
+        if entry is not None:
+            return entry
+        info = self.meta["series"].setdefault(name, {"dtype": self.dtype.str, "lengths": {}})
+        buffer = np.empty(self.chunk_size, dtype=np.dtype(info["dtype"]))
+        # resume a run whose last chunk was written partially
+        length = info["lengths"].get(str(run), 0)
+        fill = length % self.chunk_size
+        if fill:
+            buffer[:fill] = _load_chunk(self.path, name, run, length // self.chunk_size)[:fill]
+        return buffer, fill
+
+    def _write_chunk(self, name, run, buffer, fill, partial=False):
+        info = self.meta["series"][name]
+        length = info["lengths"].get(str(run), 0)
+        k = length // self.chunk_size
+        run_dir = os.path.join(self.path, name, f"r{run}")
+        os.makedirs(run_dir, exist_ok=True)
+        for ext in (".npy", ".npz"):  # a partial chunk may have been written in the other format
+            stale = os.path.join(run_dir, f"t{k}{ext}")
+            if os.path.exists(stale):
+                os.remove(stale)
+        data = buffer[:fill]
+        if self.compress:
+            np.savez_compressed(os.path.join(run_dir, f"t{k}.npz"), data=data)
+        else:
+            np.save(os.path.join(run_dir, f"t{k}.npy"), data)
+        if not partial:
+            info["lengths"][str(run)] = (k + 1) * self.chunk_size
+            self._save_meta()
+        else:
+            info["lengths"][str(run)] = k * self.chunk_size + fill
+
+    def _save_meta(self):
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".json.tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+
+def _remove_store(path):
+    """Delete the series and metadata of the store at `path`; other files there are kept."""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    for name in meta["series"]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    os.remove(os.path.join(path, "meta.json"))
+
+
+def save_histories(path, chunk_size=65_536, compress=False, attrs=None, append=False, **series):
+    """
+    Write (runs, periods) history arrays to a chunked store in one go.
+
+    Args:
+        path: Directory of the store
+        chunk_size, compress, attrs, append: See HistoryWriter; by default an existing
+            store at `path` is overwritten
+        **series: One (runs, periods) array per series, e.g. price=all0
+
+    Returns:
+        store: HistoryStore opened on `path`
+    """
+    with HistoryWriter(path, chunk_size=chunk_size, compress=compress, attrs=attrs,
+                       append=append) as writer:
+        writer.write(**series)
+    return HistoryStore(path)
+
+
+def save_simulation_results(price_hist, action_hist, profit_hist, file_prefix, data_dir="DATA_DIR",
+                            append=False, **extra):
+    """
+    Chunked-store replacement of the notebooks' CSV writer.
+
+    Unlike the CSV version, the full histories are kept, not only the last 1000 periods.
+
+    Args:
+        price_hist, action_hist, profit_hist: Arrays of shape (runs, periods)
+        file_prefix: Name of the store directory inside `data_dir`
+        data_dir: Directory holding the stores
+        append: Add to an existing store instead of overwriting it, see HistoryWriter
+        **extra: Further (runs, periods) series, e.g. buy_box=bb_hist
+
+    Returns:
+        store: HistoryStore of the saved results
+    """
+    return save_histories(os.path.join(data_dir, file_prefix), price=price_hist,
+                          action=action_hist, profit=profit_hist, append=append, **extra)
+
+
+class HistoryStore:
+    """Read access to a chunked history store."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.chunk_size = self.meta["chunk_size"]
+        self.attrs = self.meta["attrs"]
+
+    @property
+    def series(self):
+        return list(self.meta["series"])
+
+    def __contains__(self, name):
+        return name in self.meta["series"]
+
+    def __getitem__(self, name):
+        if name not in self.meta["series"]:
+            raise KeyError(name)
+        return ChunkedArray(self.path, name, self.meta["series"][name], self.chunk_size)
+
+
+class ChunkedArray:
+    """
+    Lazy (runs, periods) view of one series.
+
+    Indexing with `arr[runs, start:stop]` reads only the overlapping chunks.
+    Runs shorter than the longest one are padded with NaN (0 for integer series).
+    """
+
+    def __init__(self, path, name, info, chunk_size):
+        self.path = path
+        self.name = name
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(info["dtype"])
+        self.lengths = {int(run): n for run, n in info["lengths"].items()}
+        n_runs = max(self.lengths) + 1 if self.lengths else 0
+        self.shape = (n_runs, max(self.lengths.values(), default=0))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:, :]
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+    def __getitem__(self, key):
+        run_key, time_key = key if isinstance(key, tuple) else (key, slice(None))
+        runs = np.arange(self.shape[0])[run_key]
+        if not isinstance(time_key, slice) or time_key.step not in (None, 1):
+            raise IndexError("time index must be a contiguous slice")
+        start, stop, _ = time_key.indices(self.shape[1])
+        stop = max(start, stop)
+        if np.ndim(runs) == 0:
+            return self.run(int(runs), start, stop)
+        out = np.empty((len(runs), stop - start), dtype=self.dtype)
+        for i, run in enumerate(runs):
+            out[i] = self._read(int(run), start, stop)
+        return out
+
+    def run(self, run, start=0, stop=None):
+        """
+        Periods [start, stop) of one run.
+
+        When the window lies inside a single uncompressed chunk, the result is a
+        read-only memory map instead of a copy.
+        """
+        stop = self.shape[1] if stop is None else stop
+        k = start // self.chunk_size
+        if stop > start and (stop - 1) // self.chunk_size == k and stop <= self.lengths.get(run, 0):
+            path = _chunk_path(self.path, self.name, run, k)
+            if path.endswith(".npy"):
+                offset = k * self.chunk_size
+                return np.load(path, mmap_mode="r")[start - offset:stop - offset]
+        return self._read(run, start, stop)
+
+    def iter_chunks(self, runs=None):
+        """
+        Iterate over time chunks as (start, block) with block of shape (n_runs, chunk_len).
+
+        Useful for statistics over all periods that should not load the whole series.
+        """
+        runs = np.arange(self.shape[0]) if runs is None else np.atleast_1d(runs)
+        for start in range(0, self.shape[1], self.chunk_size):
+            yield start, self[runs, start:start + self.chunk_size]
+
+    def _read(self, run, start, stop):
+        out = np.full(stop - start, np.nan if self.dtype.kind == "f" else 0, dtype=self.dtype)
+        available = min(stop, self.lengths.get(run, 0))
+        pos = start
+        while pos < available:
+            k = pos // self.chunk_size
+            offset = k * self.chunk_size
+            end = min(available, offset + self.chunk_size)
+            chunk = _load_chunk(self.path, self.name, run, k, mmap=True)
+            out[pos - start:end - start] = chunk[pos - offset:end - offset]
+            pos = end
+        return out
+
+
+def _chunk_path(path, name, run, k):
+    base = os.path.join(path, name, f"r{run}", f"t{k}")
+    return base + ".npy" if os.path.exists(base + ".npy") else base + ".npz"
+
+
+def _load_chunk(path, name, run, k, mmap=False):
+    chunk_path = _chunk_path(path, name, run, k)
+    if chunk_path.endswith(".npy"):
+        return np.load(chunk_path, mmap_mode="r" if mmap else None)
+    with np.load(chunk_path) as data:
+        return data["data"]
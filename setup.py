@@ -17,6 +17,14 @@ setup(
         "gymnasium>=0.29",
         "numpy>=1.22",
     ],
+    extras_require={
+        # JIT-compiled simulation kernels (sequential_pricing_env.simulation)
+        "fast": ["numba>=0.57"],
+        # Buy Box training data pipeline (sequential_pricing_env.buybox_data)
+        "data": ["pandas>=1.5", "pyarrow>=10"],
+        # DQN agent (sequential_pricing_env.agents.dqn) and its benchmarks
+        "torch": ["torch>=2.0"],
+    },
     packages=find_packages(exclude=("tests", "docs", "examples")),
     include_package_data=True,
     license="MIT",
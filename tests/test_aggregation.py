@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from sequential_pricing_env.aggregation import RunAggregator
+
+Q = (0, 10, 25, 50, 75, 90, 100)
+
+
+def _check(values, agg, tol):
+    np.testing.assert_allclose(agg.mean("x"), values.mean(axis=0))
+    np.testing.assert_allclose(agg.std("x"), values.std(axis=0, ddof=1))
+    np.testing.assert_allclose(agg.percentiles("x", Q), np.percentile(values, Q, axis=0), atol=tol)
+
+
+def test_percentiles_match_numpy():
+    values = np.random.default_rng(0).normal(5.0, 2.0, size=(500, 20))
+    agg = RunAggregator(20, bins=128)
+    for run, row in enumerate(values):
+        agg.append(run, x=row)
+    width = (agg._stats["x"].range[1] - agg._stats["x"].range[0]) / 128
+    _check(values, agg, width)
+
+
+def test_range_grows_past_first_run():
+    # a constant first run must not pin the histogram range to [4, 6]
+    rng = np.random.default_rng(1)
+    values = np.vstack([np.full((1, 8), 5.0), rng.uniform(0.0, 10.0, size=(999, 8))])
+    agg = RunAggregator(8, bins=128)
+    for row in values:
+        agg.write(x=row[None])
+    low, high = agg._stats["x"].range
+    assert low <= values.min() and high >= values.max()
+    _check(values, agg, (high - low) / 128)
+
+
+def test_odd_bins_rejected():
+    with pytest.raises(ValueError):
+        RunAggregator(10, bins=5)
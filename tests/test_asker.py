@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from env.bertrand_env import BertrandPricingEnv
+from sequential_pricing_env.agents.asker import UPDATE_TYPES, simulate_batch
+
+
+@pytest.mark.parametrize("update_type", UPDATE_TYPES)
+def test_batched_matches_per_run_loop(update_type):
+    env = BertrandPricingEnv(grid_size=20, payoff_cache_dir=False)
+    np.random.seed(7)
+    reference = simulate_batch(update_type, 300, 4, 0.1, env, batched=False)
+    np.random.seed(7)
+    batched = simulate_batch(update_type, 300, 4, 0.1, env, batched=True)
+    np.testing.assert_array_equal(batched, reference)
+    assert batched.shape == (4, 300)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sequential_pricing_env.buybox_data import compute_features
+
+# first rows of the training CSVs as shown in Buy_Box_Best_Selling_Prediction.ipynb
+NOTEBOOK_ROWS = pd.DataFrame({
+    "time": pd.to_datetime(["2023-05-07 10:06", "2023-05-26 13:40", "2023-06-06 23:14",
+                            "2023-06-08 19:20", "2023-06-19 08:36"]),
+    "sellerId": "A2L77EE7U53NWQ",
+    "hold_buybox": 0,
+    "price": [33.24, 31.25, 30.25, 29.25, 28.25],
+    "price_rank": 1.0,
+    "price_diff": 0.0,
+    "isFBA": True,
+    "isAmazon": False,
+    "avg_self_price_14d": [33.24, 31.25, 30.75, 30.25, 29.25],
+    "avg_price_rank_14d": 1.0,
+    "avg_self_price_30d": [33.24, 32.245, 30.75, 30.25, 29.75],
+    "avg_price_rank_30d": 1.0,
+    "avg_self_price_60d": [33.24, 32.245, 31.58, 30.9975, 30.448],
+    "avg_price_rank_60d": 1.0,
+})
+
+
+def _offers():
+    times = pd.date_range("2023-01-01", periods=40, freq="37h")
+    rng = np.random.default_rng(0)
+    rows = [{"time": t, "sellerId": s, "price": float(rng.integers(20, 25)), "isAmazon": s == "amz",
+             "isFBA": True, "hold_buybox": 0} for t in times for s in ("amz", "a", "b")]
+    return pd.DataFrame(rows)
+
+
+def test_definitions_match_notebook_rows():
+    compute_features(NOTEBOOK_ROWS)  # source_features="check" raises on any difference
+
+
+def test_mismatching_source_column_raises():
+    df = _offers()
+    features = compute_features(df)
+    source = df.sort_values(["sellerId", "time"], kind="stable").reset_index(drop=True)
+    source["price_rank"] = features["price_rank"] - 1  # 0-based ranks
+    with pytest.raises(ValueError, match="price_rank"):
+        compute_features(source)
+    kept = compute_features(source, source_features="keep")
+    np.testing.assert_array_equal(kept["price_rank"], source["price_rank"])
+    recomputed = compute_features(source, source_features="recompute")
+    np.testing.assert_array_equal(recomputed["price_rank"], features["price_rank"])
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pytest
+
+from sequential_pricing_env import checkpoint as ckpt_module
+from sequential_pricing_env.checkpoint import Checkpointer, branch, history_segments
+
+
+def test_distinct_keys_get_distinct_files(tmp_path):
+    state = {"a": {"b": np.zeros(3)}, "a.b": np.ones(3), "a/b": np.full(3, 2.0)}
+    Checkpointer(tmp_path / "ckpt").save(state, 1)
+    loaded = Checkpointer(tmp_path / "ckpt").load()
+    np.testing.assert_array_equal(loaded["a"]["b"], np.zeros(3))
+    np.testing.assert_array_equal(loaded["a.b"], np.ones(3))
+    np.testing.assert_array_equal(loaded["a/b"], np.full(3, 2.0))
+
+
+def test_history_segments_are_not_hashed_again(tmp_path, monkeypatch):
+    hashed = []
+    digest = ckpt_module._digest
+    monkeypatch.setattr(ckpt_module, "_digest", lambda a: hashed.append(a.size) or digest(a))
+    hist = {"price": np.arange(30.0)}
+    ckpt = Checkpointer(tmp_path / "ckpt")
+    for bounds in ([0, 10], [0, 10, 20], [0, 10, 20, 30]):
+        hashed.clear()
+        ckpt.save({"Q": np.ones(4), "history": history_segments(hist, ["price"], bounds)}, bounds[-1])
+        assert hashed == [4, 10]  # the Q-table and the new segment only
+
+    loaded = Checkpointer(tmp_path / "ckpt").load()
+    np.testing.assert_array_equal(np.concatenate([seg["price"] for seg in loaded["history"]]), hist["price"])
+
+
+def test_branch_continues_independently(tmp_path):
+    src = Checkpointer(tmp_path / "src")
+    src.save({"Q": np.arange(5.0), "t": 10}, 10, alpha=0.1)
+    other = branch(tmp_path / "src", tmp_path / "dst", every=5)
+    assert other.every == 5 and other.step == 10
+    assert other.meta["branched_from"] == os.path.abspath(tmp_path / "src")
+
+    state = other.load()
+    state["Q"][0] = -1.0  # copy-on-write map, the shared file is untouched
+    other.save(dict(state, t=15), 15)
+    np.testing.assert_array_equal(Checkpointer(tmp_path / "src").load()["Q"], np.arange(5.0))
+    assert Checkpointer(tmp_path / "dst").load()["Q"][0] == -1.0
+    with pytest.raises(FileExistsError):
+        branch(tmp_path / "src", tmp_path / "dst")
+
+
+def test_unknown_numba_release_is_refused(monkeypatch):
+    numba = pytest.importorskip("numba")
+    monkeypatch.setattr(numba, "__version__", "99.0.0")
+    with pytest.raises(RuntimeError, match="numba._helperlib"):
+        ckpt_module.numba_rng_state()
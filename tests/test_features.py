@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from sequential_pricing_env.features import FEATURE_NAMES, WINDOWS, RollingFeatures
+
+
+def reference_features(prices):
+    """pandas features of one market's price history, shape (T, n_sellers, 10)."""
+    df = pd.DataFrame(prices)
+    rank = df.rank(axis=1, method="min")
+    columns = {
+        "isAmazon": pd.DataFrame(0.0, index=df.index, columns=df.columns),
+        "isFBA": pd.DataFrame(1.0, index=df.index, columns=df.columns),
+        "price_rank": rank,
+        "price_diff": df.sub(df.min(axis=1), axis=0),
+    }
+    for w in WINDOWS:
+        columns[f"avg_price_rank_{w}d"] = rank.rolling(w, min_periods=1).mean()
+        columns[f"avg_self_price_{w}d"] = df.rolling(w, min_periods=1).mean()
+    return np.stack([columns[name].to_numpy() for name in FEATURE_NAMES], axis=-1)
+
+
+def test_matches_pandas_reference():
+    rng = np.random.default_rng(0)
+    prices = rng.choice(np.linspace(1, 10, 7), size=(2, 150, 3))  # ties on a coarse grid
+    rolling = RollingFeatures(n_sellers=3, n_markets=2, resync_every=40)
+    expected = np.stack([reference_features(p) for p in prices], axis=1)  # (T, markets, sellers, 10)
+    for t in range(prices.shape[1]):
+        np.testing.assert_allclose(rolling.update(prices[:, t]), expected[t], rtol=1e-12, atol=1e-12)
+
+
+def test_resync_removes_drift():
+    # a huge price leaving a window cancels the small ones' low bits out of the running sum
+    prices = np.where(np.arange(600) % 97 == 0, 1e15, np.random.default_rng(1).uniform(1, 2, 600))
+    prices = np.stack([prices, np.full(600, 1.5)], axis=1)
+    expected = reference_features(prices)
+    col = FEATURE_NAMES.index("avg_self_price_14d")
+
+    drifting = RollingFeatures(n_sellers=2, resync_every=10**9)
+    resynced = RollingFeatures(n_sellers=2, resync_every=50)
+    errors = []
+    for t in range(len(prices)):
+        drift = drifting.update(prices[t])[0, col] - expected[t, 0, col]
+        resynced.update(prices[t])
+        if (t + 1) % 50 == 0:
+            np.testing.assert_allclose(resynced.features, expected[t], rtol=1e-12)
+            errors.append(abs(drift))
+    assert max(errors) > 1e-3  # the same history drifts without resync
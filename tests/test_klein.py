@@ -0,0 +1,19 @@
+import numpy as np
+
+from sequential_pricing_env import SequentialPricingEnv
+from sequential_pricing_env.klein import simulate_klein, train_sessions
+
+
+def test_results_do_not_depend_on_block():
+    payoff = SequentialPricingEnv(n_prices=6).payoff_table()
+    runs = [train_sessions(payoff, 10_000, sessions=20, seed=3, block=block) for block in (7, 1000, 4096)]
+    for res in runs[1:]:
+        np.testing.assert_array_equal(res["Q0"], runs[0]["Q0"])
+        np.testing.assert_array_equal(res["Q1"], runs[0]["Q1"])
+        np.testing.assert_array_equal(res["state"], runs[0]["state"])
+
+
+def test_profitability_is_share_of_collusive_profit():
+    res = simulate_klein(SequentialPricingEnv(n_prices=6), 5_000, sessions=50, seed=1)
+    assert res["profitability"].shape == (50,)
+    assert np.all((res["profitability"] > 0) & (res["profitability"] <= 1))
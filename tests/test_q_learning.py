@@ -0,0 +1,10 @@
+import numpy as np
+
+from sequential_pricing_env.agents.q_learning import N_RULES, apply_rule, apply_rules
+
+
+def test_apply_rules_matches_apply_rule():
+    n = 5
+    rules, rival, own = np.meshgrid(np.arange(N_RULES), np.arange(n), np.arange(n), indexing="ij")
+    expected = [apply_rule(r, a, b, n) for r, a, b in zip(rules.ravel(), rival.ravel(), own.ravel())]
+    np.testing.assert_array_equal(apply_rules(rules, rival, own, n).ravel(), expected)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from sequential_pricing_env.agents import (
+    HashedUniform,
+    QLearningAgent,
+    compact_q_table,
+    greedy_agreement,
+    make_q_table,
+)
+
+
+def _trained_agent(q_table, periods=20_000, n_actions=7):
+    agent = QLearningAgent(n_actions, rng=np.random.default_rng(0), q_table=q_table)
+    rng = np.random.default_rng(1)
+    state = 0
+    for _ in range(periods):
+        action = agent.take_action(state)
+        next_state = action * n_actions + int(rng.integers(n_actions))
+        agent.update(state, action, rng.uniform(0.0, 2.0), next_state)
+        state = next_state
+    return agent
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+def test_compact_dense_keeps_greedy_actions(dtype):
+    Q = _trained_agent("dense").Q
+    compact = compact_q_table(Q, dtype)
+    assert compact.dtype == dtype
+    assert greedy_agreement(compact, Q) == 1.0
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+def test_compact_sparse_keeps_greedy_actions(dtype):
+    agent = _trained_agent("sparse")
+    compact = compact_q_table(agent.Q, dtype)
+    assert greedy_agreement(compact, agent.Q) == 1.0
+    # rows created after compaction round the initial values the same way
+    np.testing.assert_array_equal(np.argmax(compact.to_dense(), axis=1), np.argmax(agent.Q.to_dense(), axis=1))
+
+
+def test_reduced_precision_init_keeps_greedy_actions():
+    init = HashedUniform(3)
+    reference = make_q_table("dense", 2_000, 25, init)
+    compact = make_q_table("dense", 2_000, 25, init, dtype=np.float16)
+    assert greedy_agreement(compact, reference) == 1.0
+
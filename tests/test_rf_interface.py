@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import make_pipeline
+
+from rf_interface import export_compact, load_pipeline, predict_batch
+
+COLUMNS = ["isAmazon", "isFBA", "price_rank", "price_diff"]
+
+
+@pytest.fixture
+def pipeline():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 5, size=(200, len(COLUMNS))), columns=COLUMNS)
+    y = (X["price_rank"] < 2).astype(int)
+    return make_pipeline(SimpleImputer(strategy="median"),
+                         RandomForestClassifier(n_estimators=5, random_state=0)).fit(X, y)
+
+
+def test_compact_forest_has_feature_names_in(pipeline, tmp_path):
+    export_compact(pipeline, tmp_path / "rf")
+    forest = load_pipeline(str(tmp_path / "rf"), verbose=False)
+    assert list(forest.feature_names_in_) == list(pipeline.feature_names_in_) == COLUMNS
+    X = np.random.default_rng(1).uniform(0, 5, size=(50, len(COLUMNS)))
+    for a, b in zip(predict_batch(forest, X), predict_batch(pipeline, X)):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_compact_forest_without_names_has_no_feature_names_in(tmp_path):
+    X = np.random.default_rng(2).uniform(0, 5, size=(100, len(COLUMNS)))
+    forest = RandomForestClassifier(n_estimators=3, random_state=0).fit(X, X[:, 2] < 2)
+    compact = export_compact(forest, tmp_path / "rf")
+    assert not hasattr(compact, "feature_names_in_")
+
+
+def test_compact_forest_maps_children_without_copying(pipeline, tmp_path):
+    export_compact(pipeline, tmp_path / "rf")
+    forest = load_pipeline(str(tmp_path / "rf"), verbose=False)
+    assert isinstance(forest.children, np.memmap) and not forest.children.flags.writeable
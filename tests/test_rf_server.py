@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import make_pipeline
+
+from rf_interface import predict_batch
+from rf_server import BuyBoxClient, BuyBoxServer, ServerError, default_socket
+
+
+@pytest.fixture
+def pipeline():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 5, size=(200, 4))
+    return make_pipeline(SimpleImputer(strategy="median"),
+                         RandomForestClassifier(n_estimators=5, random_state=0)).fit(X, X[:, 2] < 2)
+
+
+def test_default_socket_is_per_user_and_sweep():
+    assert str(os.getuid()) in os.path.basename(default_socket())
+    assert default_socket("a") != default_socket("b") != default_socket()
+
+
+def test_round_trip_matches_local_predictions(pipeline, tmp_path):
+    X = np.random.default_rng(1).uniform(0, 5, size=(3, 7, 4))
+    X[0, 0, 1] = np.nan
+
+    async def main():
+        server = await BuyBoxServer(pipeline, str(tmp_path / "rf.sock")).start()
+        client = await BuyBoxClient.connect(server.socket_path)
+        try:
+            # concurrent requests of different sizes share forest passes
+            results = await asyncio.gather(*(client.predict_batch(x) for x in X))
+            single = await client.predict(X[1, 2])
+            with pytest.raises(ServerError, match="expects 4"):
+                await client.predict_proba(np.zeros((2, 3)))
+            stats = await client.stats()
+        finally:
+            await client.close()
+            await server.close()
+        return results, single, stats
+
+    results, single, stats = asyncio.run(main())
+    for x, (pred, prob) in zip(X, results):
+        expected_pred, expected_prob = predict_batch(pipeline, x)
+        np.testing.assert_array_equal(pred, expected_pred)
+        np.testing.assert_array_equal(prob, expected_prob)
+    assert single[1] == predict_batch(pipeline, X[1, 2:3])[1][0]
+    assert stats["rows"] == 22 and stats["errors"] == 1
+    assert not os.path.exists(tmp_path / "rf.sock")
+
+
+def test_live_socket_is_not_taken_over(pipeline, tmp_path):
+    path = str(tmp_path / "rf.sock")
+
+    async def main():
+        first = await BuyBoxServer(pipeline, path).start()
+        try:
+            with pytest.raises(FileExistsError):
+                await BuyBoxServer(pipeline, path).start()
+            assert os.path.exists(path)
+        finally:
+            await first.close()
+        # a stale file of a dead server is replaced
+        open(path, "w").close()
+        second = await BuyBoxServer(pipeline, path).start()
+        await second.close()
+
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from sequential_pricing_env import SequentialPricingEnv
+
+
+@pytest.fixture(params=[True, False], ids=["payoff", "on-the-fly"])
+def env(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(SequentialPricingEnv, "max_payoff_entries", 0)
+    return SequentialPricingEnv(n_prices=6, payoff_cache_dir=False)
+
+
+def test_step_accepts_tuple(env):
+    obs, profit, _, _, info = env.step((1, 3))
+    assert obs == (1, 3)
+    np.testing.assert_allclose(profit, [0.16, 0.0])
+    np.testing.assert_allclose(info["price"], [0.2, 0.6])
+
+
+@pytest.mark.parametrize("batch", [2, 3])
+def test_step_batch_matches_calculate_profits(env, batch):
+    actions = np.random.default_rng(0).integers(6, size=(batch, 2))
+    actions[0] = (0, 0)
+    actions[1] = (2, 3)
+    _, profit, _, _, info = env.step(actions)
+    np.testing.assert_array_equal(profit, env.calculate_profits(actions))
+    np.testing.assert_allclose(profit[1], [0.24, 0.0])
+    assert info["price"].shape == (batch, 2)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from env.LogitDemandPricingEnv import LogitDemandPricingEnv
+from sequential_pricing_env.checkpoint import Checkpointer
+from sequential_pricing_env.convergence import ConvergenceMonitor
+from sequential_pricing_env.rng import epsilon_horizon
+from sequential_pricing_env.simulation import run_QpQp, simulate_batch, simulate_QpQp
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    monkeypatch.setattr("sequential_pricing_env.payoff_cache.CACHE_DIR", str(tmp_path / "payoff"))
+    return LogitDemandPricingEnv(price_min=0.01, price_max=10.0, grid_size=9, marginal_cost=2.0,
+                                 beta=0.95, a_0=0, a_12=10, mu=0.25)
+
+
+def test_QpQp_compiled_matches_reference(env):
+    compiled = simulate_QpQp(env, 5_000, 0.15, 0.9, seed=3)
+    reference = simulate_QpQp(env, 5_000, 0.15, 0.9, seed=3, compiled=False)
+    for a, b in zip(compiled, reference):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_monitor_waits_for_exploration_to_fade(env):
+    monitor = ConvergenceMonitor(check_every=5_000, patience=5)
+    res = run_QpQp(env.payoff_table(), env.prices, 400_000, 0.15, 0.9, seed=1, omega=1e-4, monitor=monitor)
+    assert monitor.min_periods == epsilon_horizon(1e-5, 1e-4)
+    stop = res["periods_run"]
+    assert monitor.min_periods <= stop < 400_000
+    assert np.isfinite(res["price"][:, :stop]).all() and np.isnan(res["price"][:, stop:]).all()
+
+    filled = run_QpQp(env.payoff_table(), env.prices, 400_000, 0.15, 0.9, seed=1, omega=1e-4,
+                      monitor=monitor, fill_cycle=True)
+    np.testing.assert_array_equal(filled["price"][:, :stop], res["price"][:, :stop])
+    assert np.isfinite(filled["price"]).all()
+
+
+def test_QpQp_monitor_stops_batch_runs(env):
+    monitor = ConvergenceMonitor(check_every=5_000, patience=5, min_periods=0)
+    price, _, _ = simulate_batch(600_000, 2, 0.15, 0.9, env, simulate_QpQp, seed=1, monitor=monitor)
+    assert price.shape == (2, 600_000)
+    assert len(monitor.reports) == 2
+    for row, report in zip(price, monitor.reports):
+        assert report["converged_at"] is not None and report["stopped_at"] < 600_000
+        assert np.isnan(row[report["stopped_at"]:]).all()
+
+
+def test_QpQp_resumes_from_checkpoint(env, tmp_path):
+    payoff, prices = env.payoff_table(), env.prices
+    full = run_QpQp(payoff, prices, 20_000, seed=5)
+    run_QpQp(payoff, prices, 8_000, seed=5, checkpoint=Checkpointer(tmp_path / "ckpt", every=3_000))
+    resumed = run_QpQp(payoff, prices, 20_000, seed=5, checkpoint=Checkpointer(tmp_path / "ckpt", every=3_000))
+    np.testing.assert_array_equal(full["price"], resumed["price"])
+    np.testing.assert_array_equal(full["Q1"], resumed["Q1"])
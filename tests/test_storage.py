@@ -0,0 +1,33 @@
+import numpy as np
+
+from sequential_pricing_env.storage import HistoryStore, save_histories, save_simulation_results
+
+
+def test_save_histories_overwrites_existing_store(tmp_path):
+    path = tmp_path / "store"
+    first = np.arange(20.0).reshape(2, 10)
+    second = -np.arange(20.0).reshape(2, 10)
+    save_histories(path, chunk_size=4, price=first, action=first)
+    store = save_histories(path, chunk_size=4, price=second)
+    assert store["price"].shape == (2, 10)
+    np.testing.assert_array_equal(store["price"][:, :], second)
+    assert store.series == ["price"]
+
+
+def test_save_simulation_results_twice_keeps_last(tmp_path):
+    segments = np.ones((2, 10))
+    last = np.full((2, 3), 2.0)
+    save_simulation_results(segments, segments, segments, "qr-qr", data_dir=tmp_path)
+    store = save_simulation_results(last, last, last, "qr-qr", data_dir=tmp_path)
+    for name in ("price", "action", "profit"):
+        np.testing.assert_array_equal(store[name][:, :], last)
+
+
+def test_append_extends_runs(tmp_path):
+    path = tmp_path / "store"
+    values = np.arange(20.0).reshape(2, 10)
+    save_histories(path, chunk_size=4, price=values)
+    save_histories(path, chunk_size=4, append=True, price=values)
+    store = HistoryStore(path)
+    assert store["price"].shape == (2, 20)
+    np.testing.assert_array_equal(store["price"][:, 10:], values)